@@ -0,0 +1,314 @@
+import time
+import struct
+import sys
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Dict, Any, List, Callable
+
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from lib.bad_subd.storage import UTF32RowStorage, ColumnDefinition, create_storage
+from lib.bad_subd.schema import TableSchema
+from lib.bad_subd.table_file import TableFileManager
+from lib.bad_subd.config import bad_subd_config
+
+
+LESSONS_COLUMNS = [
+    ColumnDefinition("id", "INT"),
+    ColumnDefinition("schedule_id", "INT"),
+    ColumnDefinition("teacher_name", "VARCHAR", 100),
+    ColumnDefinition("subject_name", "VARCHAR", 60),
+    ColumnDefinition("place", "VARCHAR", 70),
+    ColumnDefinition("startDate", "VARCHAR", 15),
+    ColumnDefinition("endDate", "VARCHAR", 15),
+    ColumnDefinition("startTime", "VARCHAR", 15),
+    ColumnDefinition("endTime", "VARCHAR", 15),
+    ColumnDefinition("repeat", "VARCHAR", 15)
+]
+
+
+USERS_COLUMNS = [
+    ColumnDefinition("id", "INT"),
+    ColumnDefinition("login", "VARCHAR", 45),
+    ColumnDefinition("email", "VARCHAR", 45),
+    ColumnDefinition("password", "VARCHAR", 15)
+]
+
+COMMENTS_COLUMNS = [
+    ColumnDefinition("id", "INT"),
+    ColumnDefinition("lesson_id", "INT"),
+    ColumnDefinition("date", "VARCHAR", 15),
+    ColumnDefinition("text", "VARCHAR", 255)
+]
+
+
+def generate_users(num_records: int) -> List[Dict[str, Any]]:
+    """Генерация строк таблицы users"""
+    return [{
+        "id": i + 1,
+        "login": f"user_{i}",
+        "email": f"user_{i}@example.com",
+        "password": f"pass{i % 1000:04d}"
+    } for i in range(num_records)]
+
+
+def generate_comments(num_records: int) -> List[Dict[str, Any]]:
+    """Генерация строк таблицы comments"""
+    return [{
+        "id": i + 1,
+        "lesson_id": i % 2000,
+        "date": "2024-01-20",
+        "text": f"Комментарий {i}: " + "отличный урок " * (i % 5)
+    } for i in range(num_records)]
+
+
+def generate_lessons(num_records: int) -> List[Dict[str, Any]]:
+    """Генерация строк таблицы lessons"""
+    return [{
+        "id": i + 1,
+        "schedule_id": i % 500,
+        "teacher_name": f"Преподаватель {i}",
+        "subject_name": f"Предмет {i % 40}",
+        "place": f"Аудитория {i % 300}",
+        "startDate": "2024-01-15",
+        "endDate": "2024-05-30",
+        "startTime": "09:00",
+        "endTime": "10:30",
+        "repeat": "weekly"
+    } for i in range(num_records)]
+
+
+def legacy_serialize_row(columns: List[ColumnDefinition], row: Dict[str, Any]) -> bytes:
+    """Построчная сериализация по столбцам (реализация до struct-кодека)"""
+    data = bytearray()
+    data.append(0)
+    for col in columns:
+        value = row.get(col.name)
+        if col.data_type == 'INT':
+            data.extend(struct.pack('>Q', value if value is not None else 0))
+        else:
+            text = (value if value is not None else "")[:col.size]
+            utf32_data = text.encode('utf-32-le')
+            data.extend(utf32_data + b'\x00' * (col.size * 4 - len(utf32_data)))
+    return bytes(data)
+
+
+def legacy_deserialize_row(columns: List[ColumnDefinition], data: bytes) -> Dict[str, Any]:
+    """Построчная десериализация по столбцам (реализация до struct-кодека)"""
+    row = {'_deleted': bool(data[0])}
+    pos = 1
+    for col in columns:
+        if col.data_type == 'INT':
+            row[col.name] = struct.unpack('>Q', data[pos:pos + 8])[0]
+            pos += 8
+        else:
+            str_data = data[pos:pos + col.size * 4].rstrip(b'\x00')
+            pos += col.size * 4
+            remainder = len(str_data) % 4
+            if remainder != 0:
+                str_data += b'\x00' * (4 - remainder)
+            row[col.name] = str_data.decode('utf-32-le', errors='ignore') if str_data else ""
+    return row
+
+
+def measure_rows_per_second(func: Callable, items: List[Any]) -> float:
+    """Количество обработанных строк в секунду"""
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    elapsed = time.perf_counter() - start
+    return len(items) / elapsed
+
+
+def bench_row_codec(num_records: int = 100_000) -> Dict[str, float]:
+    """Сравнение старого и struct-кодека строк на таблице lessons"""
+    print(f"=== Кодек строк lessons, {num_records} строк ===")
+    storage = UTF32RowStorage(LESSONS_COLUMNS)
+    rows = generate_lessons(num_records)
+    encoded = [storage.serialize_row(row) for row in rows]
+    
+    results = {
+        'serialize_before': measure_rows_per_second(lambda r: legacy_serialize_row(LESSONS_COLUMNS, r), rows),
+        'serialize_after': measure_rows_per_second(storage.serialize_row, rows),
+        'deserialize_before': measure_rows_per_second(lambda d: legacy_deserialize_row(LESSONS_COLUMNS, d), encoded),
+        'deserialize_after': measure_rows_per_second(storage.deserialize_row, encoded),
+    }
+    
+    for op in ('serialize', 'deserialize'):
+        before = results[f'{op}_before']
+        after = results[f'{op}_after']
+        print(f"  {op}: до {before:,.0f} строк/сек, после {after:,.0f} строк/сек ({after / before:.2f}x)")
+    
+    return results
+
+
+def fill_table(table_dir: str, table_name: str, columns: List[ColumnDefinition],
+               rows: List[Dict[str, Any]], storage_format: str = 'utf32') -> UTF32RowStorage:
+    """Создание файла таблицы во временной директории"""
+    storage = create_storage(columns, storage_format)
+    manager = TableFileManager(table_dir)
+    manager.create_table_file(TableSchema(table_name, columns, storage_format=storage_format))
+    manager.insert_rows(table_name, rows, storage)
+    manager.close()
+    return storage
+
+
+def bench_scan_modes(num_records: int = 100_000) -> Dict[str, float]:
+    """Полный скан и точечное чтение: обычные файлы против mmap"""
+    print(f"=== Скан lessons, {num_records} строк ===")
+    results = {}
+    
+    with tempfile.TemporaryDirectory() as table_dir:
+        storage = fill_table(table_dir, "lessons", LESSONS_COLUMNS, generate_lessons(num_records))
+        positions = [row['_position'] for row in TableFileManager(table_dir).scan_rows("lessons", storage)]
+        
+        for mode, use_mmap in (('file', False), ('mmap', True)):
+            manager = TableFileManager(table_dir, use_mmap=use_mmap)
+            results[f'scan_{mode}'] = measure_rows_per_second(
+                lambda _: sum(1 for _ in manager.scan_rows("lessons", storage)), [None]) * num_records
+            results[f'point_{mode}'] = measure_rows_per_second(
+                lambda pos: manager.read_row_at_position("lessons", pos, storage), positions[::10])
+            manager.close()
+    
+    print(f"  скан: файл {results['scan_file']:,.0f} строк/сек, mmap {results['scan_mmap']:,.0f} строк/сек")
+    print(f"  точечное чтение: файл {results['point_file']:,.0f} строк/сек, mmap {results['point_mmap']:,.0f} строк/сек")
+    return results
+
+
+def bench_projection(num_records: int = 100_000) -> Dict[str, float]:
+    """Скан всех столбцов против скана только id и schedule_id"""
+    print(f"=== Проекция при скане lessons, {num_records} строк ===")
+    results = {}
+    
+    with tempfile.TemporaryDirectory() as table_dir:
+        storage = fill_table(table_dir, "lessons", LESSONS_COLUMNS, generate_lessons(num_records))
+        manager = TableFileManager(table_dir)
+        
+        for label, columns in (('all', None), ('narrow', ['id', 'schedule_id'])):
+            results[label] = measure_rows_per_second(
+                lambda _: sum(1 for _ in manager.scan_rows("lessons", storage, columns)), [None]) * num_records
+        manager.close()
+    
+    print(f"  все столбцы: {results['all']:,.0f} строк/сек")
+    print(f"  id, schedule_id: {results['narrow']:,.0f} строк/сек ({results['narrow'] / results['all']:.2f}x)")
+    return results
+
+
+def bench_raw_filter(num_records: int = 100_000) -> Dict[str, float]:
+    """Селективный фильтр по неиндексированному столбцу: декодирование против сравнения байт"""
+    print(f"=== Фильтр place = ... при скане lessons, {num_records} строк ===")
+    results = {}
+    where = {"place": "Аудитория 7"}
+    
+    with tempfile.TemporaryDirectory() as table_dir:
+        storage = fill_table(table_dir, "lessons", LESSONS_COLUMNS, generate_lessons(num_records))
+        manager = TableFileManager(table_dir)
+        
+        def decoded_scan(_):
+            return [row for row in manager.scan_rows("lessons", storage) if row["place"] == where["place"]]
+        
+        def raw_scan(_):
+            return list(manager.scan_rows("lessons", storage, None, storage.encode_filter(where)))
+        
+        results['decoded'] = measure_rows_per_second(decoded_scan, [None]) * num_records
+        results['raw'] = measure_rows_per_second(raw_scan, [None]) * num_records
+        manager.close()
+    
+    print(f"  с декодированием: {results['decoded']:,.0f} строк/сек")
+    print(f"  по байтам: {results['raw']:,.0f} строк/сек ({results['raw'] / results['decoded']:.2f}x)")
+    return results
+
+
+@contextmanager
+def temporary_engine_dirs():
+    """Каталоги схем, таблиц и индексов движка во временной папке
+    
+    Движок берет пути из bad_subd_config, поэтому на время замера они
+    подменяются: таблицы бенчмарка не смешиваются с lib/bad_subd/data.
+    """
+    saved = (bad_subd_config.SCHEMA_DIR, bad_subd_config.TABLE_DIR, bad_subd_config.INDEX_DIR)
+    with tempfile.TemporaryDirectory() as data_dir:
+        dirs = [os.path.join(data_dir, name) for name in ("schemas", "tables", "indexes")]
+        for path in dirs:
+            os.makedirs(path)
+        bad_subd_config.SCHEMA_DIR, bad_subd_config.TABLE_DIR, bad_subd_config.INDEX_DIR = dirs
+        try:
+            yield data_dir
+        finally:
+            bad_subd_config.SCHEMA_DIR, bad_subd_config.TABLE_DIR, bad_subd_config.INDEX_DIR = saved
+
+
+def bench_numpy_scan(num_records: int = 100_000) -> Dict[str, float]:
+    """Подсчет строк с фильтром: построчный скан движка против NumPy-скана"""
+    from lib.bad_subd import BadSUBDEngine
+    from lib.bad_subd.vector_engine import NumpyScanEngine, np
+    if np is None:
+        print("NumPy не установлен, сравнение пропущено")
+        return {}
+    
+    print(f"=== COUNT по schedule_id в lessons, {num_records} строк ===")
+    results = {}
+    where = {"schedule_id": 42}
+    
+    with temporary_engine_dirs():
+        engine = BadSUBDEngine()
+        engine.create_table("lessons", [{"name": col.name, "type": col.data_type, "size": col.size}
+                                        for col in LESSONS_COLUMNS])
+        engine.insert_many("lessons", generate_lessons(num_records))
+        vector = NumpyScanEngine(engine)
+        
+        results['rows'] = measure_rows_per_second(
+            lambda _: len(engine.select("lessons", ["id"], where)), [None]) * num_records
+        results['numpy'] = measure_rows_per_second(
+            lambda _: vector.count("lessons", where), [None]) * num_records
+        engine.close()
+    
+    print(f"  построчно: {results['rows']:,.0f} строк/сек")
+    print(f"  NumPy: {results['numpy']:,.0f} строк/сек ({results['numpy'] / results['rows']:.2f}x)")
+    return results
+
+
+def bench_storage_formats(num_records: int = 100_000) -> Dict[str, Dict[str, float]]:
+    """Размер файла и скорость скана: UTF-32 фиксированной длины против UTF-8 страниц"""
+    print(f"=== Форматы хранения, {num_records} строк ===")
+    tables = {
+        "users": (USERS_COLUMNS, generate_users),
+        "lessons": (LESSONS_COLUMNS, generate_lessons),
+        "comments": (COMMENTS_COLUMNS, generate_comments)
+    }
+    results = {}
+
+    with tempfile.TemporaryDirectory() as table_dir:
+        for table_name, (columns, generate) in tables.items():
+            rows = generate(num_records)
+            for storage_format in ('utf32', 'utf8'):
+                name = f"{table_name}_{storage_format}"
+                storage = fill_table(table_dir, name, columns, rows, storage_format)
+                manager = TableFileManager(table_dir)
+                scan_speed = measure_rows_per_second(
+                    lambda _: sum(1 for _ in manager.scan_rows(name, storage)), [None]) * num_records
+                manager.close()
+                results[name] = {
+                    'file_size': os.path.getsize(os.path.join(table_dir, f"{name}.dat")),
+                    'scan_rows_per_sec': scan_speed
+                }
+
+            utf32 = results[f"{table_name}_utf32"]
+            utf8 = results[f"{table_name}_utf8"]
+            print(f"  {table_name}: размер UTF-32 {utf32['file_size'] / 2**20:.1f} МБ, "
+                  f"UTF-8 {utf8['file_size'] / 2**20:.1f} МБ ({utf32['file_size'] / utf8['file_size']:.1f}x меньше); "
+                  f"скан UTF-32 {utf32['scan_rows_per_sec']:,.0f} строк/сек, "
+                  f"UTF-8 {utf8['scan_rows_per_sec']:,.0f} строк/сек")
+
+    return results
+
+
+if __name__ == "__main__":
+    bench_row_codec()
+    bench_scan_modes()
+    bench_projection()
+    bench_raw_filter()
+    bench_numpy_scan()
+    bench_storage_formats()
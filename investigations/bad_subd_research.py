@@ -8,7 +8,7 @@ import matplotlib.pyplot as plt
 
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-from lib.bad_subd import BadSUBD
+from lib.bad_subd import BadSUBD, Range, Match
 
 class CustomDBResearch:
     def __init__(self):
@@ -35,6 +35,22 @@ class CustomDBResearch:
             {"name": "value", "type": "INT"}
         ])
         
+        # Таблица с индексом B+дерево
+        self.db.engine.create_table("test_btree", [
+            {"name": "id", "type": "INT"},
+            {"name": "name", "type": "VARCHAR", "size": 50},
+            {"name": "value", "type": "INT"}
+        ])
+        self.db.engine.create_index("test_btree", "id", kind="btree")
+        
+        # Таблицы комментариев с полнотекстовым индексом и без него
+        for table_name in ("test_fulltext", "test_no_fulltext"):
+            self.db.engine.create_table(table_name, [
+                {"name": "id", "type": "INT"},
+                {"name": "text", "type": "VARCHAR", "size": 255}
+            ])
+        self.db.engine.create_index("test_fulltext", "text", kind="fulltext")
+        
         print("Тестовые таблицы созданы")
     
     def generate_test_data(self, num_records: int) -> List[Dict[str, Any]]:
@@ -53,6 +69,9 @@ class CustomDBResearch:
         print("Очистка тестовых данных...")
         self.db.engine.delete("test_indexed", None)
         self.db.engine.delete("test_non_indexed", None)
+        self.db.engine.delete("test_btree", None)
+        self.db.engine.delete("test_fulltext", None)
+        self.db.engine.delete("test_no_fulltext", None)
     
     def measure_select_with_index(self, target_id: int) -> float:
         """Измерение времени SELECT с индексом"""
@@ -87,6 +106,22 @@ class CustomDBResearch:
         time_taken = timeit.timeit(insert_op, number=10) / 10
         return time_taken
     
+    def measure_range_select(self, table_name: str, high: int) -> float:
+        """Измерение времени SELECT с условием id < high"""
+        def select_op():
+            return self.db.engine.select(table_name, where={"id": Range(high=high, include_high=False)})
+        
+        time_taken = timeit.timeit(select_op, number=20) / 20
+        return time_taken
+    
+    def measure_match_select(self, table_name: str, query: str) -> float:
+        """Измерение времени SELECT с полнотекстовым условием"""
+        def select_op():
+            return self.db.engine.select(table_name, where={"text": Match(query)})
+        
+        time_taken = timeit.timeit(select_op, number=50) / 50
+        return time_taken
+    
     def research_select_performance(self):
         """Исследование производительности SELECT"""
         print("=== Исследование производительности SELECT ===")
@@ -245,6 +280,169 @@ class CustomDBResearch:
             "index_size_growth"
         )
     
+    def research_btree_scalability(self):
+        """Исследование масштабируемости индекса B+дерево в сравнении с хэш-индексом"""
+        print("=== Исследование масштабируемости B+дерева ===")
+        
+        table_sizes = [250, 500, 750, 1000, 1250, 1500, 1750, 2000]
+        equality_results = {'Хэш-индекс': [], 'B+дерево': []}
+        range_results = {'B+дерево': [], 'Без индекса': []}
+        insert_results = {'Хэш-индекс': [], 'B+дерево': []}
+        index_sizes = []
+        
+        for size in table_sizes:
+            print(f"Тестирование B+дерева для {size} записей...")
+            
+            self.cleanup_test_data()
+            test_data = self.generate_test_data(size)
+            
+            for record in test_data:
+                self.db.engine.insert("test_indexed", record)
+                self.db.engine.insert("test_non_indexed", record)
+                self.db.engine.insert("test_btree", record)
+            
+            index_size = self.db.engine.indexes["test_btree"]["id"].get_index_size()
+            index_sizes.append(index_size)
+            
+            # Поиск по равенству
+            target_id = size // 2
+            equality_results['Хэш-индекс'].append(self.measure_select_with_index(target_id))
+            equality_results['B+дерево'].append(timeit.timeit(
+                lambda: self.db.engine.select("test_btree", where={"id": target_id}), number=100) / 100)
+            
+            # Диапазон id < size / 10: B+дерево против полного скана
+            high = size // 10
+            range_results['B+дерево'].append(self.measure_range_select("test_btree", high))
+            range_results['Без индекса'].append(self.measure_range_select("test_non_indexed", high))
+            
+            # Вставка
+            new_record = {"id": size + 1, "name": f"new_user_{size+1}", "value": 42}
+            insert_results['Хэш-индекс'].append(self.measure_insert_with_index(new_record))
+            insert_results['B+дерево'].append(timeit.timeit(
+                lambda: self.db.engine.insert("test_btree", new_record), number=10) / 10)
+            
+            print(f"  Размер B+дерева: {index_size} байт")
+            print(f"  SELECT id = {target_id}: хэш {equality_results['Хэш-индекс'][-1]:.6f} сек, "
+                  f"B+дерево {equality_results['B+дерево'][-1]:.6f} сек")
+            print(f"  SELECT id < {high}: B+дерево {range_results['B+дерево'][-1]:.6f} сек, "
+                  f"скан {range_results['Без индекса'][-1]:.6f} сек")
+            print(f"  INSERT: хэш {insert_results['Хэш-индекс'][-1]:.6f} сек, "
+                  f"B+дерево {insert_results['B+дерево'][-1]:.6f} сек")
+        
+        self._create_scalability_plot(
+            table_sizes,
+            equality_results,
+            "SELECT по равенству: хэш-индекс и B+дерево",
+            "Количество записей в таблице",
+            "Время выполнения (сек)",
+            "btree_equality_scalability"
+        )
+        
+        self._create_scalability_plot(
+            table_sizes,
+            range_results,
+            "SELECT с условием id < n/10",
+            "Количество записей в таблице",
+            "Время выполнения (сек)",
+            "btree_range_scalability"
+        )
+        
+        self._create_scalability_plot(
+            table_sizes,
+            insert_results,
+            "INSERT: хэш-индекс и B+дерево",
+            "Количество записей в таблице",
+            "Время выполнения (сек)",
+            "btree_insert_scalability"
+        )
+        
+        self._create_index_size_plot(
+            table_sizes,
+            index_sizes,
+            "Рост размера B+дерева",
+            "Количество записей в таблице",
+            "Размер индекса (байт)",
+            "btree_size_growth"
+        )
+    
+    def research_fulltext_search(self):
+        """Исследование полнотекстового индекса (аналог research_fulltext_indexes для PostgreSQL)"""
+        print("=== Исследование полнотекстового индекса ===")
+        
+        table_sizes = [250, 500, 750, 1000, 1250, 1500, 1750, 2000]
+        results_select_single = {'С полнотекстовым индексом': [], 'Без индекса': []}
+        results_select_multi = {'С полнотекстовым индексом': [], 'Без индекса': []}
+        results_insert = {'С полнотекстовым индексом': [], 'Без индекса': []}
+        
+        for size in table_sizes:
+            print(f"Тестирование полнотекстового индекса для {size} записей...")
+            
+            self.db.engine.delete("test_fulltext", None)
+            self.db.engine.delete("test_no_fulltext", None)
+            # Тот же текст комментариев, что и в исследовании PostgreSQL; предмет меняется,
+            # чтобы поиск одного слова находил не все строки
+            subjects = ["математике", "физике", "информатике", "истории"]
+            comments_data = [{
+                "id": i,
+                "text": f"Важное занятие по {subjects[i % len(subjects)]} с преподавателем Ивановым. "
+                        f"Тема: алгебра и геометрия. Студенты должны подготовить домашнее задание "
+                        f"к следующему уроку. Номер занятия: {i}"
+            } for i in range(size)]
+            
+            self.db.engine.insert_many("test_fulltext", comments_data)
+            self.db.engine.insert_many("test_no_fulltext", comments_data)
+            
+            # Поиск одного слова
+            results_select_single['С полнотекстовым индексом'].append(
+                self.measure_match_select("test_fulltext", "математике"))
+            results_select_single['Без индекса'].append(
+                self.measure_match_select("test_no_fulltext", "математике"))
+            
+            # Поиск нескольких слов (AND)
+            results_select_multi['С полнотекстовым индексом'].append(
+                self.measure_match_select("test_fulltext", "математике & геометрия"))
+            results_select_multi['Без индекса'].append(
+                self.measure_match_select("test_no_fulltext", "математике & геометрия"))
+            
+            # Вставка
+            new_record = {"id": size, "text": "Новое занятие по математике. Тема: тригонометрия"}
+            for table_name in ("test_fulltext", "test_no_fulltext"):
+                label = 'С полнотекстовым индексом' if table_name == "test_fulltext" else 'Без индекса'
+                results_insert[label].append(timeit.timeit(
+                    lambda: self.db.engine.insert(table_name, new_record), number=10) / 10)
+            
+            print(f"  Одно слово: индекс {results_select_single['С полнотекстовым индексом'][-1]:.6f} сек, "
+                  f"скан {results_select_single['Без индекса'][-1]:.6f} сек")
+            print(f"  Два слова: индекс {results_select_multi['С полнотекстовым индексом'][-1]:.6f} сек, "
+                  f"скан {results_select_multi['Без индекса'][-1]:.6f} сек")
+        
+        self._create_scalability_plot(
+            table_sizes,
+            results_select_single,
+            "Полнотекстовый поиск одного слова",
+            "Количество записей в таблице",
+            "Время выполнения (сек)",
+            "fulltext_single_term"
+        )
+        
+        self._create_scalability_plot(
+            table_sizes,
+            results_select_multi,
+            "Полнотекстовый поиск нескольких слов",
+            "Количество записей в таблице",
+            "Время выполнения (сек)",
+            "fulltext_multi_term"
+        )
+        
+        self._create_scalability_plot(
+            table_sizes,
+            results_insert,
+            "INSERT с полнотекстовым индексом",
+            "Количество записей в таблице",
+            "Время выполнения (сек)",
+            "fulltext_insert"
+        )
+    
     def _create_comparison_plot(self, x_data, y_data_dict, title, xlabel, ylabel, filename):
         """Создание сравнительного графика"""
         plt.figure(figsize=(10, 6))
@@ -347,6 +545,8 @@ class CustomDBResearch:
             self.research_select_performance()
             self.research_insert_performance()
             self.research_index_scalability()
+            self.research_btree_scalability()
+            self.research_fulltext_search()
             
             print("\nВсе исследования завершены!")
             print(f"Результаты сохранены в папке: {self.results_dir}")
@@ -1,5 +1,7 @@
 from .engine import BadSUBDEngine
 from .sql_engine import SQLBadSUBDEngine
+from .vector_engine import NumpyScanEngine
+from .conditions import Range, Match
 
 class BadSUBD:
     """СУБД с фиксированной длиной символов UTF-32"""
@@ -17,6 +19,10 @@ class BadSUBD:
         else:
             raise RuntimeError("SQL support not enabled. Initialize with use_sql=True")
     
+    def close(self):
+        """Закрыть открытые файлы таблиц и индексов"""
+        self.engine.close()
+    
     def create_table_users(self):
         """Создать таблицу users"""
         self.engine.create_table("users", [
@@ -26,6 +32,8 @@ class BadSUBD:
             {"name": "password", "type": "VARCHAR", "size": 15}
         ])
         self.engine.create_index("users", "id")
+        self.engine.create_index("users", "login")
+        self.engine.create_index("users", "email")
     
     def create_table_lessons(self):
         """Создать таблицу lessons"""
@@ -43,6 +51,7 @@ class BadSUBD:
         ])
         self.engine.create_index("lessons", "id")
         self.engine.create_index("lessons", "schedule_id")
+        self.engine.create_index("lessons", ["schedule_id", "startDate"])
     
     def create_table_comments(self):
         """Создать таблицу comments"""
@@ -54,6 +63,8 @@ class BadSUBD:
         ])
         self.engine.create_index("comments", "id")
         self.engine.create_index("comments", "lesson_id")
+        self.engine.create_index("comments", ["lesson_id", "date"])
+        self.engine.create_index("comments", "text", kind="fulltext")
     
     def create_all_tables(self):
         self.create_table_users()
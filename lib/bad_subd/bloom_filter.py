@@ -0,0 +1,176 @@
+import os
+import math
+import struct
+import hashlib
+from array import array
+from typing import List, Tuple, Iterable, Any, Optional
+from .config import bad_subd_config
+from .file_pool import FileHandlePool
+from .storage import ColumnDefinition
+
+BLOOM_MAGIC = b'BLM1'
+BLOOM_HEADER = struct.Struct('<4sQIQQ')  # сигнатура, количество бит, количество хэшей, емкость, добавлено значений
+MIN_BITS = 65536  # Наименьший размер фильтра (8 КБ)
+MAX_HASHES = 16
+GROWTH = 2  # Во сколько раз емкость фильтра при построении больше числа значений
+
+class BloomFilter:
+    """Фильтр Блума значений колонки: быстрый ответ "такого значения точно нет"
+    
+    Каждое значение устанавливает k бит, номера которых получаются двойным
+    хэшированием blake2b. Если хотя бы один бит не установлен, строки с
+    таким значением в таблице нет, и поиск по равенству заканчивается
+    без чтения таблицы. Установленные биты дают лишь "возможно есть".
+    
+    Размер подбирается при построении (rebuild) по BLOOM_FALSE_POSITIVE_RATE
+    с запасом емкости в GROWTH раз (и не меньше, чем помещается в MIN_BITS).
+    Когда вставки превышают емкость (overfull), движок перестраивает фильтр
+    по таблице, поэтому доля ложных срабатываний остается в пределах
+    расчетной, а перестройки редеют с ростом таблицы. Удаление строк биты
+    не снимает - их убирает перестройка при VACUUM.
+    """
+    
+    kind = 'bloom'
+    unique = False
+    primary_key = False
+    
+    def __init__(self, table_name: str, column_name: str, file_pool: FileHandlePool = None,
+                 column: ColumnDefinition = None):
+        if column is None:
+            raise ValueError("Bloom filter requires a column definition")
+        self.table_name = table_name
+        self.column_name = column_name
+        self.columns = [column_name]
+        self.column = column
+        self.filename = os.path.join(bad_subd_config.INDEX_DIR, f"{table_name}_{column_name}.bloom")
+        self.file_pool = file_pool if file_pool is not None else FileHandlePool()
+        
+        if os.path.exists(self.filename) and os.path.getsize(self.filename) >= BLOOM_HEADER.size:
+            self._load()
+        else:
+            self.rebuild([])
+    
+    def insert(self, key: Any, row_position: int) -> None:
+        """Добавить значение: на диск пишутся только изменившиеся байты"""
+        changed = self._add(key)
+        f = self.file_pool.get(self.filename, create=True)
+        for byte_no in changed:
+            f.seek(BLOOM_HEADER.size + byte_no)
+            f.write(self.bits[byte_no:byte_no + 1])
+        self._write_header(f)
+    
+    def insert_many(self, entries: List[Tuple[Any, int]]) -> None:
+        """Пакетное добавление значений с одной записью фильтра"""
+        if not entries:
+            return
+        for key, _ in entries:
+            self._add(key)
+        self._write()
+    
+    def delete(self, key: Any, row_position: int = None) -> None:
+        """Биты удаляемых значений остаются: они могут принадлежать и другим значениям"""
+    
+    def delete_many(self, entries: List[Tuple[Any, int]]) -> None:
+        """Как и delete, ничего не меняет"""
+    
+    def rebuild(self, entries: Iterable[Tuple[Any, int]]) -> None:
+        """Построить фильтр заново под количество значений"""
+        hashes = array('Q')
+        for key, _ in entries:
+            value_hashes = self._hashes(key)
+            if value_hashes is not None:
+                hashes.extend(value_hashes)
+        
+        # Емкость с запасом под вставки; фильтр минимального размера рассчитан
+        # на столько значений, сколько в него помещается при заданной доле
+        bits_per_value = -math.log(bad_subd_config.BLOOM_FALSE_POSITIVE_RATE) / math.log(2) ** 2
+        values = len(hashes) // 2
+        self.capacity = max(values * GROWTH, int(MIN_BITS / bits_per_value))
+        self.bit_count = max(MIN_BITS, int(math.ceil(self.capacity * bits_per_value / 8)) * 8)
+        self.hash_count = min(MAX_HASHES, max(1, round(self.bit_count / self.capacity * math.log(2))))
+        self.bits = bytearray(self.bit_count // 8)
+        
+        for i in range(0, len(hashes), 2):
+            self._set_bits(hashes[i], hashes[i + 1])
+        self.items = values
+        self._write()
+    
+    @property
+    def overfull(self) -> bool:
+        """Значений больше расчетной емкости - фильтр пора перестроить"""
+        return self.items > self.capacity
+    
+    def might_contain(self, key: Any) -> bool:
+        """False - строки с таким значением колонки точно нет"""
+        if key is None:
+            return True  # Равенство с NULL решает обычная проверка условия
+        value_hashes = self._hashes(key)
+        if value_hashes is None:
+            return False  # Значение не может храниться в колонке
+        h1, h2 = value_hashes
+        for i in range(self.hash_count):
+            bit = (h1 + i * h2) % self.bit_count
+            if not self.bits[bit >> 3] & (1 << (bit & 7)):
+                return False
+        return True
+    
+    def get_index_size(self) -> int:
+        """Получить размер фильтра в байтах"""
+        if os.path.exists(self.filename):
+            return os.path.getsize(self.filename)
+        return 0
+    
+    def _hashes(self, key: Any) -> Optional[Tuple[int, int]]:
+        """Два 64-битных хэша записываемого значения (None - значение не хранится)"""
+        if self.column.data_type == 'INT':
+            value = key if key is not None else 0
+            # Целое число в виде float хранится как int - так же, как в encode_value
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if not isinstance(value, int) or not 0 <= value <= 2**64 - 1:
+                return None
+            data = value.to_bytes(8, 'big')
+        else:
+            value = key if key is not None else ""
+            if not isinstance(value, str):
+                return None
+            data = value[:self.column.size].encode('utf-8', 'surrogatepass')
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        # Второй хэш нечетный, чтобы шаг двойного хэширования не вырождался
+        return int.from_bytes(digest[:8], 'big'), int.from_bytes(digest[8:], 'big') | 1
+    
+    def _add(self, key: Any) -> List[int]:
+        """Установить биты значения, вернуть номера изменившихся байт"""
+        value_hashes = self._hashes(key)
+        if value_hashes is None:
+            return []
+        self.items += 1
+        return self._set_bits(*value_hashes)
+    
+    def _set_bits(self, h1: int, h2: int) -> List[int]:
+        changed = []
+        for i in range(self.hash_count):
+            bit = (h1 + i * h2) % self.bit_count
+            mask = 1 << (bit & 7)
+            if not self.bits[bit >> 3] & mask:
+                self.bits[bit >> 3] |= mask
+                changed.append(bit >> 3)
+        return changed
+    
+    def _write_header(self, f) -> None:
+        f.seek(0)
+        f.write(BLOOM_HEADER.pack(BLOOM_MAGIC, self.bit_count, self.hash_count, self.capacity, self.items))
+    
+    def _write(self) -> None:
+        f = self.file_pool.get(self.filename, create=True)
+        self._write_header(f)
+        f.write(self.bits)
+        f.truncate()
+    
+    def _load(self) -> None:
+        with open(self.filename, 'rb') as f:
+            magic, self.bit_count, self.hash_count, self.capacity, self.items = BLOOM_HEADER.unpack(
+                f.read(BLOOM_HEADER.size))
+            if magic != BLOOM_MAGIC:
+                raise ValueError(f"{self.filename} is not a Bloom filter file")
+            self.bits = bytearray(f.read(self.bit_count // 8))
@@ -0,0 +1,306 @@
+import os
+import struct
+from bisect import bisect_left, bisect_right
+from itertools import islice
+from typing import List, Tuple, Iterator, Iterable, Optional
+from .config import bad_subd_config
+from .file_pool import FileHandlePool
+from .storage import ColumnDefinition
+
+BTREE_PAGE_SIZE = 4096
+BTREE_MAGIC = b'BPT1'
+META = struct.Struct('>4sIIQ')  # сигнатура, страница корня, количество страниц, количество записей
+NODE_HEADER = struct.Struct('>BxHI')  # тип узла, количество ключей, следующий лист (0 - нет)
+LEAF_ENTRY = struct.Struct('>QQ')  # ключ, позиция строки
+FIRST_CHILD = struct.Struct('>I')
+INTERNAL_ENTRY = struct.Struct('>QQI')  # разделитель (ключ, позиция), правый потомок
+LEAF, INTERNAL = 1, 2
+
+LEAF_CAPACITY = (BTREE_PAGE_SIZE - NODE_HEADER.size) // LEAF_ENTRY.size
+INTERNAL_CAPACITY = (BTREE_PAGE_SIZE - NODE_HEADER.size - FIRST_CHILD.size) // INTERNAL_ENTRY.size
+BULK_FILL = 0.9  # Заполнение узлов при построении из отсортированных данных
+MAX_POSITION = 2**64 - 1
+
+class _Node:
+    """Узел дерева в памяти: лист хранит пары (ключ, позиция), внутренний узел -
+    разделители и номера страниц потомков"""
+    
+    __slots__ = ('is_leaf', 'entries', 'children', 'next_leaf')
+    
+    def __init__(self, is_leaf: bool, entries: list = None, children: list = None, next_leaf: int = 0):
+        self.is_leaf = is_leaf
+        self.entries = entries if entries is not None else []
+        self.children = children if children is not None else []
+        self.next_leaf = next_leaf
+
+class BTreeIndex:
+    """B+дерево на страницах файла для числовых колонок
+    
+    Страница 0 - метаданные, остальные - узлы по BTREE_PAGE_SIZE байт.
+    Листья хранят отсортированные пары (ключ, позиция строки) и связаны
+    ссылками на следующий лист, поэтому диапазонный поиск спускается к
+    первому подходящему листу и дальше читает листья подряд, выдавая
+    позиции в порядке ключей. Пара (ключ, позиция) уникальна, что позволяет
+    хранить повторяющиеся ключи без отдельных списков.
+    
+    Удаление не объединяет узлы: опустевшие листья остаются в цепочке до
+    перестройки индекса (rebuild, например при VACUUM).
+    """
+    
+    kind = 'btree'
+    unique = False  # Значения ключа не повторяются (PRIMARY KEY или UNIQUE), задает движок
+    primary_key = False
+    
+    def __init__(self, table_name: str, column_name: str, file_pool: FileHandlePool = None,
+                 column: ColumnDefinition = None):
+        self.table_name = table_name
+        self.column_name = column_name
+        self.columns = [column_name]
+        self.filename = os.path.join(bad_subd_config.INDEX_DIR, f"{table_name}_{column_name}.btree")
+        self.file_pool = file_pool if file_pool is not None else FileHandlePool()
+        
+        if os.path.exists(self.filename) and os.path.getsize(self.filename) >= BTREE_PAGE_SIZE:
+            self._load_meta()
+        else:
+            self.rebuild([])
+    
+    def insert(self, key: int, row_position: int) -> None:
+        """Вставка ключа и позиции строки в индекс"""
+        self._insert_entry((key, row_position))
+        self._write_meta()
+    
+    def insert_many(self, entries: List[Tuple[int, int]]) -> None:
+        """Пакетная вставка пар (ключ, позиция) с одной записью метаданных"""
+        if not entries:
+            return
+        if self.entry_count == 0:
+            self.rebuild(entries)
+            return
+        
+        for entry in sorted(entries):
+            self._insert_entry(entry)
+        self._write_meta()
+    
+    def rebuild(self, entries: Iterable[Tuple[int, int]]) -> None:
+        """Построить дерево заново снизу вверх из пар (ключ, позиция) одной записью"""
+        entries = sorted(entries)
+        leaf_fill = max(1, int(LEAF_CAPACITY * BULK_FILL))
+        internal_fill = max(2, int(INTERNAL_CAPACITY * BULK_FILL))
+        
+        pages = [None]  # Страница 0 - метаданные
+        level = []  # (номер страницы, наименьшая пара поддерева)
+        chunks = [entries[i:i + leaf_fill] for i in range(0, len(entries), leaf_fill)] or [[]]
+        for i, chunk in enumerate(chunks):
+            page_no = len(pages)
+            next_leaf = page_no + 1 if i + 1 < len(chunks) else 0
+            pages.append(self._encode_node(_Node(True, chunk, next_leaf=next_leaf)))
+            level.append((page_no, chunk[0] if chunk else (0, 0)))
+        
+        while len(level) > 1:
+            upper = []
+            for i in range(0, len(level), internal_fill + 1):
+                group = level[i:i + internal_fill + 1]
+                node = _Node(False, [first for _, first in group[1:]], [page_no for page_no, _ in group])
+                upper.append((len(pages), group[0][1]))
+                pages.append(self._encode_node(node))
+            level = upper
+        
+        self.root = level[0][0]
+        self.page_count = len(pages)
+        self.entry_count = len(entries)
+        pages[0] = self._encode_meta()
+        
+        f = self.file_pool.get(self.filename, create=True)
+        f.seek(0)
+        f.write(b''.join(pages))
+        f.truncate()
+    
+    def find(self, key: int) -> List[int]:
+        """Поиск позиций строк по ключу"""
+        return list(self.find_range(key, key))
+    
+    def find_range(self, low: Optional[int] = None, high: Optional[int] = None,
+                   include_low: bool = True, include_high: bool = True) -> Iterator[int]:
+        """Позиции строк с ключами из диапазона в порядке возрастания ключа"""
+        if high is not None and (high < 0 or (high == 0 and not include_high)):
+            return
+        if low is not None and low < 0:
+            low, include_low = None, True
+        
+        if low is None:
+            start = (0, 0)
+        else:
+            start = (low, 0) if include_low else (low, MAX_POSITION)
+        
+        page_no = self._descend(start)[-1][0]
+        while True:
+            node = self._read_node(page_no)
+            for key, row_position in node.entries[bisect_left(node.entries, start):]:
+                if low is not None and key == low and not include_low:
+                    continue
+                if high is not None and (key > high or (key == high and not include_high)):
+                    return
+                yield row_position
+            if not node.next_leaf:
+                return
+            page_no = node.next_leaf
+            start = (0, 0)
+    
+    def estimate(self, key: int, limit: int = None) -> int:
+        """Количество записей ключа, но не больше limit"""
+        return self.estimate_range(key, key, limit=limit)
+    
+    def estimate_range(self, low: Optional[int] = None, high: Optional[int] = None,
+                       include_low: bool = True, include_high: bool = True, limit: int = None) -> int:
+        """Количество записей в диапазоне, но не больше limit
+        
+        Листья читаются только до limit записей, поэтому оценка стоит не
+        больше чтения limit позиций и остается точной после удалений.
+        """
+        return sum(1 for _ in islice(self.find_range(low, high, include_low, include_high), limit))
+    
+    def delete(self, key: int, row_position: int = None) -> None:
+        """Удаление из индекса"""
+        if row_position is None:
+            entries = [(key, position) for position in self.find(key)]
+        else:
+            entries = [(key, row_position)]
+        
+        self.delete_many(entries)
+    
+    def delete_many(self, entries: List[Tuple[int, int]]) -> None:
+        """Пакетное удаление пар (ключ, позиция): каждый измененный лист пишется один раз"""
+        leaves = {}
+        for entry in sorted(entries):
+            page_no, leaf, _ = self._descend(entry)[-1]
+            leaf = leaves.setdefault(page_no, leaf)
+            i = bisect_left(leaf.entries, entry)
+            if i < len(leaf.entries) and leaf.entries[i] == entry:
+                del leaf.entries[i]
+                self.entry_count -= 1
+        
+        for page_no, leaf in leaves.items():
+            self._write_node(page_no, leaf)
+        self._write_meta()
+    
+    def get_index_size(self) -> int:
+        """Получить размер индекса в байтах"""
+        if os.path.exists(self.filename):
+            return os.path.getsize(self.filename)
+        return 0
+    
+    def _insert_entry(self, entry: Tuple[int, int]) -> None:
+        path = self._descend(entry)
+        page_no, leaf, _ = path[-1]
+        i = bisect_left(leaf.entries, entry)
+        if i < len(leaf.entries) and leaf.entries[i] == entry:
+            return
+        leaf.entries.insert(i, entry)
+        self.entry_count += 1
+        
+        if len(leaf.entries) <= LEAF_CAPACITY:
+            self._write_node(page_no, leaf)
+            return
+        
+        # Разделение листа: правая половина уходит на новую страницу
+        mid = len(leaf.entries) // 2
+        right = _Node(True, leaf.entries[mid:], next_leaf=leaf.next_leaf)
+        right_page = self._allocate_page()
+        leaf.entries = leaf.entries[:mid]
+        leaf.next_leaf = right_page
+        self._write_node(page_no, leaf)
+        self._write_node(right_page, right)
+        self._insert_separator(path[:-1], page_no, right.entries[0], right_page)
+    
+    def _insert_separator(self, path: list, left_page: int, separator: Tuple[int, int], right_page: int) -> None:
+        """Добавить разделитель в родителя, разделяя внутренние узлы вверх по пути"""
+        while path:
+            page_no, node, child_index = path.pop()
+            node.entries.insert(child_index, separator)
+            node.children.insert(child_index + 1, right_page)
+            if len(node.entries) <= INTERNAL_CAPACITY:
+                self._write_node(page_no, node)
+                return
+            
+            mid = len(node.entries) // 2
+            separator = node.entries[mid]
+            right = _Node(False, node.entries[mid + 1:], node.children[mid + 1:])
+            right_page = self._allocate_page()
+            node.entries = node.entries[:mid]
+            node.children = node.children[:mid + 1]
+            self._write_node(page_no, node)
+            self._write_node(right_page, right)
+            left_page = page_no
+        
+        # Разделился корень - дерево растет на уровень
+        root_page = self._allocate_page()
+        self._write_node(root_page, _Node(False, [separator], [left_page, right_page]))
+        self.root = root_page
+    
+    def _descend(self, entry: Tuple[int, int]) -> List[Tuple[int, _Node, int]]:
+        """Путь от корня к листу: (страница, узел, номер выбранного потомка)"""
+        path = []
+        page_no = self.root
+        while True:
+            node = self._read_node(page_no)
+            if node.is_leaf:
+                path.append((page_no, node, 0))
+                return path
+            child_index = bisect_right(node.entries, entry)
+            path.append((page_no, node, child_index))
+            page_no = node.children[child_index]
+    
+    def _allocate_page(self) -> int:
+        self.page_count += 1
+        return self.page_count - 1
+    
+    def _read_node(self, page_no: int) -> _Node:
+        f = self.file_pool.get(self.filename, create=True)
+        f.seek(page_no * BTREE_PAGE_SIZE)
+        page = f.read(BTREE_PAGE_SIZE)
+        node_type, count, next_leaf = NODE_HEADER.unpack_from(page, 0)
+        
+        if node_type == LEAF:
+            values = struct.unpack_from(f'>{count * 2}Q', page, NODE_HEADER.size)
+            return _Node(True, list(zip(values[::2], values[1::2])), next_leaf=next_leaf)
+        
+        children = [FIRST_CHILD.unpack_from(page, NODE_HEADER.size)[0]]
+        entries = []
+        start = NODE_HEADER.size + FIRST_CHILD.size
+        for key, row_position, child in INTERNAL_ENTRY.iter_unpack(page[start:start + count * INTERNAL_ENTRY.size]):
+            entries.append((key, row_position))
+            children.append(child)
+        return _Node(False, entries, children)
+    
+    def _encode_node(self, node: _Node) -> bytes:
+        page = bytearray(BTREE_PAGE_SIZE)
+        if node.is_leaf:
+            NODE_HEADER.pack_into(page, 0, LEAF, len(node.entries), node.next_leaf)
+            for i, entry in enumerate(node.entries):
+                LEAF_ENTRY.pack_into(page, NODE_HEADER.size + i * LEAF_ENTRY.size, *entry)
+        else:
+            NODE_HEADER.pack_into(page, 0, INTERNAL, len(node.entries), 0)
+            FIRST_CHILD.pack_into(page, NODE_HEADER.size, node.children[0])
+            start = NODE_HEADER.size + FIRST_CHILD.size
+            for i, ((key, row_position), child) in enumerate(zip(node.entries, node.children[1:])):
+                INTERNAL_ENTRY.pack_into(page, start + i * INTERNAL_ENTRY.size, key, row_position, child)
+        return bytes(page)
+    
+    def _write_node(self, page_no: int, node: _Node) -> None:
+        f = self.file_pool.get(self.filename, create=True)
+        f.seek(page_no * BTREE_PAGE_SIZE)
+        f.write(self._encode_node(node))
+    
+    def _encode_meta(self) -> bytes:
+        return META.pack(BTREE_MAGIC, self.root, self.page_count, self.entry_count).ljust(BTREE_PAGE_SIZE, b'\x00')
+    
+    def _write_meta(self) -> None:
+        f = self.file_pool.get(self.filename, create=True)
+        f.seek(0)
+        f.write(self._encode_meta())
+    
+    def _load_meta(self) -> None:
+        with open(self.filename, 'rb') as f:
+            magic, self.root, self.page_count, self.entry_count = META.unpack(f.read(META.size))
+        if magic != BTREE_MAGIC:
+            raise ValueError(f"{self.filename} is not a B+tree index file")
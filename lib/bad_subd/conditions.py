@@ -0,0 +1,80 @@
+import re
+from dataclasses import dataclass
+from typing import Any, List
+
+def tokenize(text: str) -> List[str]:
+    """Слова текста в нижнем регистре (последовательности букв и цифр)"""
+    return re.findall(r'\w+', text.lower())
+
+class Condition:
+    """Условие WHERE, отличное от равенства
+    
+    Такие условия не сравниваются байтами в файле: строка сначала
+    декодируется, затем проверяется методом matches.
+    """
+    
+    def matches(self, value: Any) -> bool:
+        raise NotImplementedError
+
+@dataclass(frozen=True)
+class Range(Condition):
+    """Условие-диапазон в WHERE: low <(=) значение <(=) high
+    
+    Значение словаря where может быть не только константой (равенство),
+    но и Range: {'id': Range(10, 20)} - это id BETWEEN 10 AND 20,
+    {'id': Range(high=5, include_high=False)} - это id < 5.
+    None вместо границы означает отсутствие ограничения.
+    """
+    low: Any = None
+    high: Any = None
+    include_low: bool = True
+    include_high: bool = True
+    
+    def matches(self, value: Any) -> bool:
+        """Попадает ли значение в диапазон"""
+        if value is None:
+            return False
+        try:
+            if self.low is not None:
+                if value < self.low or (value == self.low and not self.include_low):
+                    return False
+            if self.high is not None:
+                if value > self.high or (value == self.high and not self.include_high):
+                    return False
+        except TypeError:
+            return False
+        return True
+    
+    def intersect(self, other: 'Range') -> 'Range':
+        """Пересечение двух диапазонов (id > 5 AND id <= 10)"""
+        low, include_low = self.low, self.include_low
+        if other.low is not None and (low is None or other.low > low or
+                                      (other.low == low and not other.include_low)):
+            low, include_low = other.low, other.include_low
+        
+        high, include_high = self.high, self.include_high
+        if other.high is not None and (high is None or other.high < high or
+                                       (other.high == high and not other.include_high)):
+            high, include_high = other.high, other.include_high
+        
+        return Range(low, high, include_low, include_high)
+
+@dataclass(frozen=True)
+class Match(Condition):
+    """Полнотекстовое условие: значение содержит все слова запроса
+    
+    {'text': Match('математике геометрия')} - в тексте есть оба слова.
+    Слова выделяются tokenize, поэтому регистр, порядок слов и знаки между
+    ними (например '&') не важны. Запрос без слов подходит любой строке.
+    """
+    query: str
+    
+    @property
+    def terms(self) -> List[str]:
+        return sorted(set(tokenize(self.query)))
+    
+    def matches(self, value: Any) -> bool:
+        """Есть ли в значении все слова запроса"""
+        if not isinstance(value, str):
+            return False
+        return set(self.terms) <= set(tokenize(value))
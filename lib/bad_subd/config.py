@@ -14,6 +14,16 @@ class CustomDBConfig:
     CHAR_SIZE: int = 4  # 4 байта на символ в UTF-32
     MAX_VARCHAR_SIZE: int = 255  # Максимальная длина строки
     
+    USE_MMAP: bool = False  # Чтение файлов таблиц через mmap
+    MAX_OPEN_FILES: int = 64  # Размер пула открытых файлов движка
+    PAGE_SIZE: int = 8192  # Размер страницы таблиц с форматом utf8
+    INDEX_LOG_MIN_RECORDS: int = 4096  # Минимум записей журнала индекса до слияния с основным файлом
+    INDEX_BUILD_RUN_ENTRIES: int = 500000  # Пар в памяти при построении индекса, больше - внешняя сортировка
+    BLOOM_FALSE_POSITIVE_RATE: float = 0.01  # Доля ложных срабатываний фильтра Блума при расчетной емкости
+    STATS_HISTOGRAM_BUCKETS: int = 32  # Корзин равной глубины в гистограмме колонки (ANALYZE)
+    STATS_SAMPLE_ROWS: int = 30000  # Размер случайной выборки значений для границ гистограммы
+    STATS_DISTINCT_SKETCH: int = 4096  # Наименьших хэшей для оценки числа различных значений
+    
     def __post_init__(self):
         os.makedirs(self.SCHEMA_DIR, exist_ok=True)
         os.makedirs(self.TABLE_DIR, exist_ok=True)
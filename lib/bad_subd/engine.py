@@ -1,26 +1,65 @@
 import os
-from typing import List, Dict, Any, Optional
+import time
+from collections import defaultdict
+from typing import List, Dict, Any, Optional, Union, Iterable, Iterator
 from .schema import TableSchema, SchemaManager, ColumnDefinition
-from .storage import UTF32RowStorage
-from .index import SimpleHashIndex
+from .storage import UTF32RowStorage, create_storage
+from .index import SimpleHashIndex, CompositeHashIndex
+from .btree_index import BTreeIndex
+from .fulltext_index import FullTextIndex
+from .bloom_filter import BloomFilter
+from .conditions import Condition
+from .planner import QueryPlanner, QueryPlan
+from .table_statistics import TableStatistics, collect_statistics
 from .table_file import TableFileManager
+from .file_pool import FileHandlePool
 from .config import bad_subd_config
 
+INDEX_KINDS = {
+    'hash': SimpleHashIndex,
+    'btree': BTreeIndex,
+    'fulltext': FullTextIndex,
+    'bloom': BloomFilter
+}
+
+# Открытые индексы общие для всех движков процесса (ключ - каталог индексов).
+# У индекса есть состояние в памяти - дельта журнала, метаданные дерева, биты
+# фильтра, - и у второго движка с собственной копией оно расходилось бы с файлом
+_open_indexes: Dict[str, Dict[str, Dict[str, SimpleHashIndex]]] = {}
+
 class BadSUBDEngine:
     """Движок собственной СУБД с UTF-32 хранением"""
     
-    def __init__(self, base_path: str = None):
+    def __init__(self, base_path: str = None, use_mmap: bool = None):
         self.base_path = base_path or bad_subd_config.BASE_DATA_DIR
         self.schema_manager = SchemaManager()
-        self.table_manager = TableFileManager()
-        self.indexes: Dict[str, Dict[str, SimpleHashIndex]] = {}
+        self.file_pool = FileHandlePool()
+        self.table_manager = TableFileManager(use_mmap=use_mmap, file_pool=self.file_pool)
+        # Индексы таблиц по имени: колонка или 'a+b' для составного индекса.
+        # Заполняется лениво из каталога в схеме (_get_indexes) и общий для
+        # движков процесса, работающих с теми же файлами
+        self.indexes: Dict[str, Dict[str, SimpleHashIndex]] = _open_indexes.setdefault(
+            os.path.abspath(bad_subd_config.INDEX_DIR), {})
         self.storages: Dict[str, UTF32RowStorage] = {}
+        self.statistics: Dict[str, Optional[TableStatistics]] = {}  # Статистика ANALYZE, загружается лениво
+        self.planner = QueryPlanner(self)
+        self.last_plan: Optional[QueryPlan] = None  # План последнего select
     
-    def create_table(self, table_name: str, columns: List[Dict]) -> None:
-        """Создание таблицы с указанием размера VARCHAR"""
+    def create_table(self, table_name: str, columns: List[Dict], storage_format: str = 'utf32') -> None:
+        """Создание таблицы с указанием размера VARCHAR
+        
+        storage_format: 'utf32' - строки фиксированной длины в UTF-32,
+        'utf8' - строки переменной длины в UTF-8 на страницах со слотами.
+        Колонка с 'primary_key': True или 'unique': True получает уникальный
+        хэш-индекс, которым проверяются вставки.
+        """
         if self.schema_manager.schema_exists(table_name):
             raise ValueError(f"Table {table_name} already exists")
         
+        primary_keys = [col['name'] for col in columns if col.get('primary_key')]
+        if len(primary_keys) > 1:
+            raise ValueError("Only one PRIMARY KEY column is supported")
+        
         # Создаем схему с указанием размера VARCHAR
         column_defs = []
         for col in columns:
@@ -32,87 +71,217 @@ class BadSUBDEngine:
             else:
                 raise ValueError(f"Unsupported data type: {col['type']}")
         
-        schema = TableSchema(table_name, column_defs)
+        storage = create_storage(column_defs, storage_format)
+        schema = TableSchema(table_name, column_defs, primary_key=primary_keys[0] if primary_keys else None,
+                             storage_format=storage_format)
         self.schema_manager.save_schema(schema)
         
         # Создаем хранилище
-        self.storages[table_name] = UTF32RowStorage(schema.columns)
+        self.storages[table_name] = storage
+        self.indexes[table_name] = {}
         
         # Создаем файл таблицы
         self.table_manager.create_table_file(schema)
         
-        print(f"Table '{table_name}' created with UTF-32 storage")
-        print(f"Row size: {self.storages[table_name].row_size} bytes")
+        if storage.format == 'utf8':
+            print(f"Table '{table_name}' created with UTF-8 slotted page storage")
+            print(f"Max row size: {storage.max_row_size} bytes")
+        else:
+            print(f"Table '{table_name}' created with UTF-32 storage")
+            print(f"Row size: {storage.row_size} bytes")
+        
+        # Ограничения PRIMARY KEY и UNIQUE держатся на уникальных индексах
+        for col in columns:
+            if col.get('primary_key') or col.get('unique'):
+                self.create_index(table_name, col['name'], unique=True)
     
-    def create_index(self, table_name: str, column_name: str) -> None:
-        """Создание индекса для числовой колонки"""
-        schema = self.schema_manager.load_schema(table_name)
-        column = next((c for c in schema.columns if c.name == column_name), None)
+    def create_index(self, table_name: str, column_name: Union[str, List[str]], kind: str = 'hash',
+                     unique: bool = False) -> None:
+        """Создание индекса для колонки или упорядоченного списка колонок
         
-        if not column:
-            raise ValueError(f"Column {column_name} not found in table {table_name}")
-        if column.data_type != 'INT':
-            raise ValueError("Indexes only supported for INT columns")
+        kind: 'hash' - поиск по равенству (INT и VARCHAR), 'btree' - B+дерево
+        для INT, которое обслуживает и диапазоны (Range в where) в порядке ключей,
+        'fulltext' - инвертированный индекс слов VARCHAR для условий Match,
+        'bloom' - фильтр Блума, который отвечает на равенство с отсутствующим
+        значением без чтения таблицы.
+        Список колонок создает составной хэш-индекс, который используется,
+        когда WHERE задает равенства для ведущих колонок.
+        unique: значения колонки не могут повторяться (вставка дубликата отклоняется).
+        Уникальность поддерживают 'hash' и 'btree'; индекс, заменяющий
+        уникальный, остается уникальным.
+        У колонки один индекс: новый заменяет прежний и удаляет его файлы.
+        Фильтр Блума не заменяет индекс другого вида - поиск по равенству
+        потерял бы индекс.
+        """
+        column_names = [column_name] if isinstance(column_name, str) else list(column_name)
+        if unique and len(column_names) > 1:
+            raise ValueError("Unique indexes are only supported on a single column")
         
-        if table_name not in self.indexes:
-            self.indexes[table_name] = {}
+        schema = self.schema_manager.load_schema(table_name)
+        # Новый индекс на колонке PRIMARY KEY/UNIQUE заменяет уникальный и должен
+        # сохранить ограничение
+        if any(entry['columns'] == column_names and entry.get('unique') for entry in schema.indexes):
+            unique = True
+        if unique and kind not in ('hash', 'btree'):
+            raise ValueError(f"Index kind '{kind}' cannot enforce uniqueness of {'+'.join(column_names)}")
+        previous = self._get_indexes(table_name).get('+'.join(column_names))
+        if kind == 'bloom' and previous is not None and previous.kind != 'bloom':
+            raise ValueError(f"Column {table_name}.{column_names[0]} already has a '{previous.kind}' index")
+        index = self._open_index(schema, column_names, kind, unique)
+        storage = self._get_storage(table_name)
+        if unique:
+            self._check_unique_data(table_name, storage, index.column_name)
+        self._get_indexes(table_name)[index.column_name] = index
         
-        index = SimpleHashIndex(table_name, column_name)
-        self.indexes[table_name][column_name] = index
+        # Построение индекса для существующих данных: один проход по таблице и одна
+        # запись файла индекса; rebuild заодно отбрасывает устаревший файл с диска
+        rows = self.table_manager.scan_rows(table_name, storage, column_names)
+        index.rebuild((self._index_key(index, row), row['_position']) for row in rows)
         
-        # Построение индекса для существующих данных
-        storage = self._get_storage(table_name)
-        for row in self.table_manager.scan_rows(table_name, storage):
-            if column_name in row:
-                index.insert(row[column_name], row['_position'])
+        # Индекс записывается в каталог схемы, чтобы его нашли после перезапуска
+        schema.indexes = [entry for entry in schema.indexes if entry['columns'] != column_names]
+        entry = {'columns': column_names, 'kind': kind}
+        if unique:
+            entry['unique'] = True
+        schema.indexes.append(entry)
+        self.schema_manager.save_schema(schema)
+        if previous is not None and previous.filename != index.filename:
+            self._remove_index_files(previous)
         
-        print(f"Index created on {table_name}.{column_name}")
+        print(f"Index created on {table_name}.{index.column_name}")
     
     def insert(self, table_name: str, values: Dict[str, Any]) -> bool:
         """Вставка данных в таблицу"""
         try:
             storage = self._get_storage(table_name)
+            self._check_unique(table_name, storage, values)
             
             # Вставка
             position = self.table_manager.insert_row(table_name, values, storage)
             
-            # Обновление индексов
-            if table_name in self.indexes:
-                for col_name, index in self.indexes[table_name].items():
-                    if col_name in values:
-                        index.insert(values[col_name], position)
+            # Обновление индексов: отсутствующие колонки индексируются записанным значением
+            stored = self._stored_row(storage, values)
+            for index in self._get_indexes(table_name).values():
+                index.insert(self._index_key(index, stored), position)
+            self._rebuild_overfull_filters(table_name, storage)
             
             return True
-            
+        
         except Exception as e:
             print(f"Insert failed: {e}")
             return False
     
-    def select(self, table_name: str, columns: List[str] = None, where: Dict = None) -> List[Dict[str, Any]]:
+    def insert_many(self, table_name: str, rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """Пакетная вставка строк
+        
+        Строки пишутся одной записью, заголовок и индексы обновляются один раз.
+        Строки с некорректными значениями или повторяющимися значениями
+        уникальных колонок пропускаются и попадают в 'rejected' как пары
+        (номер строки, ошибка).
+        """
+        storage = self._get_storage(table_name)
+        row_numbers, accepted, rejected = self._split_unique_rows(table_name, storage, rows)
+        inserted, invalid = self.table_manager.insert_rows(table_name, accepted, storage)
+        inserted = [(row_numbers[i], position) for i, position in inserted]
+        rejected = sorted(rejected + [(row_numbers[i], error) for i, error in invalid])
+        
+        stored = [(self._stored_row(storage, rows[row_number]), position) for row_number, position in inserted]
+        for index in self._get_indexes(table_name).values():
+            index.insert_many([(self._index_key(index, row), position) for row, position in stored])
+        self._rebuild_overfull_filters(table_name, storage)
+        
+        return {'inserted': len(inserted), 'rejected': rejected}
+    
+    def select(self, table_name: str, columns: List[str] = None, where: Dict = None,
+               limit: int = None, offset: int = 0) -> List[Dict[str, Any]]:
         """Выборка данных из таблицы"""
+        return list(self.select_iter(table_name, columns, where, limit, offset))
+    
+    def select_iter(self, table_name: str, columns: List[str] = None, where: Dict = None,
+                    limit: int = None, offset: int = 0) -> Iterator[Dict[str, Any]]:
+        """Выборка строк по одной
+        
+        Строки отдаются по мере чтения, поэтому память не зависит от размера
+        результата, а чтение файла прекращается, как только получены offset +
+        limit строк или потребитель перестал брать строки.
+        """
+        if limit is not None and limit <= 0:
+            return
         storage = self._get_storage(table_name)
-        results = []
-        
-        # Используем индекс если есть подходящий
-        if where and table_name in self.indexes:
-            for col_name, value in where.items():
-                if col_name in self.indexes[table_name]:
-                    positions = self.indexes[table_name][col_name].find(value)
-                    for pos in positions:
-                        try:
-                            row = self.table_manager.read_row_at_position(table_name, pos, storage)
-                            if self._matches_where(row, where):
-                                results.append(self._project_columns(row, columns))
-                        except:
-                            continue  # Игнорируем удаленные строки
-                    return results
-        
-        # Полное сканирование таблицы
-        for row in self.table_manager.scan_rows(table_name, storage):
-            if self._matches_where(row, where):
-                results.append(self._project_columns(row, columns))
+        needed = self._required_columns(columns, where)
         
-        return results
+        # Условия равенства кодируются в байты один раз для фильтрации без декодирования
+        raw_filter = storage.encode_filter(where)
+        if raw_filter is None:
+            return
+        
+        # Равенство по уникальной колонке - после первой найденной строки искать нечего
+        single_row = self._is_unique_lookup(table_name, where)
+        to_skip = offset
+        to_return = limit
+        
+        # Планировщик выбирает индекс, пересечение индексов или скан
+        self.last_plan = self.planner.plan(table_name, where)
+        positions = self.last_plan.positions()
+        if positions is not None:
+            rows = self._read_positions(table_name, storage, positions, needed)
+        else:
+            rows = self.table_manager.scan_rows(table_name, storage, needed, raw_filter)
+        
+        for row in rows:
+            if not self._matches_where(row, where):
+                continue
+            if to_skip:
+                to_skip -= 1
+            else:
+                yield self._project_columns(row, columns)
+                if to_return is not None:
+                    to_return -= 1
+                    if not to_return:
+                        return
+            if single_row:
+                return
+    
+    def update(self, table_name: str, values: Dict[str, Any], where: Dict = None) -> int:
+        """Обновление строк под условием WHERE, возвращает число обновленных строк
+        
+        Строки находятся по плану планировщика и перезаписываются на своих
+        позициях: строки фиксированной длины всегда на месте, строка utf8 -
+        на месте, если помещается в свою страницу, иначе переносится.
+        Индексы обновляются только для изменившихся ключей (и для всех
+        индексов перенесенной строки); вставки в индекс идут одним пакетом.
+        """
+        storage = self._get_storage(table_name)
+        column_names = {col.name for col in storage.columns}
+        for column_name, value in values.items():
+            if column_name not in column_names:
+                raise ValueError(f"Unknown column {column_name}")
+            if self._stored_value(storage, column_name, value) is None:
+                raise ValueError(f"Invalid value {value!r} for column {column_name}")
+        
+        # Цели собираются до записи, чтобы перенесенные строки не встретились снова
+        targets = list(self._find_rows(table_name, storage, where))
+        if not targets:
+            return 0
+        self._check_unique_update(table_name, storage, values, targets)
+        
+        indexes = self._get_indexes(table_name).values()
+        inserted = defaultdict(list)
+        for row in targets:
+            position = row['_position']
+            new_row = self._stored_row(storage, {**row, **values})
+            new_position = self.table_manager.update_row(table_name, position, new_row, storage)
+            
+            for index in indexes:
+                old_key, new_key = self._index_key(index, row), self._index_key(index, new_row)
+                if old_key != new_key or new_position != position:
+                    index.delete(old_key, position)
+                    inserted[index].append((new_key, new_position))
+        
+        for index, entries in inserted.items():
+            index.insert_many(entries)
+        self._rebuild_overfull_filters(table_name, storage)
+        return len(targets)
     
     def delete(self, table_name: str, where: Dict = None) -> int:
         """Удаление данных из таблицы"""
@@ -120,33 +289,82 @@ class BadSUBDEngine:
         deleted_count = 0
         
         if where:
-            # Удаление по условию WHERE
-            rows_to_delete = []
-            for row in self.table_manager.scan_rows(table_name, storage):
-                if self._matches_where(row, where):
-                    rows_to_delete.append((row['_position'], row))
+            # Удаление по условию WHERE: строки находит планировщик, в памяти
+            # остаются только позиции и ключи индексов
+            indexes = self._get_indexes(table_name)
+            needed = set(where) | self._indexed_columns(table_name)
+            positions = []
+            index_entries = defaultdict(list)
+            for row in self._find_rows(table_name, storage, where, needed):
+                positions.append(row['_position'])
+                for name, index in indexes.items():
+                    index_entries[name].append((self._index_key(index, row), row['_position']))
             
-            # Помечаем строки как удаленные
-            for pos, row in rows_to_delete:
-                file_path = self.table_manager._get_table_path(table_name)
-                with open(file_path, 'r+b') as f:
-                    f.seek(pos)
-                    f.write(b'\x01')  # Флаг удаления
-                    deleted_count += 1
-                
-                # Обновляем индексы
-                if table_name in self.indexes:
-                    for col_name, index in self.indexes[table_name].items():
-                        if col_name in row:
-                            index.delete(row[col_name], pos)
+            # Метки удаления пишутся одним проходом, индексы обновляются по разу
+            deleted_count = self.table_manager.delete_rows_at_positions(table_name, positions, storage)
+            for name, entries in index_entries.items():
+                indexes[name].delete_many(entries)
         else:
             # DELETE * - полная очистка таблицы
             schema = self.schema_manager.load_schema(table_name)
             self.table_manager.create_table_file(schema)
+            for index in self._get_indexes(table_name).values():
+                index.rebuild([])
             deleted_count = -1  # Специальное значение
         
         return deleted_count
     
+    def vacuum(self, table_name: str) -> Dict[str, Any]:
+        """Сжатие таблицы: перезапись без удаленных строк и перестройка индексов
+        
+        Новые позиции строк получаются за тот же проход, что и перезапись
+        файла, поэтому все индексы таблицы перестраиваются без повторного скана.
+        """
+        start_time = time.perf_counter()
+        schema = self.schema_manager.load_schema(table_name)
+        storage = self._get_storage(table_name)
+        file_path = self.table_manager._get_table_path(table_name)
+        indexes = self._get_indexes(table_name)
+        
+        size_before = os.path.getsize(file_path)
+        live_rows, rows = self.table_manager.vacuum_table(schema, storage, self._indexed_columns(table_name))
+        for index in indexes.values():
+            index.rebuild([(self._index_key(index, row), row['_position']) for row in rows])
+        size_after = os.path.getsize(file_path)
+        
+        return {
+            'table_name': table_name,
+            'live_rows': live_rows,
+            'bytes_before': size_before,
+            'bytes_after': size_after,
+            'bytes_reclaimed': size_before - size_after,
+            'elapsed_seconds': time.perf_counter() - start_time
+        }
+    
+    def analyze(self, table_name: str) -> TableStatistics:
+        """Сбор статистики таблицы одним проходом по живым строкам (ANALYZE)
+        
+        Статистика сохраняется рядом со схемой и при изменении данных не
+        обновляется: до следующего ANALYZE она описывает таблицу на момент сбора.
+        """
+        schema = self.schema_manager.load_schema(table_name)
+        storage = self._get_storage(table_name)
+        statistics = collect_statistics(table_name, [col.name for col in schema.columns],
+                                        self.table_manager.scan_rows(table_name, storage))
+        self.schema_manager.save_statistics(statistics)
+        self.statistics[table_name] = statistics
+        return statistics
+    
+    def get_statistics(self, table_name: str) -> Optional[TableStatistics]:
+        """Статистика последнего ANALYZE (None - таблица не анализировалась)"""
+        if table_name not in self.statistics:
+            self.statistics[table_name] = self.schema_manager.load_statistics(table_name)
+        return self.statistics[table_name]
+    
+    def explain(self, table_name: str, where: Dict = None) -> QueryPlan:
+        """План, который select выбрал бы для условия, без выполнения"""
+        return self.planner.plan(table_name, where)
+    
     def get_table_info(self, table_name: str) -> Dict:
         """Получить информацию о таблице"""
         schema = self.schema_manager.load_schema(table_name)
@@ -156,24 +374,272 @@ class BadSUBDEngine:
             'table_name': table_name,
             'columns': [{'name': col.name, 'type': col.data_type, 'size': col.size} for col in schema.columns],
             'row_size': storage.row_size,
+            'storage_format': schema.storage_format,
+            'primary_key': schema.primary_key,
+            'file_size': os.path.getsize(self.table_manager._get_table_path(table_name)),
             'total_rows': self.table_manager.get_total_rows(table_name),
-            'indexes': list(self.indexes.get(table_name, {}).keys())
+            'indexes': list(self._get_indexes(table_name).keys())
         }
     
+    def close(self) -> None:
+        """Закрыть открытые файлы таблиц и индексов"""
+        self.table_manager.close()
+    
+    def __enter__(self) -> 'BadSUBDEngine':
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+    
     def _get_storage(self, table_name: str) -> UTF32RowStorage:
         """Получить объект хранилища для таблицы"""
         if table_name not in self.storages:
             schema = self.schema_manager.load_schema(table_name)
-            self.storages[table_name] = UTF32RowStorage(schema.columns)
+            self.storages[table_name] = create_storage(schema.columns, schema.storage_format)
         return self.storages[table_name]
     
+    def _open_index(self, schema: TableSchema, column_names: List[str], kind: str, unique: bool = False):
+        """Объект индекса по колонкам таблицы (файл открывается, но не перестраивается)"""
+        if kind not in INDEX_KINDS:
+            raise ValueError(f"Unsupported index kind: {kind}")
+        
+        table_name = schema.table_name
+        columns = []
+        for name in column_names:
+            column = next((c for c in schema.columns if c.name == name), None)
+            if not column:
+                raise ValueError(f"Column {name} not found in table {table_name}")
+            columns.append(column)
+        
+        if kind == 'btree' and any(column.data_type != 'INT' for column in columns):
+            raise ValueError("B+tree indexes only supported for INT columns")
+        
+        if len(columns) > 1:
+            if kind != 'hash':
+                raise ValueError("Composite indexes only support kind='hash'")
+            return CompositeHashIndex(table_name, columns, self.file_pool)
+        index = INDEX_KINDS[kind](table_name, column_names[0], self.file_pool, columns[0])
+        index.unique = unique
+        index.primary_key = unique and column_names[0] == schema.primary_key
+        return index
+    
+    def _rebuild_overfull_filters(self, table_name: str, storage) -> None:
+        """Перестроить по таблице фильтры Блума, принявшие больше значений, чем рассчитаны"""
+        for index in self._get_indexes(table_name).values():
+            if index.kind == 'bloom' and index.overfull:
+                rows = self.table_manager.scan_rows(table_name, storage, index.columns)
+                index.rebuild((self._index_key(index, row), row['_position']) for row in rows)
+    
+    def _remove_index_files(self, index) -> None:
+        """Удалить файлы индекса, замененного индексом другого вида"""
+        for file_path in (index.filename, getattr(index, 'log_filename', None)):
+            if file_path is None:
+                continue
+            index.file_pool.release(file_path)
+            if os.path.exists(file_path):
+                os.remove(file_path)
+    
+    def _get_indexes(self, table_name: str) -> Dict[str, SimpleHashIndex]:
+        """Индексы таблицы; при первом обращении открываются по каталогу из схемы"""
+        if table_name not in self.indexes:
+            schema = self.schema_manager.load_schema(table_name)
+            indexes = {}
+            for entry in schema.indexes:
+                index = self._open_index(schema, entry['columns'], entry['kind'], entry.get('unique', False))
+                indexes[index.column_name] = index
+            self.indexes[table_name] = indexes
+        return self.indexes[table_name]
+    
+    def _read_positions(self, table_name: str, storage, positions: Iterable[int],
+                        needed: Optional[set]) -> Iterator[Dict[str, Any]]:
+        """Строки по позициям из индекса с '_position'; удаленные строки пропускаются"""
+        for pos in positions:
+            try:
+                row = self.table_manager.read_row_at_position(table_name, pos, storage, needed)
+            except:
+                continue  # Игнорируем удаленные строки
+            if not row['_deleted']:
+                row['_position'] = pos
+                yield row
+    
+    def _find_rows(self, table_name: str, storage, where: Dict = None,
+                   needed: Optional[set] = None) -> Iterator[Dict[str, Any]]:
+        """Живые строки под условием с '_position' по плану планировщика"""
+        raw_filter = storage.encode_filter(where)
+        if raw_filter is None:
+            return
+        positions = self.planner.plan(table_name, where).positions()
+        if positions is not None:
+            rows = self._read_positions(table_name, storage, positions, needed)
+        else:
+            rows = self.table_manager.scan_rows(table_name, storage, needed, raw_filter)
+        for row in rows:
+            if self._matches_where(row, where):
+                yield row
+    
+    def _check_unique_update(self, table_name: str, storage, values: Dict[str, Any],
+                             targets: List[Dict[str, Any]]) -> None:
+        """Проверка, что UPDATE не создаст повторов в уникальных колонках
+        
+        Одно значение нельзя записать в несколько строк, а занятое значение -
+        в строку, которой оно не принадлежит.
+        """
+        for index in self._get_indexes(table_name).values():
+            if not index.unique or index.column_name not in values:
+                continue
+            column_name = index.column_name
+            if index.primary_key and values[column_name] is None:
+                raise ValueError(f"Primary key column {column_name} cannot be NULL")
+            
+            value = self._stored_value(storage, column_name, values[column_name])
+            if len(targets) > 1:
+                raise ValueError(f"Duplicate value {value!r} for unique column {column_name}")
+            position = self._find_unique(table_name, storage, index, value)
+            if position is not None and position != targets[0]['_position']:
+                raise ValueError(f"Duplicate value {value!r} for unique column {column_name}")
+    
+    def _is_equality(self, where: Dict, column_name: str) -> bool:
+        """Задает ли WHERE для колонки равенство (а не диапазон)"""
+        return column_name in where and not isinstance(where[column_name], Condition)
+    
+    def _definitely_absent(self, table_name: str, where: Dict) -> bool:
+        """Фильтр Блума колонки из WHERE подтверждает, что подходящих строк нет"""
+        if not where:
+            return False
+        return any(index.kind == 'bloom' and self._is_equality(where, index.column_name)
+                   and not index.might_contain(where[index.column_name])
+                   for index in self._get_indexes(table_name).values())
+    
+    def _is_unique_lookup(self, table_name: str, where: Dict) -> bool:
+        """WHERE задает равенство для уникальной колонки - подходит не больше одной строки"""
+        if not where:
+            return False
+        return any(index.unique and self._is_equality(where, index.column_name)
+                   for index in self._get_indexes(table_name).values())
+    
+    def _check_unique(self, table_name: str, storage, values: Dict[str, Any],
+                      batch_values: Dict[str, set] = None) -> Dict[str, Any]:
+        """Проверка PRIMARY KEY и UNIQUE одной пробой индекса на колонку
+        
+        Возвращает записываемые значения уникальных колонок; batch_values -
+        значения, уже занятые строками той же пакетной вставки.
+        """
+        checked = {}
+        for index in self._get_indexes(table_name).values():
+            if not index.unique:
+                continue
+            column_name = index.column_name
+            if index.primary_key and values.get(column_name) is None:
+                raise ValueError(f"Primary key column {column_name} cannot be NULL")
+            
+            value = self._stored_value(storage, column_name, values.get(column_name))
+            if value is None:
+                continue  # Некорректное значение отклонит сериализация строки
+            if ((batch_values and value in batch_values[column_name])
+                    or self._find_unique(table_name, storage, index, value) is not None):
+                raise ValueError(f"Duplicate value {value!r} for unique column {column_name}")
+            checked[column_name] = value
+        return checked
+    
+    def _split_unique_rows(self, table_name: str, storage, rows: List[Dict[str, Any]]):
+        """Разделить пакет на строки для вставки и нарушающие уникальность
+        
+        Возвращает номера принятых строк, сами строки и пары (номер строки, ошибка).
+        """
+        if not any(index.unique for index in self._get_indexes(table_name).values()):
+            return list(range(len(rows))), rows, []
+        
+        row_numbers, accepted, rejected = [], [], []
+        batch_values = defaultdict(set)
+        for row_number, row in enumerate(rows):
+            try:
+                storage.serialize_row(row)
+            except (ValueError, TypeError, AttributeError):
+                # Строку отклонит insert_rows со своей ошибкой; ее значения ничего не занимают
+                row_numbers.append(row_number)
+                accepted.append(row)
+                continue
+            try:
+                checked = self._check_unique(table_name, storage, row, batch_values)
+            except ValueError as e:
+                rejected.append((row_number, str(e)))
+                continue
+            for column_name, value in checked.items():
+                batch_values[column_name].add(value)
+            row_numbers.append(row_number)
+            accepted.append(row)
+        return row_numbers, accepted, rejected
+    
+    def _check_unique_data(self, table_name: str, storage, column_name: str) -> None:
+        """Проверка, что в уже записанных строках значения колонки не повторяются"""
+        seen = set()
+        for row in self.table_manager.scan_rows(table_name, storage, [column_name]):
+            value = row.get(column_name)
+            if value in seen:
+                raise ValueError(f"Column {column_name} has duplicate value {value!r}")
+            seen.add(value)
+    
+    def _find_unique(self, table_name: str, storage, index, value: Any) -> Optional[int]:
+        """Позиция строки с таким значением уникальной колонки
+        
+        Кандидаты хэш-индекса VARCHAR перепроверяются чтением строки.
+        """
+        for position in index.find(value):
+            row = self.table_manager.read_row_at_position(table_name, position, storage, [index.column_name])
+            if not row['_deleted'] and row.get(index.column_name) == value:
+                return position
+        return None
+    
+    def _stored_value(self, storage, column_name: str, value: Any) -> Any:
+        """Значение колонки в том виде, в котором оно запишется (None - не запишется)"""
+        column = next(col for col in storage.columns if col.name == column_name)
+        if column.data_type == 'INT':
+            value = value if value is not None else 0
+            return value if isinstance(value, int) and 0 <= value <= 2**64 - 1 else None
+        value = value if value is not None else ""
+        return value[:column.size] if isinstance(value, str) else None
+    
+    def _equality_prefix(self, index, where: Dict) -> tuple:
+        """Значения ведущих колонок индекса, заданные в WHERE равенством"""
+        prefix = []
+        for col_name in index.columns:
+            if col_name not in where or isinstance(where[col_name], Condition):
+                break
+            prefix.append(where[col_name])
+        return tuple(prefix)
+    
+    def _index_key(self, index, row: Dict) -> Any:
+        """Ключ строки для индекса: значение колонки или кортеж значений составного индекса"""
+        if len(index.columns) == 1:
+            return row.get(index.columns[0])
+        return tuple(row.get(col) for col in index.columns)
+    
+    def _stored_row(self, storage, values: Dict[str, Any]) -> Dict[str, Any]:
+        """Значения всех колонок строки так, как она записывается: None и
+        отсутствующие колонки заменяются значениями по умолчанию (0 и '')"""
+        return {col.name: values[col.name] if values.get(col.name) is not None
+                else (0 if col.data_type == 'INT' else '') for col in storage.columns}
+    
+    def _indexed_columns(self, table_name: str) -> set:
+        """Все колонки, покрытые индексами таблицы"""
+        return {col for index in self._get_indexes(table_name).values() for col in index.columns}
+    
+    def _required_columns(self, columns: List[str], where: Dict) -> Optional[set]:
+        """Столбцы, которые нужно декодировать для проекции и условия (None - все)"""
+        if not columns or '*' in columns:
+            return None
+        return set(columns) | set(where or ())
+    
     def _matches_where(self, row: Dict, where: Dict) -> bool:
         """Проверка условия WHERE"""
         if not where:
             return True
         
         for col, value in where.items():
-            if row.get(col) != value:
+            if isinstance(value, Condition):
+                if not value.matches(row.get(col)):
+                    return False
+            elif row.get(col) != value:
                 return False
         return True
     
@@ -0,0 +1,47 @@
+import os
+from collections import OrderedDict
+from typing import BinaryIO
+from .config import bad_subd_config
+
+class FileHandlePool:
+    """Ограниченный LRU-пул открытых файлов таблиц и индексов
+    
+    Файлы открываются без буферизации: запись сразу видна другим
+    дескрипторам и mmap, а чтение не может вернуть устаревший буфер.
+    """
+    
+    def __init__(self, max_open: int = None):
+        self.max_open = max_open or bad_subd_config.MAX_OPEN_FILES
+        self._handles: 'OrderedDict[str, BinaryIO]' = OrderedDict()
+    
+    def get(self, file_path: str, create: bool = False) -> BinaryIO:
+        """Открытый на чтение и запись дескриптор файла"""
+        handle = self._handles.get(file_path)
+        if handle is not None:
+            self._handles.move_to_end(file_path)
+            return handle
+        
+        mode = 'w+b' if create and not os.path.exists(file_path) else 'r+b'
+        handle = open(file_path, mode, buffering=0)
+        self._handles[file_path] = handle
+        
+        while len(self._handles) > self.max_open:
+            _, oldest = self._handles.popitem(last=False)
+            oldest.close()
+        
+        return handle
+    
+    def release(self, file_path: str) -> None:
+        """Закрыть дескриптор перед пересозданием или удалением файла"""
+        handle = self._handles.pop(file_path, None)
+        if handle is not None:
+            handle.close()
+    
+    def close(self) -> None:
+        """Закрыть все дескрипторы пула"""
+        while self._handles:
+            _, handle = self._handles.popitem()
+            handle.close()
+    
+    def __len__(self) -> int:
+        return len(self._handles)
@@ -0,0 +1,52 @@
+from typing import List, Any, Optional
+from .index import SimpleHashIndex, string_key
+from .conditions import tokenize
+from .file_pool import FileHandlePool
+from .storage import ColumnDefinition
+
+class FullTextIndex(SimpleHashIndex):
+    """Инвертированный индекс слов VARCHAR-колонки
+    
+    Строка хранится под ключами всех различных слов своего значения
+    (string_key от слова из tokenize), поэтому файл, журнал и построение -
+    те же, что у хэш-индекса, а список позиций ключа - это список строк,
+    содержащих слово. Поиск нескольких слов пересекает их списки, начиная
+    с самого короткого. Коллизия хэшей слов дает лишние кандидаты, которые
+    движок отсеивает проверкой условия Match.
+    """
+    
+    kind = 'fulltext'
+    extension = '.fts'
+    
+    def __init__(self, table_name: str, column_name: str, file_pool: FileHandlePool = None,
+                 column: ColumnDefinition = None):
+        if column is None or column.data_type != 'VARCHAR':
+            raise ValueError("Full-text indexes only supported for VARCHAR columns")
+        super().__init__(table_name, column_name, file_pool, column)
+    
+    def find(self, query: str) -> List[int]:
+        """Позиции строк, содержащих все слова запроса, в порядке файла"""
+        terms = set(tokenize(query)) if isinstance(query, str) else set()
+        if not terms:
+            return []
+        
+        postings = sorted((super(FullTextIndex, self).find(term) for term in terms), key=len)
+        positions = set(postings[0])
+        for term_positions in postings[1:]:
+            if not positions:
+                break
+            positions.intersection_update(term_positions)
+        return sorted(positions)
+    
+    def estimate(self, query: str) -> int:
+        """Оценка сверху для планировщика: число строк с самым редким словом запроса"""
+        terms = set(tokenize(query)) if isinstance(query, str) else set()
+        return min((super(FullTextIndex, self).estimate(term) for term in terms), default=0)
+    
+    def _index_keys(self, value: Any) -> List[int]:
+        # Индексируется то, что хранится: строка, обрезанная до размера колонки
+        text = (value if value is not None else "")[:self.key_size]
+        return [string_key(term) for term in set(tokenize(text))]
+    
+    def _lookup_key(self, term: Any) -> Optional[int]:
+        return string_key(term) if isinstance(term, str) else None
@@ -1,69 +1,488 @@
 import struct
 import os
-from typing import List, Dict, Any
+import mmap
+import hashlib
+import heapq
+import tempfile
+from bisect import bisect_left, bisect_right
+from typing import List, Dict, Any, Tuple, Optional, Iterator, Iterable
 from collections import defaultdict
+from itertools import islice
 from .config import bad_subd_config
+from .file_pool import FileHandlePool
+from .storage import ColumnDefinition
+
+INDEX_MAGIC = b'HIX2'
+INDEX_HEADER = struct.Struct('<4sQQ')  # сигнатура, количество записей, количество разных ключей
+INDEX_VALUE = struct.Struct('<Q')
+RUN_ENTRY = struct.Struct('<QQ')  # ключ, позиция во временном файле внешней сортировки
+MERGE_BATCH = 65536  # Записей в одном блоке при слиянии журнала с основным файлом
+
+LOG_RECORD = struct.Struct('>BQQ')  # операция, ключ, позиция строки
+LOG_INSERT = 1
+LOG_DELETE = 2  # Удаление одной позиции ключа
+LOG_DELETE_KEY = 3  # Удаление ключа со всеми позициями
+
+def string_key(value: str) -> int:
+    """Стабильный 64-битный хэш строки (одинаковый во всех процессах, в отличие от hash())"""
+    return int.from_bytes(hashlib.blake2b(value.encode('utf-8', 'surrogatepass'), digest_size=8).digest(), 'big')
+
+def composite_key(values: Tuple[Any, ...]) -> int:
+    """Стабильный 64-битный хэш кортежа значений INT и VARCHAR"""
+    digest = hashlib.blake2b(digest_size=8)
+    for value in values:
+        if isinstance(value, int):
+            digest.update(b'I' + value.to_bytes(8, 'big'))
+        else:
+            data = value.encode('utf-8', 'surrogatepass')
+            digest.update(b'S' + len(data).to_bytes(4, 'big') + data)
+    return int.from_bytes(digest.digest(), 'big')
+
+class _MappedArray:
+    """Массив uint64 внутри mmap как последовательность для bisect"""
+    
+    def __init__(self, mapping, offset: int, length: int):
+        self.mapping = mapping
+        self.offset = offset
+        self.length = length
+    
+    def __len__(self) -> int:
+        return self.length
+    
+    def __getitem__(self, i: int) -> int:
+        return INDEX_VALUE.unpack_from(self.mapping, self.offset + i * INDEX_VALUE.size)[0]
+    
+    def slice(self, start: int, stop: int) -> Tuple[int, ...]:
+        return struct.unpack_from(f'<{stop - start}Q', self.mapping, self.offset + start * INDEX_VALUE.size)
 
 class SimpleHashIndex:
-    """Простой хэш-индекс для числовых колонок"""
+    """Простой хэш-индекс для числовых и строковых колонок
+    
+    Для VARCHAR в индексе хранится стабильный 64-битный хэш значения
+    (string_key), поэтому формат файла тот же, что и для INT. Разные строки
+    с одинаковым хэшем попадают в один список позиций; движок перепроверяет
+    прочитанные строки условием WHERE, так что коллизия дает лишнее чтение,
+    но не неверный результат.
+    
+    Основной файл .idx оптимизирован для чтения: заголовок, отсортированный
+    массив ключей и параллельный массив позиций (по 8 байт). Файл
+    отображается через mmap, а find ищет ключ двоичным поиском, поэтому
+    открытие индекса не читает его целиком и память не зависит от размера.
+    
+    Изменения дописываются в журнал .idxlog записями фиксированной длины и
+    держатся в памяти как дельта (добавленные и удаленные позиции), которая
+    накладывается на основной файл при поиске. Когда журнал перерастает
+    индекс, дельта сливается с основным файлом потоково в новый файл
+    (checkpoint), и журнал очищается.
+    """
     
-    def __init__(self, table_name: str, column_name: str):
+    kind = 'hash'
+    extension = '.idx'
+    unique = False  # Значения ключа не повторяются (PRIMARY KEY или UNIQUE), задает движок
+    primary_key = False
+    
+    def __init__(self, table_name: str, column_name: str, file_pool: FileHandlePool = None,
+                 column: ColumnDefinition = None):
         self.table_name = table_name
         self.column_name = column_name
-        self.filename = os.path.join(bad_subd_config.INDEX_DIR, f"{table_name}_{column_name}.idx")
-        self._index_dict = defaultdict(list)
+        self.columns = [column_name]
+        self.key_size = column.size if column is not None and column.data_type == 'VARCHAR' else None
+        self.filename = os.path.join(bad_subd_config.INDEX_DIR, f"{table_name}_{column_name}{self.extension}")
+        self.log_filename = self.filename + 'log'
+        self.file_pool = file_pool if file_pool is not None else FileHandlePool()
+        
+        self._mapping: Optional[mmap.mmap] = None
+        self._keys: Optional[_MappedArray] = None
+        self._positions: Optional[_MappedArray] = None
+        self.base_entries = 0
+        self.base_keys = 0
+        # Дельта журнала поверх основного файла
+        self._inserted: Dict[int, Dict[int, None]] = defaultdict(dict)  # ключ -> позиции в порядке вставки
+        self._deleted = set()  # (ключ, позиция) из основного файла
+        self._log_records = 0
         self._load_index()
     
-    def insert(self, key: int, row_position: int) -> None:
+    def insert(self, key: Any, row_position: int) -> None:
         """Вставка ключа и позиции строки в индекс"""
-        if key not in self._index_dict:
-            self._index_dict[key] = []
-        self._index_dict[key].append(row_position)
-        self._save_index()
+        records = []
+        for index_key in self._index_keys(key):
+            self._apply(LOG_INSERT, index_key, row_position)
+            records.append((LOG_INSERT, index_key, row_position))
+        self._append_log(records)
+    
+    def insert_many(self, entries: List[Tuple[Any, int]]) -> None:
+        """Пакетная вставка пар (ключ, позиция) одной записью в журнал"""
+        records = []
+        for key, row_position in entries:
+            for index_key in self._index_keys(key):
+                self._apply(LOG_INSERT, index_key, row_position)
+                records.append((LOG_INSERT, index_key, row_position))
+        if records:
+            self._append_log(records)
+    
+    def rebuild(self, entries: Iterable[Tuple[Any, int]]) -> None:
+        """Заменить содержимое индекса парами (ключ, позиция) с одной записью файла
+        
+        Пары читаются за один проход и сортируются один раз. Если их больше
+        INDEX_BUILD_RUN_ENTRIES, отсортированные серии сбрасываются во
+        временные файлы и сливаются при записи индекса (внешняя сортировка).
+        """
+        pairs = ((index_key, row_position) for key, row_position in entries
+                 for index_key in self._index_keys(key))
+        self._inserted = defaultdict(dict)
+        self._deleted = set()
+        self._write_base(self._sorted_batches(pairs))
+        self._truncate_log()
     
-    def find(self, key: int) -> List[int]:
-        """Поиск позиций строк по ключу"""
-        return self._index_dict.get(key, [])
+    def find(self, key: Any) -> List[int]:
+        """Поиск позиций строк по ключу (для VARCHAR - кандидаты с тем же хэшем)"""
+        key = self._lookup_key(key)
+        if key is None:
+            return []
+        
+        positions = list(self._base_positions(key))
+        if self._deleted:
+            positions = [pos for pos in positions if (key, pos) not in self._deleted]
+        inserted = self._inserted.get(key)
+        if inserted:
+            positions.extend(inserted)
+        return positions
     
-    def delete(self, key: int, row_position: int = None) -> None:
+    def estimate(self, key: Any) -> int:
+        """Количество позиций ключа для планировщика (удаления из журнала не вычитаются)"""
+        key = self._lookup_key(key)
+        if key is None:
+            return 0
+        start, stop = self._base_range(key)
+        inserted = self._inserted.get(key)
+        return stop - start + (len(inserted) if inserted else 0)
+    
+    def delete(self, key: Any, row_position: int = None) -> None:
         """Удаление из индекса"""
-        if key in self._index_dict:
-            if row_position is None:
-                del self._index_dict[key]
+        if row_position is None:
+            key = self._lookup_key(key)
+            if key is not None:
+                self._apply(LOG_DELETE_KEY, key, 0)
+                self._append_log([(LOG_DELETE_KEY, key, 0)])
+            return
+        
+        self.delete_many([(key, row_position)])
+    
+    def delete_many(self, entries: List[Tuple[Any, int]]) -> None:
+        """Пакетное удаление пар (ключ, позиция) одной записью в журнал"""
+        records = []
+        for key, row_position in entries:
+            for index_key in self._index_keys(key):
+                self._apply(LOG_DELETE, index_key, row_position)
+                records.append((LOG_DELETE, index_key, row_position))
+        if records:
+            self._append_log(records)
+    
+    def _index_keys(self, value: Any) -> List[int]:
+        """Ключи индекса, под которыми хранится строка со значением value"""
+        return [self._index_key(value)]
+    
+    def _index_key(self, value: Any) -> int:
+        """Ключ индекса для значения, записываемого в строку"""
+        if self.key_size is None:
+            return value
+        # Строка хранится обрезанной до размера столбца - индексируем то, что хранится
+        return string_key((value if value is not None else "")[:self.key_size])
+    
+    def _lookup_key(self, value: Any) -> Optional[int]:
+        """Ключ индекса для значения из условия; None - значение не может храниться"""
+        if self.key_size is None:
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if not isinstance(value, int) or not 0 <= value <= 2**64 - 1:
+                return None
+            return value
+        if not isinstance(value, str) or len(value) > self.key_size:
+            return None
+        return string_key(value)
+    
+    def _apply(self, op: int, key: int, row_position: int) -> None:
+        """Применить операцию журнала к дельте в памяти"""
+        if op == LOG_INSERT:
+            # Удаленная пара из основного файла просто снова становится видимой
+            if (key, row_position) in self._deleted:
+                self._deleted.discard((key, row_position))
             else:
-                self._index_dict[key] = [pos for pos in self._index_dict[key] if pos != row_position]
-                if not self._index_dict[key]:
-                    del self._index_dict[key]
-            self._save_index()
+                self._inserted[key][row_position] = None
+        elif op == LOG_DELETE:
+            inserted = self._inserted.get(key)
+            if inserted and row_position in inserted:
+                del inserted[row_position]
+                if not inserted:
+                    del self._inserted[key]
+            elif self._base_contains(key, row_position):
+                self._deleted.add((key, row_position))
+        elif op == LOG_DELETE_KEY:
+            self._inserted.pop(key, None)
+            self._deleted.update((key, pos) for pos in self._base_positions(key))
+    
+    def _base_range(self, key: int) -> Tuple[int, int]:
+        """Границы записей ключа в массивах основного файла (двоичный поиск по mmap)"""
+        if not self.base_entries:
+            return 0, 0
+        start = bisect_left(self._keys, key)
+        if start == self.base_entries or self._keys[start] != key:
+            return start, start
+        return start, bisect_right(self._keys, key, start)
+    
+    def _base_positions(self, key: int) -> Tuple[int, ...]:
+        """Позиции ключа в основном файле"""
+        start, stop = self._base_range(key)
+        if start == stop:
+            return ()
+        return self._positions.slice(start, stop)
+    
+    def _base_contains(self, key: int, row_position: int) -> bool:
+        """Есть ли пара в основном файле (позиции ключа в нем отсортированы)"""
+        start, stop = self._base_range(key)
+        i = bisect_left(self._positions, row_position, start, stop)
+        return i < stop and self._positions[i] == row_position
+    
+    def checkpoint(self) -> None:
+        """Слить журнал с основным файлом индекса"""
+        if self._inserted or self._deleted or not os.path.exists(self.filename):
+            self._write_base(self._merged_entries())
+            self._inserted = defaultdict(dict)
+            self._deleted = set()
+        self._truncate_log()
+    
+    def _merged_entries(self) -> Iterator[List[Tuple[int, int]]]:
+        """Блоки отсортированных пар (ключ, позиция): основной файл с наложенной дельтой"""
+        inserted = sorted((key, pos) for key, positions in self._inserted.items() for pos in positions)
+        next_inserted = 0
+        
+        for start in range(0, self.base_entries, MERGE_BATCH):
+            stop = min(start + MERGE_BATCH, self.base_entries)
+            batch = []
+            for key, pos in zip(self._keys.slice(start, stop), self._positions.slice(start, stop)):
+                while next_inserted < len(inserted) and inserted[next_inserted] < (key, pos):
+                    batch.append(inserted[next_inserted])
+                    next_inserted += 1
+                if (key, pos) not in self._deleted:
+                    batch.append((key, pos))
+            yield batch
+        
+        yield inserted[next_inserted:]
+    
+    def _sorted_batches(self, pairs: Iterator[Tuple[int, int]]) -> Iterator[List[Tuple[int, int]]]:
+        """Блоки отсортированных пар; большой объем сортируется сериями через временные файлы"""
+        run_entries = bad_subd_config.INDEX_BUILD_RUN_ENTRIES
+        runs = []
+        try:
+            while True:
+                run = list(islice(pairs, run_entries))
+                run.sort()
+                if len(run) < run_entries and not runs:
+                    yield run
+                    return
+                if run:
+                    runs.append(self._spill_run(run))
+                if len(run) < run_entries:
+                    break
+            
+            merged = heapq.merge(*(self._read_run(f) for f in runs))
+            while True:
+                batch = list(islice(merged, MERGE_BATCH))
+                if not batch:
+                    break
+                yield batch
+        finally:
+            for f in runs:
+                f.close()
+    
+    def _spill_run(self, run: List[Tuple[int, int]]):
+        """Записать отсортированную серию во временный файл рядом с индексом"""
+        f = tempfile.TemporaryFile(dir=os.path.dirname(self.filename) or None)
+        for start in range(0, len(run), MERGE_BATCH):
+            batch = run[start:start + MERGE_BATCH]
+            f.write(struct.pack(f'<{len(batch) * 2}Q', *(value for pair in batch for value in pair)))
+        f.seek(0)
+        return f
+    
+    def _read_run(self, f) -> Iterator[Tuple[int, int]]:
+        while True:
+            block = f.read(MERGE_BATCH * RUN_ENTRY.size)
+            if not block:
+                return
+            yield from RUN_ENTRY.iter_unpack(block)
+    
+    def _write_base(self, batches: Iterator[List[Tuple[int, int]]]) -> None:
+        """Записать основной файл из блоков отсортированных пар и отобразить его заново
+        
+        Ключи и позиции пишутся в два временных файла, которые затем
+        склеиваются за заголовком; готовый файл атомарно заменяет старый.
+        """
+        tmp_filename = self.filename + '.tmp'
+        positions_filename = self.filename + '.positions.tmp'
+        entries = 0
+        keys = 0
+        last_key = None
+        
+        with open(tmp_filename, 'wb') as out, open(positions_filename, 'w+b') as positions_out:
+            out.write(INDEX_HEADER.pack(INDEX_MAGIC, 0, 0))
+            for batch in batches:
+                if not batch:
+                    continue
+                batch_keys = [key for key, _ in batch]
+                out.write(struct.pack(f'<{len(batch)}Q', *batch_keys))
+                positions_out.write(struct.pack(f'<{len(batch)}Q', *(pos for _, pos in batch)))
+                entries += len(batch)
+                keys += len(set(batch_keys)) - (batch_keys[0] == last_key)
+                last_key = batch_keys[-1]
+            
+            positions_out.seek(0)
+            while True:
+                block = positions_out.read(MERGE_BATCH * INDEX_VALUE.size)
+                if not block:
+                    break
+                out.write(block)
+            
+            out.seek(0)
+            out.write(INDEX_HEADER.pack(INDEX_MAGIC, entries, keys))
+        
+        os.remove(positions_filename)
+        self._close_mapping()
+        os.replace(tmp_filename, self.filename)
+        self._open_mapping()
+    
+    def _open_mapping(self) -> None:
+        """Отобразить основной файл индекса"""
+        with open(self.filename, 'rb') as f:
+            magic, self.base_entries, self.base_keys = INDEX_HEADER.unpack(f.read(INDEX_HEADER.size))
+            if magic != INDEX_MAGIC:
+                raise ValueError(f"{self.filename} is not an index file")
+            if self.base_entries:
+                self._mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                self._keys = _MappedArray(self._mapping, INDEX_HEADER.size, self.base_entries)
+                self._positions = _MappedArray(self._mapping, INDEX_HEADER.size + self.base_entries * INDEX_VALUE.size,
+                                               self.base_entries)
+    
+    def _close_mapping(self) -> None:
+        if self._mapping is not None:
+            self._mapping.close()
+        self._mapping = self._keys = self._positions = None
+        self.base_entries = self.base_keys = 0
+    
+    def _truncate_log(self) -> None:
+        log = self.file_pool.get(self.log_filename, create=True)
+        log.truncate(0)
+        self._log_records = 0
+    
+    def _append_log(self, records: List[Tuple[int, int, int]]) -> None:
+        """Дописать записи в журнал; слияние, когда журнал перерос индекс"""
+        data = bytearray(len(records) * LOG_RECORD.size)
+        for i, record in enumerate(records):
+            LOG_RECORD.pack_into(data, i * LOG_RECORD.size, *record)
+        
+        log = self.file_pool.get(self.log_filename, create=True)
+        log.seek(0, 2)
+        log.write(data)
+        
+        self._log_records += len(records)
+        if self._log_records >= max(bad_subd_config.INDEX_LOG_MIN_RECORDS, self.base_entries):
+            self.checkpoint()
     
     def _load_index(self) -> None:
-        """Загрузка индекса из файла"""
+        """Открытие основного файла и применение журнала"""
         if os.path.exists(self.filename):
             with open(self.filename, 'rb') as f:
-                while True:
-                    key_data = f.read(8)
-                    if not key_data:
-                        break
-                    key = struct.unpack('>Q', key_data)[0]
-                    count_data = f.read(4)
-                    count = struct.unpack('>I', count_data)[0]
-                    positions = []
-                    for _ in range(count):
-                        pos_data = f.read(8)
-                        positions.append(struct.unpack('>Q', pos_data)[0])
-                    self._index_dict[key] = positions
-    
-    def _save_index(self) -> None:
-        """Сохранение индекса в файл"""
-        with open(self.filename, 'wb') as f:
-            for key, positions in sorted(self._index_dict.items()):
-                f.write(struct.pack('>Q', key))
-                f.write(struct.pack('>I', len(positions)))
-                for pos in positions:
-                    f.write(struct.pack('>Q', pos))
+                magic = f.read(len(INDEX_MAGIC))
+            if magic == INDEX_MAGIC:
+                self._open_mapping()
+            else:
+                self._load_legacy_index()
+        
+        self._replay_log()
+    
+    def _load_legacy_index(self) -> None:
+        """Перевод файла старого формата (ключ, количество, позиции) в новый"""
+        entries = []
+        with open(self.filename, 'rb') as f:
+            while True:
+                key_data = f.read(8)
+                if not key_data:
+                    break
+                key = struct.unpack('>Q', key_data)[0]
+                count = struct.unpack('>I', f.read(4))[0]
+                for pos in struct.unpack(f'>{count}Q', f.read(8 * count)):
+                    entries.append((key, pos))
+        entries.sort()
+        self._write_base(iter([entries]))
+    
+    def _replay_log(self) -> None:
+        """Применить журнал изменений поверх основного файла"""
+        if not os.path.exists(self.log_filename):
+            return
+        
+        with open(self.log_filename, 'rb') as f:
+            data = f.read()
+        
+        # Неполная последняя запись (обрыв при записи) отбрасывается.
+        # Если слияние прервалось после замены .idx, журнал повторяет уже
+        # сохраненные изменения - вставки, уже лежащие в файле, пропускаются.
+        for op, key, row_position in LOG_RECORD.iter_unpack(data[:len(data) // LOG_RECORD.size * LOG_RECORD.size]):
+            if op == LOG_INSERT and self._base_contains(key, row_position) and (key, row_position) not in self._deleted:
+                continue
+            self._apply(op, key, row_position)
+        
+        self._log_records = len(data) // LOG_RECORD.size
     
     def get_index_size(self) -> int:
-        """Получить размер индекса в байтах"""
-        if os.path.exists(self.filename):
-            return os.path.getsize(self.filename)
-        return 0
\ No newline at end of file
+        """Получить размер индекса в байтах (основной файл и журнал)"""
+        size = 0
+        for filename in (self.filename, self.log_filename):
+            if os.path.exists(filename):
+                size += os.path.getsize(filename)
+        return size
+
+class CompositeHashIndex(SimpleHashIndex):
+    """Составной хэш-индекс по упорядоченному списку столбцов
+    
+    Строка хранится под ключами всех ведущих префиксов значений, например
+    (lesson_id) и (lesson_id, date). Поэтому WHERE, задающий первые k
+    столбцов индекса, обслуживается одним поиском по хэшу префикса длины k
+    (composite_key); цена - k записей на строку вместо одной. Ключом для
+    insert/find/delete служит кортеж значений в порядке столбцов индекса.
+    """
+    
+    def __init__(self, table_name: str, columns: List[ColumnDefinition], file_pool: FileHandlePool = None):
+        self.column_defs = list(columns)
+        super().__init__(table_name, '+'.join(col.name for col in columns), file_pool)
+        self.columns = [col.name for col in columns]
+    
+    def delete(self, key: Tuple[Any, ...], row_position: int = None) -> None:
+        """Удаление строки из индекса по полному кортежу значений и позиции"""
+        if row_position is None:
+            raise ValueError("Composite index entries can only be deleted by row position")
+        super().delete(key, row_position)
+    
+    def _index_keys(self, values: Tuple[Any, ...]) -> List[int]:
+        stored = []
+        for col, value in zip(self.column_defs, values):
+            if col.data_type == 'INT':
+                stored.append(value if value is not None else 0)
+            else:
+                stored.append((value if value is not None else "")[:col.size])
+        return [composite_key(tuple(stored[:length])) for length in range(1, len(stored) + 1)]
+    
+    def _lookup_key(self, values: Tuple[Any, ...]) -> Optional[int]:
+        """Ключ для значений первых столбцов индекса; None - такие значения не хранятся"""
+        if not 0 < len(values) <= len(self.column_defs):
+            return None
+        
+        prefix = []
+        for col, value in zip(self.column_defs, values):
+            if col.data_type == 'INT':
+                if isinstance(value, float) and value.is_integer():
+                    value = int(value)
+                if not isinstance(value, int) or not 0 <= value <= 2**64 - 1:
+                    return None
+            elif not isinstance(value, str) or len(value) > col.size:
+                return None
+            prefix.append(value)
+        return composite_key(tuple(prefix))
\ No newline at end of file
@@ -0,0 +1,146 @@
+from dataclasses import dataclass, field
+from typing import List, Dict, Any, Optional, Callable, Iterable, Tuple
+from .conditions import Range, Match
+
+ROW_READ_COST = 4.0  # Чтение строки по позиции относительно проверки строки при сканировании
+POSITION_COST = 0.05  # Получение одной позиции из индекса
+
+def _is_btree_key(value: Any) -> bool:
+    """Сравнимо ли значение с ключами B+дерева (None - граница не задана)"""
+    return value is None or (isinstance(value, (int, float)) and not isinstance(value, bool))
+
+@dataclass
+class QueryPlan:
+    """Выбранный способ выполнения условия WHERE
+    
+    access: 'scan' - полное сканирование, 'index' - позиции из одного
+    индекса, 'intersection' - пересечение позиций нескольких индексов,
+    'empty' - фильтр Блума доказал, что строк нет. Стоимость выражена в
+    проверках строки при сканировании.
+    """
+    table_name: str
+    access: str
+    indexes: List[str] = field(default_factory=list)
+    estimated_rows: float = 0.0
+    total_rows: int = 0
+    cost: float = 0.0
+    lookups: List[Callable[[], Iterable[int]]] = field(default_factory=list, repr=False, compare=False)
+    
+    def positions(self) -> Optional[Iterable[int]]:
+        """Позиции строк-кандидатов (None - нужно сканирование)"""
+        if self.access == 'scan':
+            return None
+        if self.access == 'empty':
+            return []
+        if len(self.lookups) == 1:
+            return self.lookups[0]()
+        
+        position_sets = sorted((set(lookup()) for lookup in self.lookups), key=len)
+        positions = position_sets[0]
+        for other in position_sets[1:]:
+            positions &= other
+        return sorted(positions)
+
+class QueryPlanner:
+    """Планировщик выборки по оценкам индексов
+    
+    Для каждого индекса, которым можно обслужить условие, индекс оценивает
+    число подходящих строк: хэш-индексы считают позиции ключа двоичным
+    поиском, B+дерево считает записи диапазона, но не дальше порога, за
+    которым скан дешевле. Из индексов, покрывающих одни и те же колонки
+    WHERE, остается самый избирательный. Индексы перебираются от самого
+    избирательного; в пересечение добавляются только индексы по еще не
+    покрытым колонкам, и оно оценивается в предположении независимости
+    условий. Выбирается самый дешевый из планов и скана.
+    
+    Если таблица анализировалась (ANALYZE), диапазоны оцениваются по
+    гистограмме колонки без обращения к дереву.
+    """
+    
+    def __init__(self, engine):
+        self.engine = engine
+    
+    def plan(self, table_name: str, where: Dict = None) -> QueryPlan:
+        total_rows = self.engine.table_manager.get_total_rows(table_name)
+        best = QueryPlan(table_name, 'scan', estimated_rows=total_rows, total_rows=total_rows, cost=float(total_rows))
+        if not where:
+            return best
+        if self.engine._definitely_absent(table_name, where):
+            return QueryPlan(table_name, 'empty', total_rows=total_rows)
+        
+        # Индекс, который вернет больше limit позиций, заведомо проигрывает скану
+        limit = int(total_rows / (ROW_READ_COST + POSITION_COST)) + 1
+        candidates = sorted(self._candidates(table_name, where, total_rows, limit), key=lambda candidate: candidate[0])
+        
+        # Индекс по одной колонке и префикс составного индекса по ней же - одно
+        # условие, а не два независимых: пересекать их бессмысленно
+        cheapest = {}
+        for candidate in candidates:
+            cheapest.setdefault(candidate[2], candidate)
+        
+        chosen = []
+        covered = set()
+        fetched = 0
+        estimated_rows = float(total_rows)
+        for rows, name, columns, lookup in cheapest.values():
+            if covered & columns:
+                continue
+            covered |= columns
+            chosen.append((name, lookup))
+            fetched += rows
+            estimated_rows = rows if len(chosen) == 1 else estimated_rows * rows / max(total_rows, 1)
+            cost = fetched * POSITION_COST + estimated_rows * ROW_READ_COST
+            if cost < best.cost:
+                best = QueryPlan(table_name, 'index' if len(chosen) == 1 else 'intersection',
+                                 [name for name, _ in chosen], estimated_rows, total_rows, cost,
+                                 [lookup for _, lookup in chosen])
+        return best
+    
+    def _candidates(self, table_name: str, where: Dict, total_rows: int,
+                    limit: int) -> List[Tuple[int, str, frozenset, Callable[[], Iterable[int]]]]:
+        """(оценка строк, имя индекса, колонки WHERE под индексом, получение позиций)
+        для индексов, подходящих к WHERE"""
+        engine = self.engine
+        candidates = []
+        for name, index in engine._get_indexes(table_name).items():
+            if index.kind == 'bloom':
+                continue
+            
+            if len(index.columns) > 1:
+                prefix = engine._equality_prefix(index, where)
+                if prefix:
+                    candidates.append((index.estimate(prefix), name, frozenset(index.columns[:len(prefix)]),
+                                       lambda index=index, prefix=prefix: index.find(prefix)))
+                continue
+            
+            if index.column_name not in where:
+                continue
+            value = where[index.column_name]
+            columns = frozenset([index.column_name])
+            if isinstance(value, Match):
+                if index.kind == 'fulltext' and value.terms:
+                    candidates.append((index.estimate(value.query), name, columns,
+                                       lambda index=index, value=value: index.find(value.query)))
+            elif isinstance(value, Range):
+                # Границу другого типа дерево сравнить не может - такое условие проверит скан
+                if index.kind == 'btree' and _is_btree_key(value.low) and _is_btree_key(value.high):
+                    bounds = (value.low, value.high, value.include_low, value.include_high)
+                    rows = self._estimate_range(table_name, index, value, total_rows, limit)
+                    candidates.append((rows, name, columns,
+                                       lambda index=index, bounds=bounds: index.find_range(*bounds)))
+            elif index.kind == 'btree':
+                if value is None or not _is_btree_key(value):
+                    continue
+                candidates.append((index.estimate(value, limit=limit), name, columns,
+                                   lambda index=index, value=value: index.find(value)))
+            elif index.kind != 'fulltext':
+                candidates.append((index.estimate(value), name, columns,
+                                   lambda index=index, value=value: index.find(value)))
+        return candidates
+    
+    def _estimate_range(self, table_name: str, index, value: Range, total_rows: int, limit: int) -> int:
+        """Строк в диапазоне: по гистограмме ANALYZE, без нее - счетом по дереву до limit"""
+        statistics = self.engine.get_statistics(table_name)
+        if statistics is not None and index.column_name in statistics.columns:
+            return round(total_rows * statistics.columns[index.column_name].selectivity(value))
+        return index.estimate_range(value.low, value.high, value.include_low, value.include_high, limit=limit)
@@ -1,8 +1,9 @@
 import json
 import os
-from typing import List, Dict, Any
-from dataclasses import dataclass, asdict
+from typing import List, Dict, Any, Optional
+from dataclasses import dataclass, asdict, field
 from .storage import ColumnDefinition
+from .table_statistics import TableStatistics
 from .config import bad_subd_config
 
 @dataclass
@@ -11,13 +12,17 @@ class TableSchema:
     table_name: str
     columns: List[ColumnDefinition]
     primary_key: str = None
+    storage_format: str = 'utf32'  # 'utf32' - фиксированная длина, 'utf8' - страницы со слотами
+    indexes: List[Dict[str, Any]] = field(default_factory=list)  # Каталог индексов: {'columns': [...], 'kind': ...}
     
     def to_dict(self) -> Dict[str, Any]:
         """Сериализация схемы в словарь"""
         return {
             'table_name': self.table_name,
             'columns': [asdict(col) for col in self.columns],
-            'primary_key': self.primary_key
+            'primary_key': self.primary_key,
+            'storage_format': self.storage_format,
+            'indexes': self.indexes
         }
     
     @classmethod
@@ -29,7 +34,9 @@ class TableSchema:
         return cls(
             table_name=data['table_name'],
             columns=columns,
-            primary_key=data.get('primary_key')
+            primary_key=data.get('primary_key'),
+            storage_format=data.get('storage_format', 'utf32'),
+            indexes=data.get('indexes', [])
         )
 
 class SchemaManager:
@@ -56,8 +63,23 @@ class SchemaManager:
         file_path = os.path.join(self.schema_dir, f"{table_name}.json")
         return os.path.exists(file_path)
     
+    def save_statistics(self, statistics: TableStatistics) -> None:
+        """Сохранение статистики ANALYZE рядом со схемой"""
+        file_path = os.path.join(self.schema_dir, f"{statistics.table_name}.stats.json")
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(statistics.to_dict(), f, indent=2, ensure_ascii=False)
+    
+    def load_statistics(self, table_name: str) -> Optional[TableStatistics]:
+        """Загрузка статистики (None - таблица не анализировалась)"""
+        file_path = os.path.join(self.schema_dir, f"{table_name}.stats.json")
+        if not os.path.exists(file_path):
+            return None
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return TableStatistics.from_dict(json.load(f))
+    
     def delete_schema(self, table_name: str) -> None:
-        """Удаление схемы"""
-        file_path = os.path.join(self.schema_dir, f"{table_name}.json")
-        if os.path.exists(file_path):
-            os.remove(file_path)
\ No newline at end of file
+        """Удаление схемы и статистики"""
+        for file_name in (f"{table_name}.json", f"{table_name}.stats.json"):
+            file_path = os.path.join(self.schema_dir, file_name)
+            if os.path.exists(file_path):
+                os.remove(file_path)
\ No newline at end of file
@@ -0,0 +1,303 @@
+import struct
+from itertools import groupby
+from typing import List, Optional
+from .config import bad_subd_config
+
+PAGE_HEADER = struct.Struct('>HHI')  # количество слотов, начало области данных, следующая свободная страница
+SLOT = struct.Struct('>HH')  # смещение строки в странице, длина строки
+DELETED_FLAG = 0x8000  # старший бит длины - строка удалена
+FILE_HEADER = struct.Struct('>QI')  # количество строк, первая страница списка свободных (номер + 1)
+NOT_IN_FREE_LIST = 0
+END_OF_FREE_LIST = 0xFFFFFFFF
+
+class SlottedPageFile:
+    """Файл таблицы из страниц со слотами для строк переменной длины
+    
+    Страница: заголовок (количество слотов, начало области данных), каталог
+    слотов (смещение, длина) сразу за заголовком и строки, которые
+    записываются с конца страницы навстречу каталогу. Позиция строки -
+    начало страницы плюс номер слота, поэтому она однозначна и подходит
+    для индексов так же, как смещение строки фиксированной длины.
+    
+    Страницы с удаленными слотами связаны в список свободных страниц,
+    голова которого хранится в заголовке файла. Вставка сначала уплотняет
+    такую страницу и занимает удаленный слот, а в конец файла пишет только
+    то, что не поместилось.
+    """
+    
+    def __init__(self, header_size: int, page_size: int = None):
+        self.header_size = header_size
+        self.page_size = page_size or bad_subd_config.PAGE_SIZE
+        self.max_row_size = self.page_size - PAGE_HEADER.size - SLOT.size
+    
+    def page_start(self, page_no: int) -> int:
+        return self.header_size + page_no * self.page_size
+    
+    def split_position(self, position: int):
+        """Позиция строки -> (номер страницы, номер слота)"""
+        return divmod(position - self.header_size, self.page_size)
+    
+    def new_page(self) -> bytearray:
+        page = bytearray(self.page_size)
+        PAGE_HEADER.pack_into(page, 0, 0, self.page_size, NOT_IN_FREE_LIST)
+        return page
+    
+    def check_row(self, row_bytes: bytes) -> None:
+        if len(row_bytes) > self.max_row_size:
+            raise ValueError(f"Row of {len(row_bytes)} bytes does not fit into a {self.page_size}-byte page")
+    
+    def _add_to_page(self, page: bytearray, row_bytes: bytes) -> Optional[int]:
+        """Положить строку в страницу; None - не хватает места"""
+        slot_count, free_end, next_free = PAGE_HEADER.unpack_from(page, 0)
+        directory_end = PAGE_HEADER.size + (slot_count + 1) * SLOT.size
+        if free_end - len(row_bytes) < directory_end:
+            return None
+        
+        start = free_end - len(row_bytes)
+        page[start:free_end] = row_bytes
+        SLOT.pack_into(page, PAGE_HEADER.size + slot_count * SLOT.size, start, len(row_bytes))
+        PAGE_HEADER.pack_into(page, 0, slot_count + 1, start, next_free)
+        return slot_count
+    
+    def _compact_page(self, page: bytearray) -> List[int]:
+        """Сдвинуть живые строки к концу страницы, вернуть номера удаленных слотов
+        
+        Номера слотов живых строк не меняются, поэтому их позиции в индексах
+        остаются верными.
+        """
+        slot_count, _, next_free = PAGE_HEADER.unpack_from(page, 0)
+        live = []
+        free_slots = []
+        for slot in range(slot_count):
+            offset, length = SLOT.unpack_from(page, PAGE_HEADER.size + slot * SLOT.size)
+            if length & DELETED_FLAG:
+                free_slots.append(slot)
+            else:
+                live.append((slot, bytes(page[offset:offset + length])))
+        
+        end = self.page_size
+        for slot, row_bytes in live:
+            start = end - len(row_bytes)
+            page[start:end] = row_bytes
+            SLOT.pack_into(page, PAGE_HEADER.size + slot * SLOT.size, start, len(row_bytes))
+            end = start
+        for slot in free_slots:
+            SLOT.pack_into(page, PAGE_HEADER.size + slot * SLOT.size, 0, DELETED_FLAG)
+        
+        PAGE_HEADER.pack_into(page, 0, slot_count, end, next_free)
+        return free_slots
+    
+    def _reuse_slots(self, page: bytearray, rows_bytes: List[bytes]) -> List[int]:
+        """Разместить строки в удаленных слотах уплотненной страницы
+        
+        Возвращает номера занятых слотов для первых строк, которые поместились.
+        """
+        free_slots = self._compact_page(page)
+        slot_count, free_end, next_free = PAGE_HEADER.unpack_from(page, 0)
+        directory_end = PAGE_HEADER.size + slot_count * SLOT.size
+        
+        used = []
+        for slot, row_bytes in zip(free_slots, rows_bytes):
+            if free_end - len(row_bytes) < directory_end:
+                break
+            free_end -= len(row_bytes)
+            page[free_end:free_end + len(row_bytes)] = row_bytes
+            SLOT.pack_into(page, PAGE_HEADER.size + slot * SLOT.size, free_end, len(row_bytes))
+            used.append(slot)
+        
+        PAGE_HEADER.pack_into(page, 0, slot_count, free_end, next_free)
+        return used
+    
+    def _read_page(self, f, page_no: int) -> bytearray:
+        f.seek(self.page_start(page_no))
+        page = f.read(self.page_size)
+        if len(page) != self.page_size:
+            raise ValueError("Неправильная строка")
+        return bytearray(page)
+    
+    def _read_header(self, f):
+        """(количество строк, голова списка свободных страниц)"""
+        f.seek(4)
+        return FILE_HEADER.unpack(f.read(FILE_HEADER.size))
+    
+    def _write_header(self, f, row_count: int, free_head: int) -> None:
+        f.seek(4)
+        f.write(FILE_HEADER.pack(row_count, free_head))
+    
+    def insert_rows(self, f, rows_bytes: List[bytes]) -> List[int]:
+        """Вставка строк: сначала в удаленные слоты свободных страниц, остальное -
+        в последнюю страницу и новые страницы одной записью
+        """
+        for row_bytes in rows_bytes:
+            self.check_row(row_bytes)
+        
+        row_count, free_head = self._read_header(f)
+        positions = []
+        
+        while free_head and len(positions) < len(rows_bytes):
+            page_no = free_head - 1
+            page = self._read_page(f, page_no)
+            used = self._reuse_slots(page, rows_bytes[len(positions):])
+            positions.extend(self.page_start(page_no) + slot for slot in used)
+            
+            # Страница без удаленных слотов или без места уходит из списка
+            slot_count, free_end, next_free = PAGE_HEADER.unpack_from(page, 0)
+            if len(positions) < len(rows_bytes) or not self._has_free_slots(page):
+                free_head = 0 if next_free == END_OF_FREE_LIST else next_free
+                PAGE_HEADER.pack_into(page, 0, slot_count, free_end, NOT_IN_FREE_LIST)
+            
+            f.seek(self.page_start(page_no))
+            f.write(page)
+        
+        if len(positions) < len(rows_bytes):
+            positions.extend(self._append_rows(f, rows_bytes[len(positions):]))
+        
+        self._write_header(f, row_count + len(rows_bytes), free_head)
+        return positions
+    
+    def _has_free_slots(self, page: bytearray) -> bool:
+        slot_count = PAGE_HEADER.unpack_from(page, 0)[0]
+        return any(SLOT.unpack_from(page, PAGE_HEADER.size + slot * SLOT.size)[1] & DELETED_FLAG
+                   for slot in range(slot_count))
+    
+    def _append_rows(self, f, rows_bytes: List[bytes]) -> List[int]:
+        """Дописать строки в последнюю страницу и новые страницы одной записью"""
+        page_count = (f.seek(0, 2) - self.header_size) // self.page_size
+        if page_count:
+            page_no = page_count - 1
+            page = self._read_page(f, page_no)
+        else:
+            page_no = 0
+            page = self.new_page()
+        
+        first_page_no = page_no
+        pages = [page]
+        positions = []
+        for row_bytes in rows_bytes:
+            slot = self._add_to_page(page, row_bytes)
+            if slot is None:
+                page = self.new_page()
+                pages.append(page)
+                page_no += 1
+                slot = self._add_to_page(page, row_bytes)
+            positions.append(self.page_start(page_no) + slot)
+        
+        f.seek(self.page_start(first_page_no))
+        f.write(b''.join(pages))
+        return positions
+    
+    def read_row(self, f, position: int, codec) -> dict:
+        page_no, slot = self.split_position(position)
+        page = self._read_page(f, page_no)
+        slot_count = PAGE_HEADER.unpack_from(page, 0)[0]
+        if slot >= slot_count:
+            raise ValueError("Неправильная строка")
+        
+        offset, length = SLOT.unpack_from(page, PAGE_HEADER.size + slot * SLOT.size)
+        if length & DELETED_FLAG:
+            # Место удаленной строки могло быть уже занято при уплотнении страницы
+            return {'_deleted': True}
+        row = codec.decode(page, offset)
+        row['_deleted'] = False
+        return row
+    
+    def delete_row(self, f, position: int) -> None:
+        """Пометить слот удаленным и добавить страницу в список свободных"""
+        self.delete_rows(f, [position])
+    
+    def delete_rows(self, f, positions: List[int]) -> int:
+        """Пометить слоты удаленными: каждая страница и заголовок пишутся один раз
+        
+        positions должны быть отсортированы. Возвращает число помеченных строк.
+        """
+        row_count, free_head = self._read_header(f)
+        deleted = 0
+        for page_no, page_positions in groupby(positions, key=lambda position: self.split_position(position)[0]):
+            page = self._read_page(f, page_no)
+            page_deleted = 0
+            for position in page_positions:
+                slot_entry = PAGE_HEADER.size + self.split_position(position)[1] * SLOT.size
+                offset, length = SLOT.unpack_from(page, slot_entry)
+                if not length & DELETED_FLAG:
+                    SLOT.pack_into(page, slot_entry, offset, length | DELETED_FLAG)
+                    page_deleted += 1
+            if not page_deleted:
+                continue
+            
+            slot_count, free_end, next_free = PAGE_HEADER.unpack_from(page, 0)
+            if next_free == NOT_IN_FREE_LIST:
+                PAGE_HEADER.pack_into(page, 0, slot_count, free_end, free_head or END_OF_FREE_LIST)
+                free_head = page_no + 1
+            f.seek(self.page_start(page_no))
+            f.write(page)
+            deleted += page_deleted
+        
+        if deleted:
+            self._write_header(f, row_count - deleted, free_head)
+        return deleted
+    
+    def update_row(self, f, position: int, row_bytes: bytes) -> int:
+        """Перезаписать строку; если она не помещается в страницу, строка переносится
+        
+        Возвращает позицию строки после обновления.
+        """
+        self.check_row(row_bytes)
+        page_no, slot = self.split_position(position)
+        page = self._read_page(f, page_no)
+        slot_entry = PAGE_HEADER.size + slot * SLOT.size
+        offset, length = SLOT.unpack_from(page, slot_entry)
+        
+        if len(row_bytes) <= length & ~DELETED_FLAG:
+            # Новая строка не длиннее старой - пишем на ее место
+            page[offset:offset + len(row_bytes)] = row_bytes
+        else:
+            slot_count, free_end, next_free = PAGE_HEADER.unpack_from(page, 0)
+            start = free_end - len(row_bytes)
+            if start < PAGE_HEADER.size + slot_count * SLOT.size:
+                self.delete_row(f, position)
+                return self.insert_rows(f, [row_bytes])[0]
+            page[start:free_end] = row_bytes
+            PAGE_HEADER.pack_into(page, 0, slot_count, start, next_free)
+            offset = start
+        
+        SLOT.pack_into(page, slot_entry, offset, len(row_bytes))
+        f.seek(self.page_start(page_no))
+        f.write(page)
+        return position
+    
+    def scan(self, file_path: str, codec, block_pages: int = 8):
+        """Сканирование живых строк по страницам"""
+        for block, offset, _, position, row_index in self._iter_live_slots(file_path, block_pages):
+            row = codec.decode(block, offset)
+            row['_position'] = position
+            row['_index'] = row_index
+            yield row
+    
+    def iter_row_bytes(self, file_path: str, block_pages: int = 8):
+        """Байты живых строк в порядке файла"""
+        for block, offset, length, _, _ in self._iter_live_slots(file_path, block_pages):
+            yield block[offset:offset + length]
+    
+    def _iter_live_slots(self, file_path: str, block_pages: int):
+        """(блок, смещение строки в блоке, длина, позиция, номер слота в файле) для живых строк"""
+        with open(file_path, 'rb') as f:
+            f.seek(self.header_size)
+            
+            page_no = 0
+            row_index = 0
+            while True:
+                block = f.read(self.page_size * block_pages)
+                for page_offset in range(0, len(block) - self.page_size + 1, self.page_size):
+                    slot_count = PAGE_HEADER.unpack_from(block, page_offset)[0]
+                    start = self.page_start(page_no)
+                    
+                    for slot in range(slot_count):
+                        offset, length = SLOT.unpack_from(block, page_offset + PAGE_HEADER.size + slot * SLOT.size)
+                        if not length & DELETED_FLAG:
+                            yield block, page_offset + offset, length, start + slot, row_index
+                        row_index += 1
+                    
+                    page_no += 1
+                
+                if len(block) < self.page_size * block_pages:
+                    break
@@ -1,4 +1,4 @@
-from typing import Any, List, Dict
+from typing import Any, List, Dict, Union
 from .engine import BadSUBDEngine
 from .sql_parser import SQLParser
 
@@ -13,14 +13,25 @@ class SQLBadSUBDEngine:
         """Выполнить SQL запрос"""
         return self.parser.execute(sql)
     
-    def create_table(self, table_name: str, columns: List[Dict]) -> None:
+    def create_table(self, table_name: str, columns: List[Dict], storage_format: str = 'utf32') -> None:
         """Создать таблицу (совместимость с существующим кодом)"""
-        self.engine.create_table(table_name, columns)
+        self.engine.create_table(table_name, columns, storage_format)
     
-    def create_index(self, table_name: str, column_name: str) -> None:
+    def create_index(self, table_name: str, column_name: Union[str, List[str]], kind: str = 'hash',
+                     unique: bool = False) -> None:
         """Создать индекс (совместимость с существующим кодом)"""
-        self.engine.create_index(table_name, column_name)
+        self.engine.create_index(table_name, column_name, kind, unique)
     
     def get_table_info(self, table_name: str) -> Dict:
         """Получить информацию о таблице (совместимость)"""
         return self.engine.get_table_info(table_name)
+    
+    def close(self) -> None:
+        """Закрыть открытые файлы движка"""
+        self.engine.close()
+    
+    def __enter__(self) -> 'SQLBadSUBDEngine':
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
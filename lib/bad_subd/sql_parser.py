@@ -1,6 +1,7 @@
 import re
 from typing import List, Dict, Any, Tuple
 from .engine import BadSUBDEngine
+from .conditions import Condition, Range, Match
 
 class SQLParser:
     """Парсер SQL запросов для BadSUBD"""
@@ -12,41 +13,58 @@ class SQLParser:
         """Выполнить SQL запрос"""
         sql = sql.strip().replace('\n', ' ').replace('\t', ' ')
         
-
+        
         if sql.upper().startswith('CREATE TABLE'):
             return self._parse_create_table(sql)
         elif sql.upper().startswith('INSERT INTO'):
             return self._parse_insert(sql)
         elif sql.upper().startswith('SELECT'):
             return self._parse_select(sql)
+        elif sql.upper().startswith('UPDATE'):
+            return self._parse_update(sql)
         elif sql.upper().startswith('DELETE'):
             return self._parse_delete(sql)
+        elif sql.upper().startswith('VACUUM'):
+            return self._parse_vacuum(sql)
+        elif sql.upper().startswith('ANALYZE'):
+            return self._parse_analyze(sql)
         else:
             raise ValueError(f"Unsupported SQL statement: {sql}")
     
     def _parse_create_table(self, sql: str) -> bool:
-        """Парсинг CREATE TABLE"""
+        """Парсинг CREATE TABLE
+        
+        После списка колонок можно указать формат хранения:
+        CREATE TABLE t (...) STORAGE = utf8 (по умолчанию utf32).
+        """
         
         sql = re.sub(r'CREATE TABLE\s+', '', sql, flags=re.IGNORECASE)
         
         # Извлекаем имя таблицы
-        table_match = re.match(r'(\w+)\s*\((.*)\)', sql, re.IGNORECASE | re.DOTALL)
+        table_match = re.match(r'(\w+)\s*\((.*)\)\s*(?:STORAGE\s*=?\s*(\w+))?\s*;?$', sql,
+                               re.IGNORECASE | re.DOTALL)
         if not table_match:
             raise ValueError("Invalid CREATE TABLE syntax")
         
         table_name = table_match.group(1)
         columns_str = table_match.group(2)
+        storage_format = (table_match.group(3) or 'utf32').lower()
         
         # Парсим колонки
         columns = self._parse_columns(columns_str)
         
         # Создаем таблицу через движок
-        self.engine.create_table(table_name, columns)
+        self.engine.create_table(table_name, columns, storage_format)
         return True
     
     def _parse_columns(self, columns_str: str) -> List[Dict[str, Any]]:
-        """Парсинг определений колонок"""
+        """Парсинг определений колонок
+        
+        Ограничения задаются у колонки (id INT PRIMARY KEY, login VARCHAR(45) UNIQUE)
+        или отдельным определением таблицы (PRIMARY KEY (id), UNIQUE (login)).
+        """
         columns = []
+        constraints = []
         # Улучшенный парсинг колонок с учетом скобок
         column_defs = []
         current_col = ""
@@ -70,7 +88,16 @@ class SQLParser:
         for col_def in column_defs:
             if not col_def:
                 continue
-                
+            
+            # Ограничение уровня таблицы
+            constraint_match = re.match(r'(PRIMARY\s+KEY|UNIQUE)\s*\((.*)\)$', col_def, re.IGNORECASE)
+            if constraint_match:
+                constraint_columns = [name.strip() for name in constraint_match.group(2).split(',')]
+                if len(constraint_columns) != 1:
+                    raise ValueError(f"Only single-column constraints are supported: {col_def}")
+                constraints.append((constraint_match.group(1).upper().split()[0], constraint_columns[0]))
+                continue
+            
             # Разбираем определение колонки
             parts = col_def.split()
             if len(parts) < 2:
@@ -99,6 +126,17 @@ class SQLParser:
                 })
             else:
                 raise ValueError(f"Unsupported data type: {col_type}")
+            
+            if re.search(r'\bPRIMARY\s+KEY\b', col_def, re.IGNORECASE):
+                columns[-1]['primary_key'] = True
+            elif re.search(r'\bUNIQUE\b', col_def, re.IGNORECASE):
+                columns[-1]['unique'] = True
+        
+        for constraint, col_name in constraints:
+            column = next((col for col in columns if col['name'] == col_name), None)
+            if column is None:
+                raise ValueError(f"Column {col_name} not found for {constraint} constraint")
+            column['primary_key' if constraint == 'PRIMARY' else 'unique'] = True
         
         return columns
     
@@ -197,6 +235,14 @@ class SQLParser:
         # Убираем SELECT
         sql = re.sub(r'SELECT\s+', '', sql, flags=re.IGNORECASE)
         
+        # LIMIT n [OFFSET m] или OFFSET m в конце запроса
+        limit, offset = None, 0
+        paging = re.search(r'(?:\s+LIMIT\s+(\d+))?(?:\s+OFFSET\s+(\d+))?\s*;?$', sql, re.IGNORECASE)
+        if paging and (paging.group(1) or paging.group(2)):
+            limit = int(paging.group(1)) if paging.group(1) else None
+            offset = int(paging.group(2) or 0)
+            sql = sql[:paging.start()]
+        
         # Извлекаем колонки
         from_match = re.search(r'FROM\s+(\w+)(?:\s+WHERE\s+(.*))?$', sql, re.IGNORECASE)
         if not from_match:
@@ -216,24 +262,95 @@ class SQLParser:
         where_condition = self._parse_where(where_clause) if where_clause else None
         
         # Выполняем запрос
-        return self.engine.select(table_name, columns, where_condition)
+        return self.engine.select(table_name, columns, where_condition, limit, offset)
     
     def _parse_where(self, where_clause: str) -> Dict[str, Any]:
-        """Парсинг WHERE условия"""
+        """Парсинг WHERE условия
+        
+        Поддерживаются равенство, сравнения <, <=, >, >=, BETWEEN a AND b и
+        полнотекстовое col MATCH 'слова', объединенные через AND. Сравнения
+        одного столбца сводятся в один Range, слова MATCH - в один Match.
+        """
         conditions = {}
         
         if not where_clause:
             return conditions
         
-        # Простая поддержка условий равенства
-        pattern = r'(\w+)\s*=\s*([^\s,]+)'
+        # BETWEEN разбирается первым, чтобы его AND не путался с разделителем условий
+        between = r'(\w+)\s+BETWEEN\s+([^\s,]+)\s+AND\s+([^\s,]+)'
+        for col_name, low, high in re.findall(between, where_clause, re.IGNORECASE):
+            self._add_condition(conditions, col_name,
+                                Range(self._convert_value(low), self._convert_value(high)))
+        where_clause = re.sub(between, ' ', where_clause, flags=re.IGNORECASE)
+        
+        # MATCH тоже разбирается заранее: в строке запроса могут быть пробелы и знаки
+        match = r"""(\w+)\s+MATCH\s+('[^']*'|"[^"]*")"""
+        for col_name, query in re.findall(match, where_clause, re.IGNORECASE):
+            self._add_condition(conditions, col_name, Match(self._convert_value(query)))
+        where_clause = re.sub(match, ' ', where_clause, flags=re.IGNORECASE)
+        
+        pattern = r'(\w+)\s*(<=|>=|<|>|=)\s*([^\s,]+)'
         matches = re.findall(pattern, where_clause)
         
-        for col_name, value in matches:
-            conditions[col_name] = self._convert_value(value)
+        for col_name, operator, value in matches:
+            value = self._convert_value(value)
+            if operator == '=':
+                self._add_condition(conditions, col_name, value)
+            elif operator == '<':
+                self._add_condition(conditions, col_name, Range(high=value, include_high=False))
+            elif operator == '<=':
+                self._add_condition(conditions, col_name, Range(high=value))
+            elif operator == '>':
+                self._add_condition(conditions, col_name, Range(low=value, include_low=False))
+            else:
+                self._add_condition(conditions, col_name, Range(low=value))
         
         return conditions
     
+    def _add_condition(self, conditions: Dict[str, Any], col_name: str, condition: Any) -> None:
+        """Добавить условие столбца; два диапазона одного столбца пересекаются,
+        два MATCH объединяют слова
+        
+        Равенство с другим условием того же столбца остается равенством, если
+        значение ему удовлетворяет, иначе столбец получает пустой диапазон:
+        результат не зависит от порядка условий.
+        """
+        if col_name not in conditions:
+            conditions[col_name] = condition
+            return
+        
+        existing = conditions[col_name]
+        if isinstance(existing, Range) and isinstance(condition, Range):
+            condition = existing.intersect(condition)
+        elif isinstance(existing, Match) and isinstance(condition, Match):
+            condition = Match(f"{existing.query} {condition.query}")
+        elif isinstance(existing, Condition) or isinstance(condition, Condition):
+            value, other = (condition, existing) if isinstance(existing, Condition) else (existing, condition)
+            condition = value if isinstance(value, Condition) or other.matches(value) else self._nothing(value)
+        elif existing != condition:
+            condition = self._nothing(condition)
+        conditions[col_name] = condition
+    
+    def _nothing(self, value: Any) -> Range:
+        """Диапазон без единого значения (value < x <= value)"""
+        return Range(value, value, include_low=False)
+    
+    def _parse_update(self, sql: str) -> int:
+        """Парсинг UPDATE table_name SET col = value, ... [WHERE ...]"""
+        match = re.match(r'UPDATE\s+(\w+)\s+SET\s+(.*?)(?:\s+WHERE\s+(.*?))?\s*;?$', sql, re.IGNORECASE)
+        if not match:
+            raise ValueError("Invalid UPDATE syntax")
+        
+        table_name, set_clause, where_clause = match.groups()
+        # Присваивания через запятую; строки в кавычках могут содержать пробелы
+        item = r"""(\w+)\s*=\s*('[^']*'|"[^"]*"|[^\s,]+)"""
+        if not re.fullmatch(rf'{item}(?:\s*,\s*{item})*', set_clause.strip()):
+            raise ValueError("Invalid UPDATE syntax")
+        values = {col_name: self._convert_value(value) for col_name, value in re.findall(item, set_clause)}
+        
+        where_condition = self._parse_where(where_clause) if where_clause else None
+        return self.engine.update(table_name, values, where_condition)
+    
     def _parse_delete(self, sql: str) -> int:
         """Парсинг DELETE"""
         # Убираем DELETE
@@ -266,4 +383,20 @@ class SQLParser:
                 where_condition = self._parse_where(where_clause)
                 return self.engine.delete(table_name, where_condition)
             else:
-                return self.engine.delete(table_name)
\ No newline at end of file
+                return self.engine.delete(table_name)
+    
+    def _parse_vacuum(self, sql: str) -> Dict[str, Any]:
+        """Парсинг VACUUM table_name"""
+        match = re.match(r'VACUUM\s+(\w+)\s*;?$', sql, re.IGNORECASE)
+        if not match:
+            raise ValueError("Invalid VACUUM syntax")
+        
+        return self.engine.vacuum(match.group(1))
+    
+    def _parse_analyze(self, sql: str) -> Dict[str, Any]:
+        """Парсинг ANALYZE table_name"""
+        match = re.match(r'ANALYZE\s+(\w+)\s*;?$', sql, re.IGNORECASE)
+        if not match:
+            raise ValueError("Invalid ANALYZE syntax")
+        
+        return self.engine.analyze(match.group(1)).to_dict()
\ No newline at end of file
@@ -1,8 +1,9 @@
 import struct
 import os
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Set, Iterable, Tuple
 from dataclasses import dataclass
 from .config import bad_subd_config
+from .conditions import Condition
 
 @dataclass
 class ColumnDefinition:
@@ -11,12 +12,92 @@ class ColumnDefinition:
     data_type: str  # 'INT' или 'VARCHAR'
     size: int = 0   # Для VARCHAR - количество символов
 
+_INT_STRUCT = struct.Struct('>Q')
+_LEN_STRUCT = struct.Struct('>H')
+
+class RowCodec:
+    """Предкомпилированный декодер строки UTF32RowStorage
+    
+    Строка (флаг удаления + выбранные столбцы) читается одним вызовом
+    struct.unpack_from. Невыбранные столбцы пропускаются байтами-заполнителями
+    'x', поэтому их содержимое вообще не копируется и не декодируется.
+    Соседние выбранные VARCHAR объединяются в одно поле и декодируются из
+    UTF-32 одним вызовом decode.
+    """
+    
+    def __init__(self, columns: List[ColumnDefinition], needed: Optional[Set[str]] = None):
+        fmt = ['>B']
+        self.field_names = ['_deleted']
+        # Группы соседних VARCHAR: (имя поля struct, [(имя столбца, начало, конец в символах)])
+        self.str_groups = []
+        self.column_names = []
+        
+        group_chars = 0
+        for col in columns:
+            if col.data_type == 'INT':
+                width = bad_subd_config.INT_SIZE
+            else:
+                width = col.size * bad_subd_config.CHAR_SIZE
+            
+            if needed is not None and col.name not in needed:
+                fmt.append(f'{width}x')
+                group_chars = 0
+                continue
+            
+            self.column_names.append(col.name)
+            if col.data_type == 'INT':
+                fmt.append('Q')
+                self.field_names.append(col.name)
+                group_chars = 0
+            else:
+                if group_chars == 0:
+                    self.str_groups.append((f'_group{len(self.str_groups)}', []))
+                    self.field_names.append(self.str_groups[-1][0])
+                    fmt.append('')
+                self.str_groups[-1][1].append((col.name, group_chars, group_chars + col.size))
+                group_chars += col.size
+                fmt[-1] = f'{group_chars * bad_subd_config.CHAR_SIZE}s'
+        
+        self.row_struct = struct.Struct(''.join(fmt))
+    
+    def decode(self, buffer, offset: int = 0) -> Dict[str, Any]:
+        """Декодирование строки из буфера по смещению"""
+        row = dict(zip(self.field_names, self.row_struct.unpack_from(buffer, offset)))
+        row['_deleted'] = bool(row['_deleted'])
+        
+        for field, columns in self.str_groups:
+            # UTF-32 - 4 байта на символ, поэтому столбцы группы режутся по символам
+            text = row.pop(field).decode('utf-32-le', errors='replace')
+            for name, start, end in columns:
+                row[name] = text[start:end].rstrip('\x00')
+        
+        return row
+
+def _check_value(name: str, is_int: bool, value: Any) -> Any:
+    """Проверка значения столбца перед записью, None заменяется значением по умолчанию"""
+    if is_int:
+        # uint64 (8 байт)
+        int_val = value if value is not None else 0
+        if not isinstance(int_val, int) or int_val < 0:
+            raise ValueError(f"INT value must be positive integer: {name}")
+        if int_val > 2**64 - 1:
+            raise ValueError(f"INT value too large: {name}")
+        return int_val
+    
+    str_val = value if value is not None else ""
+    if not isinstance(str_val, str):
+        raise ValueError(f"VARCHAR value must be string: {name}")
+    return str_val
+
 class UTF32RowStorage:
     """Хранение строк в UTF-32 с фиксированной длиной"""
     
+    format = 'utf32'
+    
     def __init__(self, columns: List[ColumnDefinition]):
         self.columns = columns
         self.row_size = self._calculate_row_size()
+        self._compile_codec()
         
     def _calculate_row_size(self) -> int:
         """Вычисляет размер одной строки в байтах"""
@@ -31,105 +112,247 @@ class UTF32RowStorage:
                 
         return size
     
-    def _string_to_utf32_fixed(self, text: str, max_chars: int) -> bytes:
-        """Конвертация строки в UTF-32 с фиксированной длиной"""
-        if len(text) > max_chars:
-            text = text[:max_chars]
+    def _compile_codec(self) -> None:
+        """Предкомпиляция struct-формата строки по схеме
         
-        # Конвертируем в UTF-32LE
-        utf32_data = text.encode('utf-32-le')
+        Вся строка кодируется одним struct.Struct полного кодека, поэтому
+        сериализация и десериализация - это один вызов pack/unpack_from.
+        """
+        self._codec = RowCodec(self.columns)
+        self._projections: Dict[frozenset, RowCodec] = {}
+        self.column_offsets: Dict[str, int] = {}
         
-        # Дополняем до фиксированного размера
-        expected_size = max_chars * 4
-        if len(utf32_data) < expected_size:
-            utf32_data += b'\x00' * (expected_size - len(utf32_data))
+        offset = 1
+        for col in self.columns:
+            self.column_offsets[col.name] = offset
+            if col.data_type == 'INT':
+                offset += bad_subd_config.INT_SIZE
+            elif col.data_type == 'VARCHAR':
+                offset += col.size * bad_subd_config.CHAR_SIZE
         
-        return utf32_data
+        # (имя, является ли INT, размер VARCHAR) - чтобы не трогать ColumnDefinition в цикле
+        self._encoders = [(col.name, col.data_type == 'INT', col.size) for col in self.columns]
+        self._column_numbers = {col.name: i for i, col in enumerate(self.columns)}
     
-    def _utf32_to_string(self, data: bytes) -> str:
-        """Конвертация UTF-32 данных в строку"""
-        data = data.rstrip(b'\x00')
-        
-        # Дополняем до кратности 4
-        remainder = len(data) % 4
-        if remainder != 0:
-            data += b'\x00' * (4 - remainder)
+    def get_codec(self, columns: Optional[Iterable[str]] = None) -> RowCodec:
+        """Декодер, читающий только нужные столбцы (None - все столбцы)"""
+        if columns is None:
+            return self._codec
         
-        if len(data) == 0:
-            return ""
-            
-        return data.decode('utf-32-le', errors='ignore')
+        key = frozenset(columns)
+        if key not in self._projections:
+            self._projections[key] = RowCodec(self.columns, key)
+        return self._projections[key]
     
-    def serialize_row(self, row: Dict[str, Any]) -> bytes:
-        """Сериализация строки в бинарный формат"""
-        data = bytearray()
-        
-        # Флаг удаления (0 - активна, 1 - удалена)
-        data.append(0)
+    def _row_values(self, row: Dict[str, Any]) -> List[Any]:
+        """Подготовка значений строки для упаковки в struct"""
+        values = [0]  # Флаг удаления (0 - активна, 1 - удалена)
+        group = None
         
-        for col in self.columns:
-            value = row.get(col.name)
+        for name, is_int, size in self._encoders:
+            value = _check_value(name, is_int, row.get(name))
             
-            if col.data_type == 'INT':
+            if is_int:
                 # uint64 (8 байт)
-                int_val = value if value is not None else 0
-                if not isinstance(int_val, int) or int_val < 0:
-                    raise ValueError(f"INT value must be positive integer: {col.name}")
-                if int_val > 2**64 - 1:
-                    raise ValueError(f"INT value too large: {col.name}")
-                    
-                data.extend(struct.pack('>Q', int_val))
-                
-            elif col.data_type == 'VARCHAR':
-                # VARCHAR: фиксированный размер в UTF-32
-                str_val = value if value is not None else ""
-                if not isinstance(str_val, str):
-                    raise ValueError(f"VARCHAR value must be string: {col.name}")
-                
-                utf32_data = self._string_to_utf32_fixed(str_val, col.size)
-                data.extend(utf32_data)
+                values.append(value)
+                group = None
+            else:
+                # VARCHAR: фиксированный размер в UTF-32, дополняется нулями
+                text = value[:size].ljust(size, '\x00')
+                if group is None:
+                    group = [text]
+                    values.append(group)
+                else:
+                    group.append(text)
         
-        return bytes(data)
+        # Группа соседних VARCHAR кодируется одним вызовом encode
+        return [''.join(v).encode('utf-32-le') if isinstance(v, list) else v for v in values]
+    
+    def serialize_row(self, row: Dict[str, Any]) -> bytes:
+        """Сериализация строки в бинарный формат"""
+        return self._codec.row_struct.pack(*self._row_values(row))
+    
+    def serialize_row_into(self, buffer, offset: int, row: Dict[str, Any]) -> None:
+        """Сериализация строки прямо в буфер по смещению"""
+        self._codec.row_struct.pack_into(buffer, offset, *self._row_values(row))
     
     def deserialize_row(self, data: bytes) -> Dict[str, Any]:
         """Десериализация строки из бинарного формата"""
         if len(data) != self.row_size:
             raise ValueError(f"Invalid row data size: expected {self.row_size}, got {len(data)}")
-            
-        row = {}
-        pos = 0
+        return self.deserialize_row_at(data, 0)
+    
+    def deserialize_row_at(self, buffer, offset: int) -> Dict[str, Any]:
+        """Десериализация строки из буфера по смещению (без копирования строки)"""
+        return self._codec.decode(buffer, offset)
+    
+    def encode_value(self, column_name: str, value: Any) -> Optional[bytes]:
+        """Кодирование значения столбца в его фиксированный вид на диске
         
-        # Флаг удаления
-        deleted = data[pos]
-        pos += 1
-        row['_deleted'] = bool(deleted)
+        Возвращает None, если такое значение не может храниться в столбце,
+        то есть условие равенства с ним не выполнится ни для одной строки.
+        """
+        name, is_int, size = self._encoders[self._column_numbers[column_name]]
         
-        for col in self.columns:
-            if col.data_type == 'INT':
-                # uint64 (8 байт)
-                value = struct.unpack('>Q', data[pos:pos+8])[0]
-                pos += 8
-                row[col.name] = value
-                
-            elif col.data_type == 'VARCHAR':
-                # VARCHAR: фиксированный размер в UTF-32
-                str_data = data[pos:pos + col.size * 4]
-                pos += col.size * 4
-                row[col.name] = self._utf32_to_string(str_data)
+        if is_int:
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if not isinstance(value, int) or not 0 <= value <= 2**64 - 1:
+                return None
+            return _INT_STRUCT.pack(value)
         
-        return row
+        # Декодированные строки не содержат хвостовых нулей и не длиннее size
+        if not isinstance(value, str) or len(value) > size or value.endswith('\x00'):
+            return None
+        try:
+            return value.ljust(size, '\x00').encode('utf-32-le')
+        except UnicodeEncodeError:
+            return None
+    
+    def encode_filter(self, where: Dict[str, Any]) -> Optional[List[Tuple[int, bytes]]]:
+        """Условия равенства WHERE в виде (смещение, байты) для сравнения без декодирования
+        
+        Столбцы, которых нет в схеме, пропускаются. Возвращает None, если
+        условие заведомо не выполняется.
+        """
+        raw_filter = []
+        for column_name, value in (where or {}).items():
+            # Диапазоны и Match проверяются после декодирования
+            if column_name not in self.column_offsets or isinstance(value, Condition):
+                continue
+            encoded = self.encode_value(column_name, value)
+            if encoded is None:
+                return None
+            raw_filter.append((self.column_offsets[column_name], encoded))
+        return raw_filter
     
     def get_column_offset(self, column_name: str) -> int:
         """Получить смещение столбца в строке"""
-        offset = 1  # Начинаем после флага удаления
+        if column_name not in self.column_offsets:
+            raise ValueError(f"Column {column_name} not found")
+        return self.column_offsets[column_name]
+
+class UTF8RowCodec:
+    """Декодер строки UTF8RowStorage
+    
+    Столбцы идут подряд: INT - 8 байт '>Q', VARCHAR - длина в байтах '>H'
+    и UTF-8 данные. Ненужные строки пропускаются по длине без декодирования,
+    после последнего нужного столбца разбор прекращается.
+    """
+    
+    def __init__(self, columns: List[ColumnDefinition], needed: Optional[Set[str]] = None):
+        steps = [(col.name, col.data_type == 'INT', needed is None or col.name in needed) for col in columns]
+        wanted = [i for i, (_, _, is_needed) in enumerate(steps) if is_needed]
+        self.steps = steps[:wanted[-1] + 1] if wanted else []
+    
+    def decode(self, buffer, offset: int = 0) -> Dict[str, Any]:
+        """Декодирование строки из буфера по смещению"""
+        row = {'_deleted': False}
+        pos = offset
         
-        for col in self.columns:
-            if col.name == column_name:
-                return offset
-                
-            if col.data_type == 'INT':
-                offset += bad_subd_config.INT_SIZE
-            elif col.data_type == 'VARCHAR':
-                offset += col.size * bad_subd_config.CHAR_SIZE
-                
-        raise ValueError(f"Column {column_name} not found")
\ No newline at end of file
+        for name, is_int, is_needed in self.steps:
+            if is_int:
+                if is_needed:
+                    row[name] = _INT_STRUCT.unpack_from(buffer, pos)[0]
+                pos += bad_subd_config.INT_SIZE
+            else:
+                length = _LEN_STRUCT.unpack_from(buffer, pos)[0]
+                pos += _LEN_STRUCT.size
+                if is_needed:
+                    row[name] = str(buffer[pos:pos + length], 'utf-8', 'replace')
+                pos += length
+        
+        return row
+
+class UTF8RowStorage:
+    """Хранение строк переменной длины в UTF-8 (страницы со слотами)
+    
+    VARCHAR занимает столько байт, сколько нужно строке, а не size * 4.
+    Размер строки не фиксирован, поэтому row_size равен None, а файл таблицы
+    разбит на страницы с каталогом слотов (см. slotted_file).
+    """
+    
+    format = 'utf8'
+    
+    def __init__(self, columns: List[ColumnDefinition]):
+        self.columns = columns
+        self.row_size = None
+        self.max_row_size = sum(
+            bad_subd_config.INT_SIZE if col.data_type == 'INT'
+            else _LEN_STRUCT.size + col.size * bad_subd_config.CHAR_SIZE
+            for col in columns
+        )
+        self._codec = UTF8RowCodec(columns)
+        self._projections: Dict[frozenset, UTF8RowCodec] = {}
+        self._encoders = [(col.name, col.data_type == 'INT', col.size) for col in columns]
+        self._column_numbers = {col.name: i for i, col in enumerate(columns)}
+    
+    def get_codec(self, columns: Optional[Iterable[str]] = None) -> UTF8RowCodec:
+        """Декодер, читающий только нужные столбцы (None - все столбцы)"""
+        if columns is None:
+            return self._codec
+        
+        key = frozenset(columns)
+        if key not in self._projections:
+            self._projections[key] = UTF8RowCodec(self.columns, key)
+        return self._projections[key]
+    
+    def serialize_row(self, row: Dict[str, Any]) -> bytes:
+        """Сериализация строки в бинарный формат переменной длины"""
+        parts = []
+        for name, is_int, size in self._encoders:
+            value = _check_value(name, is_int, row.get(name))
+            if is_int:
+                parts.append(_INT_STRUCT.pack(value))
+            else:
+                data = value[:size].encode('utf-8')
+                parts.append(_LEN_STRUCT.pack(len(data)))
+                parts.append(data)
+        return b''.join(parts)
+    
+    def deserialize_row(self, data: bytes) -> Dict[str, Any]:
+        """Десериализация строки из бинарного формата"""
+        return self._codec.decode(data)
+    
+    def encode_value(self, column_name: str, value: Any) -> Optional[bytes]:
+        """Кодирование значения столбца; None - значение не может храниться в столбце"""
+        name, is_int, size = self._encoders[self._column_numbers[column_name]]
+        
+        if is_int:
+            if isinstance(value, float) and value.is_integer():
+                value = int(value)
+            if not isinstance(value, int) or not 0 <= value <= 2**64 - 1:
+                return None
+            return _INT_STRUCT.pack(value)
+        
+        if not isinstance(value, str) or len(value) > size:
+            return None
+        try:
+            return value.encode('utf-8')
+        except UnicodeEncodeError:
+            return None
+    
+    def encode_filter(self, where: Dict[str, Any]) -> Optional[List[Tuple[int, bytes]]]:
+        """Проверка условий равенства WHERE
+        
+        У строк переменной длины нет фиксированных смещений, поэтому
+        сравнение байт не используется: возвращается пустой список или None,
+        если условие заведомо не выполняется.
+        """
+        for column_name, value in (where or {}).items():
+            if isinstance(value, Condition):
+                continue
+            if column_name in self._column_numbers and self.encode_value(column_name, value) is None:
+                return None
+        return []
+
+STORAGE_FORMATS = {
+    'utf32': UTF32RowStorage,
+    'utf8': UTF8RowStorage
+}
+
+def create_storage(columns: List[ColumnDefinition], storage_format: str = 'utf32'):
+    """Создать хранилище строк нужного формата"""
+    if storage_format not in STORAGE_FORMATS:
+        raise ValueError(f"Unsupported storage format: {storage_format}")
+    return STORAGE_FORMATS[storage_format](columns)
\ No newline at end of file
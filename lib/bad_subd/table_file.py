@@ -1,103 +1,452 @@
 import os
+import mmap
 import struct
-from typing import List, Dict, Any, Iterator
-from .storage import UTF32RowStorage
+from typing import List, Dict, Any, Iterator, Iterable, Optional, Tuple
+from .storage import UTF32RowStorage, RowCodec
 from .schema import TableSchema
+from .file_pool import FileHandlePool
+from .slotted_file import SlottedPageFile
 from .config import bad_subd_config
 
+HEADER_SIZE = 16  # 'CDB3'/'CDB8' + количество строк (Q) + голова списка свободных слотов (I)
+HEADER_FIELDS = struct.Struct('>QI')  # поля заголовка после сигнатуры
+FREE_SLOT = struct.Struct('>BI')  # флаг удаления + следующий свободный слот (номер строки + 1)
+FILE_MAGIC = {'utf32': b'CDB3', 'utf8': b'CDB8'}
+SCAN_BLOCK_SIZE = 64 * 1024  # Размер блока чтения при полном скане
+VACUUM_BATCH_ROWS = 4096  # Строк в одной записи при перезаписи таблицы
+
+# Поколение файла таблицы по пути: растет, когда файл пересоздается, заменяется
+# VACUUM или удаляется. Другой менеджер процесса по нему узнает, что его
+# дескриптор и отображение смотрят в старый файл, и открывает файл заново
+_file_generations: Dict[str, int] = {}
+
 class TableFileManager:
-    def __init__(self, table_dir: str = None):
+    """Файлы таблиц
+    
+    Удаленные строки фиксированной длины образуют список свободных слотов:
+    заголовок файла хранит номер первого слота, а каждый удаленный слот -
+    номер следующего сразу за флагом удаления. Вставка сначала занимает
+    эти слоты, поэтому при чередовании удалений и вставок размер файла
+    и время скана определяются живыми строками.
+    """
+    
+    def __init__(self, table_dir: str = None, use_mmap: bool = None, file_pool: FileHandlePool = None):
         self.table_dir = table_dir or bad_subd_config.TABLE_DIR
+        self.use_mmap = bad_subd_config.USE_MMAP if use_mmap is None else use_mmap
+        self.file_pool = file_pool if file_pool is not None else FileHandlePool()
+        # Таблицы формата utf8 хранятся в страницах со слотами, mmap для них не используется
+        self.slotted = SlottedPageFile(HEADER_SIZE)
+        self._mappings: Dict[str, mmap.mmap] = {}
+        self._generations: Dict[str, int] = {}  # Поколение файла, к которому относятся дескриптор и отображение
     
     def create_table_file(self, schema: TableSchema) -> None:
+        self._release(schema.table_name)
         file_path = self._get_table_path(schema.table_name)
         with open(file_path, 'wb') as f:
-            f.write(b'CDB3')
+            f.write(FILE_MAGIC[schema.storage_format])
             f.write(struct.pack('>Q', 0))
             f.write(struct.pack('>I', 0))
+        self._replaced(file_path)
     
     def insert_row(self, table_name: str, row_data: Dict[str, Any], storage: UTF32RowStorage):
-        file_path = self._get_table_path(table_name)
         row_bytes = storage.serialize_row(row_data)
+        f = self._get_handle(table_name)
         
-        with open(file_path, 'r+b') as f:
-            f.seek(4)
-            row_count_bytes = f.read(8)
-            row_count = struct.unpack('>Q', row_count_bytes)[0]
-            
-            f.seek(0, 2)
-            position = f.tell()
-            
+        if storage.format == 'utf8':
+            return self.slotted.insert_rows(f, [row_bytes])[0]
+        
+        row_count, free_head = self._read_header(f)
+        if free_head:
+            position, free_head = self._pop_free_slot(f, free_head, storage)
+            f.seek(position)
             f.write(row_bytes)
-            
-            f.seek(4)
-            f.write(struct.pack('>Q', row_count + 1))
+            self._write_header(f, row_count + 1, free_head)
+            return position
+        
+        position = f.seek(0, 2)
+        f.write(row_bytes)
+        self._write_header(f, row_count + 1, free_head)
         
         return position
     
-    def read_row_at_position(self, table_name: str, position: int, storage: UTF32RowStorage) -> Dict[str, Any]:
-        file_path = self._get_table_path(table_name)
-        with open(file_path, 'rb') as f:
+    def insert_rows(self, table_name: str, rows: List[Dict[str, Any]],
+                    storage: UTF32RowStorage) -> Tuple[List[Tuple[int, int]], List[Tuple[int, str]]]:
+        """Пакетная вставка: сначала в свободные слоты, остальное одной записью в конец файла
+        
+        Возвращает пары (номер строки, позиция) для вставленных строк и
+        пары (номер строки, ошибка) для строк, которые не удалось сериализовать.
+        """
+        if storage.format == 'utf8':
+            return self._insert_slotted_rows(table_name, rows, storage)
+        
+        buffer = bytearray(len(rows) * storage.row_size)
+        accepted = []
+        rejected = []
+        
+        for row_number, row_data in enumerate(rows):
+            try:
+                storage.serialize_row_into(buffer, len(accepted) * storage.row_size, row_data)
+            except (ValueError, TypeError, AttributeError) as e:
+                rejected.append((row_number, str(e)))
+                continue
+            accepted.append(row_number)
+        
+        if not accepted:
+            return [], rejected
+        
+        row_size = storage.row_size
+        view = memoryview(buffer)
+        f = self._get_handle(table_name)
+        row_count, free_head = self._read_header(f)
+        
+        positions = []
+        while free_head and len(positions) < len(accepted):
+            position, free_head = self._pop_free_slot(f, free_head, storage)
+            offset = len(positions) * row_size
             f.seek(position)
-            row_data = f.read(storage.row_size)
-            if len(row_data) != storage.row_size:
+            f.write(view[offset:offset + row_size])
+            positions.append(position)
+        
+        reused = len(positions)
+        if reused < len(accepted):
+            start = f.seek(0, 2)
+            f.write(view[reused * row_size:len(accepted) * row_size])
+            positions.extend(start + i * row_size for i in range(len(accepted) - reused))
+        
+        self._write_header(f, row_count + len(accepted), free_head)
+        return list(zip(accepted, positions)), rejected
+    
+    def _insert_slotted_rows(self, table_name: str, rows: List[Dict[str, Any]],
+                             storage) -> Tuple[List[Tuple[int, int]], List[Tuple[int, str]]]:
+        """Пакетная вставка в таблицу формата utf8"""
+        accepted = []
+        rejected = []
+        for row_number, row_data in enumerate(rows):
+            try:
+                row_bytes = storage.serialize_row(row_data)
+                self.slotted.check_row(row_bytes)
+            except (ValueError, TypeError, AttributeError) as e:
+                rejected.append((row_number, str(e)))
+                continue
+            accepted.append((row_number, row_bytes))
+        
+        if not accepted:
+            return [], rejected
+        
+        positions = self.slotted.insert_rows(self._get_handle(table_name), [row_bytes for _, row_bytes in accepted])
+        return [(row_number, position) for (row_number, _), position in zip(accepted, positions)], rejected
+    
+    def read_row_at_position(self, table_name: str, position: int, storage: UTF32RowStorage,
+                             columns: Iterable[str] = None) -> Dict[str, Any]:
+        codec = storage.get_codec(columns)
+        if storage.format == 'utf8':
+            return self.slotted.read_row(self._get_handle(table_name), position, codec)
+        
+        if self.use_mmap:
+            mapping = self._get_mapping(table_name, position + storage.row_size)
+            if mapping is None:
                 raise ValueError("Неправильная строка")
-            return storage.deserialize_row(row_data)
+            return codec.decode(mapping, position)
+        
+        f = self._get_handle(table_name)
+        f.seek(position)
+        row_data = f.read(storage.row_size)
+        if len(row_data) != storage.row_size:
+            raise ValueError("Неправильная строка")
+        return codec.decode(row_data)
     
     def read_row_by_index(self, table_name: str, row_index: int, storage: UTF32RowStorage) -> Dict[str, Any]:
-        position = 16 + row_index * storage.row_size
+        if storage.row_size is None:
+            raise ValueError("Row index lookup requires fixed-width rows")
+        position = HEADER_SIZE + row_index * storage.row_size
         return self.read_row_at_position(table_name, position, storage)
     
-    def update_row(self, table_name: str, position: int, row_data: Dict[str, Any], storage: UTF32RowStorage) -> None:
-        file_path = self._get_table_path(table_name)
+    def update_row(self, table_name: str, position: int, row_data: Dict[str, Any], storage: UTF32RowStorage) -> int:
+        """Перезаписать строку, возвращает ее позицию (строка utf8 может переехать)"""
         row_bytes = storage.serialize_row(row_data)
+        f = self._get_handle(table_name)
+        if storage.format == 'utf8':
+            return self.slotted.update_row(f, position, row_bytes)
+        
+        f.seek(position)
+        f.write(row_bytes)
+        return position
+    
+    def delete_row_at_position(self, table_name: str, position: int, storage: UTF32RowStorage) -> None:
+        """Пометить строку как удаленную"""
+        self.delete_rows_at_positions(table_name, [position], storage)
+    
+    def delete_rows_at_positions(self, table_name: str, positions: Iterable[int], storage: UTF32RowStorage) -> int:
+        """Пометить строки удаленными через один дескриптор в порядке позиций
         
-        with open(file_path, 'r+b') as f:
+        Заголовок читается и пишется один раз; уже удаленные строки
+        пропускаются. Возвращает число помеченных строк.
+        """
+        f = self._get_handle(table_name)
+        positions = sorted(set(positions))
+        if storage.format == 'utf8':
+            return self.slotted.delete_rows(f, positions)
+        
+        row_count, free_head = self._read_header(f)
+        deleted = 0
+        for position in positions:
             f.seek(position)
-            f.write(row_bytes)
+            slot = f.read(FREE_SLOT.size)
+            if not slot or slot[0]:
+                continue
+            
+            f.seek(position)
+            if storage.row_size < FREE_SLOT.size:
+                # В слишком короткую строку ссылка на следующий слот не помещается
+                f.write(b'\x01')  # Флаг удаления
+            else:
+                f.write(FREE_SLOT.pack(1, free_head))
+                free_head = (position - HEADER_SIZE) // storage.row_size + 1
+            deleted += 1
+        
+        if deleted:
+            self._write_header(f, row_count - deleted, free_head)
+        return deleted
+    
+    def _pop_free_slot(self, f, free_head: int, storage: UTF32RowStorage) -> Tuple[int, int]:
+        """Позиция первого свободного слота и номер следующего за ним"""
+        position = HEADER_SIZE + (free_head - 1) * storage.row_size
+        f.seek(position)
+        _, next_free = FREE_SLOT.unpack(f.read(FREE_SLOT.size))
+        return position, next_free
+    
+    def _read_header(self, f) -> Tuple[int, int]:
+        """(количество строк, голова списка свободных слотов)"""
+        f.seek(4)
+        return HEADER_FIELDS.unpack(f.read(HEADER_FIELDS.size))
+    
+    def _write_header(self, f, row_count: int, free_head: int) -> None:
+        f.seek(4)
+        f.write(HEADER_FIELDS.pack(row_count, free_head))
+    
+    def vacuum_table(self, schema: TableSchema, storage: UTF32RowStorage,
+                     columns: Iterable[str] = ()) -> Tuple[int, List[Dict[str, Any]]]:
+        """Переписать файл таблицы, оставив только живые строки
+        
+        Строки копируются байтами во временный файл, который затем атомарно
+        заменяет старый через os.replace; список свободных слотов
+        обнуляется, а счетчик строк в заголовке становится точным.
+        Возвращает количество живых строк и сами строки со столбцами columns
+        и новыми позициями '_position' - для перестройки индексов.
+        """
+        table_name = schema.table_name
+        file_path = self._get_table_path(table_name)
+        tmp_path = file_path + '.vacuum'
+        codec = storage.get_codec(columns)
+        columns = list(columns)
+        rows = []
+        live_rows = 0
+        
+        with open(tmp_path, 'w+b') as out:
+            out.write(FILE_MAGIC[schema.storage_format])
+            out.write(HEADER_FIELDS.pack(0, 0))
+            
+            batch = []
+            for row_bytes in self._iter_row_bytes(table_name, storage):
+                batch.append(row_bytes)
+                if len(batch) == VACUUM_BATCH_ROWS:
+                    live_rows += self._write_vacuum_batch(out, storage, codec, batch, rows if columns else None)
+                    batch = []
+            if batch:
+                live_rows += self._write_vacuum_batch(out, storage, codec, batch, rows if columns else None)
+            
+            self._write_header(out, live_rows, 0)
+            out.flush()
+            os.fsync(out.fileno())
+        
+        self._release(table_name)
+        os.replace(tmp_path, file_path)
+        self._replaced(file_path)
+        return live_rows, rows
     
-    def scan_rows(self, table_name: str, storage: UTF32RowStorage):
+    def _iter_row_bytes(self, table_name: str, storage: UTF32RowStorage) -> Iterator[bytes]:
+        """Байты живых строк в порядке файла"""
+        file_path = self._get_table_path(table_name)
+        if storage.format == 'utf8':
+            yield from self.slotted.iter_row_bytes(file_path)
+            return
+        
+        row_size = storage.row_size
+        block_size = max(1, SCAN_BLOCK_SIZE // row_size) * row_size
+        with open(file_path, 'rb') as f:
+            f.seek(HEADER_SIZE)
+            while True:
+                block = f.read(block_size)
+                for offset in range(0, len(block) - row_size + 1, row_size):
+                    if not block[offset]:
+                        yield block[offset:offset + row_size]
+                if len(block) < block_size:
+                    break
+    
+    def _write_vacuum_batch(self, out, storage: UTF32RowStorage, codec, batch: List[bytes],
+                            rows: Optional[List[Dict[str, Any]]]) -> int:
+        """Дописать пачку строк в новый файл; rows получает ключи с новыми позициями"""
+        if storage.format == 'utf8':
+            positions = self.slotted.insert_rows(out, batch)
+        else:
+            start = out.seek(0, 2)
+            out.write(b''.join(batch))
+            positions = range(start, start + len(batch) * storage.row_size, storage.row_size)
+        
+        if rows is not None:
+            for row_bytes, position in zip(batch, positions):
+                row = codec.decode(row_bytes)
+                row['_position'] = position
+                rows.append(row)
+        return len(batch)
+    
+    def scan_rows(self, table_name: str, storage: UTF32RowStorage, columns: Iterable[str] = None,
+                  raw_filter: List[Tuple[int, bytes]] = None):
+        """Сканирование живых строк
+        
+        columns - столбцы, которые нужно декодировать (None - все). Байты
+        остальных столбцов пропускаются без копирования и декодирования.
+        raw_filter - пары (смещение столбца, байты значения) из
+        UTF32RowStorage.encode_filter: строки, у которых байты столбца не
+        совпадают, отбрасываются до декодирования.
+        """
         file_path = self._get_table_path(table_name)
         
         if not os.path.exists(file_path):
             return
-            
+        
+        codec = storage.get_codec(columns)
+        if storage.format == 'utf8':
+            yield from self.slotted.scan(file_path, codec)
+            return
+        
+        raw_filter = [(offset, offset + len(expected), expected) for offset, expected in raw_filter or ()]
+        if self.use_mmap:
+            yield from self._scan_mapped(table_name, storage, codec, raw_filter)
+            return
+        
+        row_size = storage.row_size
+        block_size = max(1, SCAN_BLOCK_SIZE // row_size) * row_size
         with open(file_path, 'rb') as f:
-            f.seek(16)
+            f.seek(HEADER_SIZE)
             
+            position = HEADER_SIZE
             row_index = 0
             while True:
-                position = f.tell()
-                row_data = f.read(storage.row_size)
-                
-                if not row_data or len(row_data) < storage.row_size:
+                block = f.read(block_size)
+                block_rows = len(block) // row_size
+                if block_rows == 0:
                     break
                 
-                row = storage.deserialize_row(row_data)
-                if not row.get('_deleted', False):
-                    row['_position'] = position
-                    row['_index'] = row_index
-                    yield row
+                yield from self._scan_buffer(block, 0, block_rows * row_size, position, row_index,
+                                             row_size, codec, raw_filter)
                 
-                row_index += 1
+                position += block_rows * row_size
+                row_index += block_rows
+                if len(block) < block_size:
+                    break
+    
+    def _scan_mapped(self, table_name: str, storage: UTF32RowStorage, codec: RowCodec,
+                     raw_filter: List[Tuple[int, int, bytes]]):
+        """Сканирование через mmap: строки декодируются прямо из отображения"""
+        self._check_generation(table_name)
+        file_size = os.path.getsize(self._get_table_path(table_name))
+        if table_name in self._mappings and len(self._mappings[table_name]) != file_size:
+            del self._mappings[table_name]
+        
+        mapping = self._get_mapping(table_name, file_size)
+        if mapping is None:
+            return
+        
+        row_size = storage.row_size
+        end = HEADER_SIZE + (len(mapping) - HEADER_SIZE) // row_size * row_size
+        yield from self._scan_buffer(mapping, HEADER_SIZE, end, 0, 0, row_size, codec, raw_filter)
+    
+    def _scan_buffer(self, buffer, start: int, end: int, base_position: int, first_index: int,
+                     row_size: int, codec: RowCodec, raw_filter: List[Tuple[int, int, bytes]]):
+        """Строки буфера с start по end; позиция в файле = base_position + смещение"""
+        for row_index, offset in enumerate(range(start, end, row_size), first_index):
+            # Удаленные строки пропускаются по флагу без декодирования
+            if buffer[offset]:
+                continue
+            if raw_filter and any(buffer[offset + lo:offset + hi] != expected for lo, hi, expected in raw_filter):
+                continue
+            
+            row = codec.decode(buffer, offset)
+            row['_position'] = base_position + offset
+            row['_index'] = row_index
+            yield row
+    
+    def _get_mapping(self, table_name: str, min_size: int) -> Optional[mmap.mmap]:
+        """Отображение файла таблицы не меньше min_size байт
+        
+        Если файл вырос после вставок, отображение пересоздается. Старое
+        отображение не закрывается явно: его может держать незавершенный скан.
+        """
+        self._check_generation(table_name)
+        mapping = self._mappings.get(table_name)
+        if mapping is not None and len(mapping) >= min_size:
+            return mapping
+        
+        fileno = self._get_handle(table_name).fileno()
+        if os.fstat(fileno).st_size < max(min_size, HEADER_SIZE):
+            return None
+        mapping = mmap.mmap(fileno, 0, access=mmap.ACCESS_READ)
+        
+        self._mappings[table_name] = mapping
+        return mapping
+    
+    def _get_handle(self, table_name: str):
+        """Открытый файл таблицы из пула"""
+        self._check_generation(table_name)
+        return self.file_pool.get(self._get_table_path(table_name))
+    
+    def _check_generation(self, table_name: str) -> None:
+        """Закрыть дескриптор и отображение, если файл заменил другой менеджер"""
+        file_path = self._get_table_path(table_name)
+        generation = _file_generations.get(file_path, 0)
+        if self._generations.get(file_path, 0) != generation:
+            self._release(table_name)
+            self._generations[file_path] = generation
+    
+    def _replaced(self, file_path: str) -> None:
+        """Отметить новое поколение файла; свои дескрипторы уже закрыты"""
+        generation = _file_generations.get(file_path, 0) + 1
+        _file_generations[file_path] = generation
+        self._generations[file_path] = generation
+    
+    def _release(self, table_name: str) -> None:
+        """Закрыть дескриптор и отображение перед усечением или удалением файла"""
+        self.file_pool.release(self._get_table_path(table_name))
+        mapping = self._mappings.pop(table_name, None)
+        if mapping is not None:
+            mapping.close()
+    
+    def close(self) -> None:
+        """Закрыть все отображения и открытые файлы"""
+        for table_name in list(self._mappings):
+            self._release(table_name)
+        self.file_pool.close()
     
     def get_total_rows(self, table_name: str) -> int:
-        """Получить общее количество строк в таблице"""
+        """Количество живых строк в таблице по заголовку файла"""
         file_path = self._get_table_path(table_name)
         
         if not os.path.exists(file_path):
             return 0
-            
-        with open(file_path, 'rb') as f:
-            f.seek(4)
-            row_count_bytes = f.read(8)
-            return struct.unpack('>Q', row_count_bytes)[0]
+        
+        f = self._get_handle(table_name)
+        f.seek(4)
+        row_count_bytes = f.read(8)
+        return struct.unpack('>Q', row_count_bytes)[0]
     
     def delete_table_file(self, table_name: str) -> None:
         """Удаление файла таблицы"""
+        self._release(table_name)
         file_path = self._get_table_path(table_name)
         if os.path.exists(file_path):
             os.remove(file_path)
+        self._replaced(file_path)
     
     def _get_table_path(self, table_name: str) -> str:
         return os.path.join(self.table_dir, f"{table_name}.dat")
\ No newline at end of file
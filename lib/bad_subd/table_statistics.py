@@ -0,0 +1,182 @@
+import bisect
+import heapq
+import hashlib
+import random
+import time
+from dataclasses import dataclass, asdict, field
+from typing import Any, Dict, Iterable, List
+from .conditions import Condition, Range
+from .config import bad_subd_config
+
+HASH_SPACE = 2 ** 64
+
+@dataclass
+class ColumnStatistics:
+    """Статистика колонки, собранная ANALYZE
+    
+    histogram - границы корзин равной глубины: между соседними границами
+    лежит примерно одинаковая доля строк. Первая и последняя границы -
+    точные минимум и максимум, внутренние взяты из случайной выборки строк.
+    """
+    name: str
+    distinct_count: int
+    min_value: Any = None
+    max_value: Any = None
+    histogram: List[Any] = field(default_factory=list)
+    
+    def selectivity(self, condition: Any) -> float:
+        """Оценка доли строк, удовлетворяющих условию на колонку"""
+        if not self.histogram:
+            return 0.0
+        if isinstance(condition, Range):
+            high = 1.0 if condition.high is None else self._fraction_below(condition.high, condition.include_high)
+            low = 0.0 if condition.low is None else self._fraction_below(condition.low, not condition.include_low)
+            return max(0.0, high - low)
+        if isinstance(condition, Condition):
+            return 1.0  # Для остальных условий статистика ничего не говорит
+        
+        try:
+            if condition < self.min_value or condition > self.max_value:
+                return 0.0
+        except TypeError:
+            return 0.0
+        return 1.0 / max(self.distinct_count, 1)
+    
+    def _fraction_below(self, value: Any, inclusive: bool) -> float:
+        """Доля строк со значением меньше value (не больше при inclusive)"""
+        bounds = self.histogram
+        try:
+            edge = bisect.bisect_right(bounds, value) if inclusive else bisect.bisect_left(bounds, value)
+        except TypeError:
+            return 0.0
+        if edge == 0:
+            return 0.0
+        if edge == len(bounds):
+            return 1.0
+        
+        # Внутри корзины числа распределены равномерно, для строк берем половину
+        bucket = edge - 1
+        lower, upper = bounds[bucket], bounds[bucket + 1]
+        if isinstance(value, (int, float)) and upper > lower:
+            part = (value - lower) / (upper - lower)
+        else:
+            part = 0.5
+        return (bucket + part) / (len(bounds) - 1)
+
+@dataclass
+class TableStatistics:
+    """Статистика таблицы на момент последнего ANALYZE"""
+    table_name: str
+    live_rows: int
+    analyzed_at: float
+    columns: Dict[str, ColumnStatistics] = field(default_factory=dict)
+    
+    def selectivity(self, where: Dict = None) -> float:
+        """Доля строк, подходящих под WHERE, в предположении независимости колонок"""
+        fraction = 1.0
+        for column_name, condition in (where or {}).items():
+            if column_name in self.columns:
+                fraction *= self.columns[column_name].selectivity(condition)
+        return fraction
+    
+    def estimate_rows(self, where: Dict = None) -> float:
+        return self.live_rows * self.selectivity(where)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'table_name': self.table_name,
+            'live_rows': self.live_rows,
+            'analyzed_at': self.analyzed_at,
+            'columns': [asdict(column) for column in self.columns.values()]
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TableStatistics':
+        columns = [ColumnStatistics(**column) for column in data['columns']]
+        return cls(
+            table_name=data['table_name'],
+            live_rows=data['live_rows'],
+            analyzed_at=data['analyzed_at'],
+            columns={column.name: column for column in columns}
+        )
+
+class _ColumnCollector:
+    """Минимум, максимум и оценка числа различных значений за один проход
+    
+    Число различных значений оценивается по k наименьшим 64-битным хэшам
+    (KMV): если различных значений меньше k, ответ точный, иначе это
+    (k - 1) / (доля пространства хэшей до k-го хэша). Память - O(k)
+    независимо от размера таблицы.
+    """
+    
+    def __init__(self, name: str, sketch_size: int):
+        self.name = name
+        self.sketch_size = sketch_size
+        self.min_value = None
+        self.max_value = None
+        self.sketch: List[int] = []  # Max-куча наименьших хэшей (с обратным знаком)
+        self.hashes = set()
+    
+    def add(self, value: Any) -> None:
+        if self.min_value is None or value < self.min_value:
+            self.min_value = value
+        if self.max_value is None or value > self.max_value:
+            self.max_value = value
+        
+        value_hash = int.from_bytes(hashlib.blake2b(repr(value).encode('utf-8'), digest_size=8).digest(), 'big')
+        if value_hash in self.hashes:
+            return
+        if len(self.sketch) < self.sketch_size:
+            heapq.heappush(self.sketch, -value_hash)
+            self.hashes.add(value_hash)
+        elif value_hash < -self.sketch[0]:
+            self.hashes.discard(-heapq.heapreplace(self.sketch, -value_hash))
+            self.hashes.add(value_hash)
+    
+    def distinct_count(self) -> int:
+        if len(self.sketch) < self.sketch_size:
+            return len(self.sketch)
+        return round((self.sketch_size - 1) * HASH_SPACE / (-self.sketch[0] + 1))
+
+def _equi_depth_bounds(sample: List[Any], min_value: Any, max_value: Any, buckets: int) -> List[Any]:
+    """Границы корзин равной глубины по отсортированной выборке"""
+    if not sample:
+        return []
+    buckets = min(buckets, len(sample))
+    inner = [sample[i * len(sample) // buckets] for i in range(1, buckets)]
+    return [min_value] + inner + [max_value]
+
+def collect_statistics(table_name: str, column_names: List[str], rows: Iterable[Dict[str, Any]]) -> TableStatistics:
+    """Статистика по потоку живых строк таблицы
+    
+    Строки читаются один раз: для каждой колонки обновляются минимум,
+    максимум и набросок различных значений, а строка попадает в
+    равномерную выборку (reservoir sampling) размера STATS_SAMPLE_ROWS,
+    из которой затем берутся границы гистограмм.
+    """
+    sample_size = bad_subd_config.STATS_SAMPLE_ROWS
+    collectors = [_ColumnCollector(name, bad_subd_config.STATS_DISTINCT_SKETCH) for name in column_names]
+    rng = random.Random(0)
+    sample = []
+    live_rows = 0
+    
+    for row in rows:
+        values = [row[name] for name in column_names]
+        for collector, value in zip(collectors, values):
+            collector.add(value)
+        
+        if live_rows < sample_size:
+            sample.append(values)
+        else:
+            slot = rng.randrange(live_rows + 1)
+            if slot < sample_size:
+                sample[slot] = values
+        live_rows += 1
+    
+    columns = {}
+    for column_no, collector in enumerate(collectors):
+        bounds = _equi_depth_bounds(sorted(values[column_no] for values in sample), collector.min_value,
+                                    collector.max_value, bad_subd_config.STATS_HISTOGRAM_BUCKETS)
+        columns[collector.name] = ColumnStatistics(collector.name, collector.distinct_count(),
+                                                   collector.min_value, collector.max_value, bounds)
+    return TableStatistics(table_name, live_rows, time.time(), columns)
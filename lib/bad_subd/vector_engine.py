@@ -0,0 +1,123 @@
+import os
+from typing import List, Dict, Any
+from .engine import BadSUBDEngine
+from .table_file import HEADER_SIZE
+from .conditions import Condition, Range
+
+try:
+    import numpy as np
+except ImportError:  # NumPy - необязательная зависимость
+    np = None
+
+class NumpyScanEngine:
+    """Векторизованные сканы таблиц BadSUBD через np.memmap
+    
+    Строка UTF32RowStorage имеет фиксированный размер и точно ложится на
+    структурный dtype NumPy: флаг удаления 'u1', INT - '>u8', VARCHAR(n) -
+    '<U{n}' (UTF-32LE с дополнением нулями). Поэтому файл таблицы читается
+    как массив без декодирования строк в словари, а фильтры, подсчеты и
+    проекции выполняются операциями над массивами.
+    """
+    
+    def __init__(self, engine: BadSUBDEngine):
+        if np is None:
+            raise RuntimeError("NumPy is required for NumpyScanEngine")
+        self.engine = engine
+    
+    def table_dtype(self, table_name: str) -> 'np.dtype':
+        """Структурный dtype строки таблицы"""
+        storage = self.engine._get_storage(table_name)
+        if storage.format != 'utf32':
+            raise ValueError(f"Table {table_name} does not use fixed-width UTF-32 storage")
+        
+        fields = [('_deleted', 'u1')]
+        for col in storage.columns:
+            if col.data_type == 'INT':
+                fields.append((col.name, '>u8'))
+            else:
+                fields.append((col.name, f'<U{col.size}'))
+        
+        dtype = np.dtype(fields)
+        if dtype.itemsize != storage.row_size:
+            raise ValueError(f"Table {table_name} does not map onto a fixed-width dtype")
+        return dtype
+    
+    def load(self, table_name: str) -> 'np.ndarray':
+        """Все строки файла таблицы (включая удаленные) как массив только для чтения"""
+        dtype = self.table_dtype(table_name)
+        file_path = self.engine.table_manager._get_table_path(table_name)
+        row_count = (os.path.getsize(file_path) - HEADER_SIZE) // dtype.itemsize
+        
+        if row_count <= 0:
+            return np.zeros(0, dtype=dtype)
+        return np.memmap(file_path, dtype=dtype, mode='r', offset=HEADER_SIZE, shape=(row_count,))
+    
+    def mask(self, table_name: str, rows: 'np.ndarray', where: Dict = None) -> 'np.ndarray':
+        """Булева маска живых строк, удовлетворяющих условию WHERE"""
+        storage = self.engine._get_storage(table_name)
+        result = rows['_deleted'] == 0
+        
+        for col_name, value in (where or {}).items():
+            if col_name not in storage.column_offsets:
+                if value is not None:
+                    result[:] = False
+                continue
+            if isinstance(value, Range):
+                result &= self._range_mask(rows[col_name], value)
+                continue
+            if isinstance(value, Condition):
+                result &= np.fromiter(map(value.matches, rows[col_name]), dtype=bool, count=len(rows))
+                continue
+            # Значение, которое не может храниться в столбце, не совпадет ни с одной строкой
+            if storage.encode_value(col_name, value) is None:
+                result[:] = False
+                continue
+            result &= rows[col_name] == value
+        
+        return result
+    
+    @staticmethod
+    def _range_mask(values: 'np.ndarray', condition: Range) -> 'np.ndarray':
+        """Маска значений столбца, попадающих в диапазон"""
+        result = np.ones(len(values), dtype=bool)
+        try:
+            if condition.low is not None:
+                result &= values >= condition.low if condition.include_low else values > condition.low
+            if condition.high is not None:
+                result &= values <= condition.high if condition.include_high else values < condition.high
+        except (TypeError, OverflowError):
+            # Границы несравнимого типа - как у Range.matches, строк нет
+            result[:] = False
+        return result
+    
+    def count(self, table_name: str, where: Dict = None) -> int:
+        """Количество строк, удовлетворяющих условию"""
+        rows = self.load(table_name)
+        return int(np.count_nonzero(self.mask(table_name, rows, where)))
+    
+    def select(self, table_name: str, columns: List[str] = None, where: Dict = None) -> 'np.ndarray':
+        """Выборка в виде структурного массива с нужными столбцами"""
+        rows = self.load(table_name)
+        selected = rows[self.mask(table_name, rows, where)]
+        
+        if not columns or '*' in columns:
+            columns = [name for name in rows.dtype.names if not name.startswith('_')]
+        else:
+            columns = [col for col in columns if col in rows.dtype.names]
+        return selected[columns]
+    
+    def column(self, table_name: str, column_name: str, where: Dict = None) -> 'np.ndarray':
+        """Значения одного столбца у подходящих строк"""
+        rows = self.load(table_name)
+        return np.asarray(rows[column_name][self.mask(table_name, rows, where)])
+    
+    def group_count(self, table_name: str, column_name: str, where: Dict = None) -> Dict[Any, int]:
+        """Количество строк по каждому значению столбца"""
+        values, counts = np.unique(self.column(table_name, column_name, where), return_counts=True)
+        return dict(zip(values.tolist(), counts.tolist()))
+    
+    @staticmethod
+    def to_dicts(rows: 'np.ndarray') -> List[Dict[str, Any]]:
+        """Преобразование результата в список словарей, как у BadSUBDEngine.select"""
+        names = rows.dtype.names
+        return [dict(zip(names, values)) for values in rows.tolist()]
@@ -1,10 +1,12 @@
 import os
 import sys
+import json
 import time
 import shutil
+import subprocess
 sys.path.append(os.path.dirname(os.path.dirname(__file__)))
 
-from lib.bad_subd import BadSUBD
+from lib.bad_subd import BadSUBD, BadSUBDEngine
 
 class SQLBadSUBDTester:
     """Тестер для SQLBadSUBD"""
@@ -37,7 +39,7 @@ class SQLBadSUBDTester:
             for data_dir in data_dirs:
                 if os.path.exists(data_dir):
                     for file in os.listdir(data_dir):
-                        if file.endswith(('.json', '.dat', '.idx')):
+                        if file.endswith(('.json', '.dat', '.idx', '.idxlog', '.btree', '.fts', '.ftslog', '.bloom')):
                             file_path = os.path.join(data_dir, file)
                             try:
                                 os.remove(file_path)
@@ -49,10 +51,27 @@ class SQLBadSUBDTester:
             self.db.engine.indexes.clear()
             
             print("✓ Тестовые данные полностью очищены")
-            
+        
         except Exception as e:
             print(f"⚠ Ошибка при очистке: {e}")
     
+    def run_restarted(self, script):
+        """Выполнить код в новом процессе - как после перезапуска, без открытых индексов
+        
+        Код получает BadSUBDEngine и no_scan и кладет ответ в result;
+        возвращается result, разобранный из JSON.
+        """
+        prelude = (
+            "import sys, json\n"
+            f"sys.path.append({os.path.dirname(os.path.dirname(os.path.abspath(__file__)))!r})\n"
+            "from lib.bad_subd import BadSUBDEngine\n"
+            "def no_scan(*args, **kwargs):\n"
+            "    raise AssertionError('full scan')\n"
+        )
+        completed = subprocess.run([sys.executable, "-c", prelude + script + "\nprint(json.dumps(result))"],
+                                   capture_output=True, text=True, check=True)
+        return json.loads(completed.stdout.strip().splitlines()[-1])
+    
     def table_exists(self, table_name):
         """Проверяет существует ли таблица"""
         try:
@@ -108,9 +127,9 @@ class SQLBadSUBDTester:
                     self.log_test("Проверка создания таблицы", False, "Таблица не создана")
             else:
                 self.log_test("Проверка создания таблицы", False, "Таблица не найдена")
-                
-            return True
             
+            return True
+        
         except Exception as e:
             self.log_test("CREATE TABLE test_simple", False, str(e))
             return False
@@ -146,9 +165,9 @@ class SQLBadSUBDTester:
                     self.log_test("Проверка создания таблицы", False, "Таблица не создана")
             else:
                 self.log_test("Проверка создания таблицы", False, "Таблица не найдена")
-                
-            return True
             
+            return True
+        
         except Exception as e:
             self.log_test("CREATE TABLE test_sized", False, str(e))
             return False
@@ -191,9 +210,9 @@ class SQLBadSUBDTester:
                 self.log_test("SELECT определенных колонок", True)
             else:
                 self.log_test("SELECT определенных колонок", False, "Неверный набор колонок")
-                
-            return True
             
+            return True
+        
         except Exception as e:
             self.log_test("INSERT/SELECT операции", False, str(e))
             return False
@@ -236,9 +255,9 @@ class SQLBadSUBDTester:
                 self.log_test("Проверка DELETE *", True)
             else:
                 self.log_test("Проверка DELETE *", False, f"Осталось {len(result_final)} записей")
-                
-            return True
             
+            return True
+        
         except Exception as e:
             self.log_test("DELETE операции", False, str(e))
             return False
@@ -272,7 +291,7 @@ class SQLBadSUBDTester:
                     self.log_test(f"Проверка таблицы {table}", False, str(e))
             
             return success_count == len(tables)
-            
+        
         except Exception as e:
             self.log_test("Создание основных таблиц", False, str(e))
             return False
@@ -335,9 +354,9 @@ class SQLBadSUBDTester:
                 self.log_test("SELECT связанных lessons", True)
             if len(lesson_comments) == 1:
                 self.log_test("SELECT связанных comments", True)
-                
-            return True
             
+            return True
+        
         except Exception as e:
             self.log_test("Операции с основными таблицами", False, str(e))
             return False
@@ -369,7 +388,7 @@ class SQLBadSUBDTester:
                 self.log_test("Неправильное количество значений", True, "Ошибка корректно обработана")
             
             return True
-            
+        
         except Exception as e:
             self.log_test("Обработка ошибок", False, str(e))
             return False
@@ -427,11 +446,1288 @@ class SQLBadSUBDTester:
             self.delete_table_if_exists(test_table)
             
             return True
-            
+        
         except Exception as e:
             self.log_test("Тестирование производительности", False, str(e))
             return False
     
+    def test_row_codec(self):
+        """Тестирование кодирования и декодирования строк UTF-32"""
+        print("\n=== Тестирование кодека строк ===")
+        
+        try:
+            from lib.bad_subd.storage import UTF32RowStorage, ColumnDefinition
+            storage = UTF32RowStorage([
+                ColumnDefinition("id", "INT"),
+                ColumnDefinition("a", "VARCHAR", 4),
+                ColumnDefinition("b", "VARCHAR", 3),
+                ColumnDefinition("n", "INT"),
+                ColumnDefinition("c", "VARCHAR", 2)
+            ])
+            
+            def round_trip(row, columns=None):
+                data = storage.serialize_row(row)
+                decoded = storage.get_codec(columns).decode(data) if columns else storage.deserialize_row(data)
+                del decoded["_deleted"]
+                return decoded
+            
+            # Нули внутри строки сохраняются, хвостовые неотличимы от дополнения;
+            # символ U+0100 заканчивается нулевыми байтами и не должен обрезаться
+            nuls = round_trip({"id": 1, "a": "a\x00b", "b": "Ā", "n": 2, "c": "x\x00"})
+            # Длинные строки обрезаются до размера столбца в символах, в том числе вне BMP
+            long = round_trip({"id": 2, "a": "abcdefgh", "b": "🙂🙃🙂🙃", "n": 3, "c": "\U0001F600x"})
+            projected = round_trip({"id": 2, "a": "abcdefgh", "b": "🙂🙃🙂🙃", "n": 3, "c": "😀😁😂"}, ["b", "c"])
+            strings_success = (nuls == {"id": 1, "a": "a\x00b", "b": "Ā", "n": 2, "c": "x"}
+                               and long == {"id": 2, "a": "abcd", "b": "🙂🙃🙂", "n": 3, "c": "\U0001F600x"}
+                               and projected == {"b": "🙂🙃🙂", "c": "😀😁"})
+            self.log_test("Строки с нулями, обрезка и символы вне BMP", strings_success, f"{nuls}, {long}, {projected}")
+            
+            # Испорченный символ заменяется и не сдвигает соседние столбцы группы
+            raw = bytearray(storage.serialize_row({"a": "wxyz", "b": "abc"}))
+            a_offset = storage.get_column_offset("a")
+            raw[a_offset:a_offset + 4] = (0x110000).to_bytes(4, "little")
+            corrupted = storage.deserialize_row(bytes(raw))
+            corrupted_success = corrupted["a"] == "�xyz" and corrupted["b"] == "abc"
+            self.log_test("Некорректный символ в файле", corrupted_success, f"{corrupted['a']!r}, {corrupted['b']!r}")
+            
+            # Граничные INT записываются точно; отрицательные, большие и дробные числа,
+            # как и строка с одиночным суррогатом, отклоняются
+            edges = [round_trip({"id": value})["id"] for value in (0, 1, 2**63, 2**64 - 1)]
+            invalid_rows = [{"id": -1}, {"id": 2**64}, {"id": 1.5}, {"id": 5.0}, {"id": "7"}, {"a": "\ud800"}]
+            rejected = []
+            for row in invalid_rows:
+                try:
+                    storage.serialize_row(row)
+                except ValueError:
+                    rejected.append(row)
+            int_success = edges == [0, 1, 2**63, 2**64 - 1] and rejected == invalid_rows
+            self.log_test("Граничные значения INT", int_success, f"отклонены: {rejected!r}")
+            return strings_success and corrupted_success and int_success
+        
+        except Exception as e:
+            self.log_test("Кодек строк", False, str(e))
+            return False
+    
+    def test_mmap_access_mode(self):
+        """Тестирование чтения таблиц через mmap"""
+        print("\n=== Тестирование режима mmap ===")
+        
+        try:
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_mmap")
+            engine.create_table("test_mmap", [
+                {"name": "id", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 20}
+            ])
+            engine.create_index("test_mmap", "id")
+            
+            mmap_engine = BadSUBDEngine(use_mmap=True)
+            mmap_engine.indexes["test_mmap"] = engine.indexes["test_mmap"]
+            for i in range(1, 6):
+                mmap_engine.insert("test_mmap", {"id": i, "name": f"имя {i}"})
+            
+            # Первое отображение, затем рост файла и повторное отображение
+            first_scan = mmap_engine.select("test_mmap")
+            mmap_engine.insert("test_mmap", {"id": 6, "name": "имя 6"})
+            second_scan = mmap_engine.select("test_mmap")
+            plain_scan = engine.select("test_mmap")
+            
+            success = len(first_scan) == 5 and second_scan == plain_scan and len(second_scan) == 6
+            self.log_test("Скан через mmap", success, f"строк: {len(second_scan)}")
+            
+            by_index = mmap_engine.select("test_mmap", where={"id": 6})
+            success = by_index == [{"id": 6, "name": "имя 6"}]
+            self.log_test("Чтение по индексу через mmap", success)
+            
+            mmap_engine.close()
+            self.delete_table_if_exists("test_mmap")
+            return success
+        
+        except Exception as e:
+            self.log_test("Режим mmap", False, str(e))
+            return False
+    
+    def test_file_handle_pool(self):
+        """Тестирование пула открытых файлов"""
+        print("\n=== Тестирование пула файлов ===")
+        
+        try:
+            with BadSUBDEngine() as engine:
+                engine.file_pool.max_open = 2
+                for name in ("test_pool_a", "test_pool_b", "test_pool_c"):
+                    self.delete_table_if_exists(name)
+                    engine.create_table(name, [{"name": "id", "type": "INT"}])
+                    for i in range(3):
+                        engine.insert(name, {"id": i})
+                
+                self.log_test("Ограничение пула", len(engine.file_pool) <= 2, f"открыто: {len(engine.file_pool)}")
+                
+                engine.create_index("test_pool_a", "id")
+                engine.delete("test_pool_a", {"id": 1})
+                rows = engine.select("test_pool_a", where={"id": 2})
+                success = rows == [{"id": 2}] and engine.select("test_pool_a", where={"id": 1}) == []
+                self.log_test("Чтение и удаление через пул", success)
+            
+            self.log_test("Закрытие движка", len(engine.file_pool) == 0)
+            return success and len(engine.file_pool) == 0
+        
+        except Exception as e:
+            self.log_test("Пул файлов", False, str(e))
+            return False
+    
+    def test_insert_many(self):
+        """Тестирование пакетной вставки"""
+        print("\n=== Тестирование пакетной вставки ===")
+        
+        try:
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_bulk")
+            engine.create_table("test_bulk", [
+                {"name": "id", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 20}
+            ])
+            engine.create_index("test_bulk", "id")
+            
+            rows = [{"id": i, "name": f"строка {i}"} for i in range(100)]
+            rows[10] = {"id": -1, "name": "плохая"}
+            rows[20] = {"id": 20, "name": 20}
+            result = engine.insert_many("test_bulk", rows)
+            
+            rejected = [row_number for row_number, _ in result['rejected']]
+            success = result['inserted'] == 98 and rejected == [10, 20]
+            self.log_test("Пакетная вставка", success, f"вставлено: {result['inserted']}, отклонены: {rejected}")
+            
+            found = engine.select("test_bulk", where={"id": 55})
+            total = engine.get_table_info("test_bulk")['total_rows']
+            success = success and found == [{"id": 55, "name": "строка 55"}] and total == 98
+            self.log_test("Индекс и заголовок после пакетной вставки", success, f"строк в заголовке: {total}")
+            
+            return success
+        
+        except Exception as e:
+            self.log_test("Пакетная вставка", False, str(e))
+            return False
+    
+    def test_projection_pushdown(self):
+        """Тестирование декодирования только нужных столбцов"""
+        print("\n=== Тестирование проекции при чтении ===")
+        
+        try:
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_projection")
+            engine.create_table("test_projection", [
+                {"name": "id", "type": "INT"},
+                {"name": "grp", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 10},
+                {"name": "note", "type": "VARCHAR", "size": 20}
+            ])
+            engine.insert_many("test_projection", [
+                {"id": i, "grp": i % 5, "name": f"name{i}", "note": f"note{i % 3}"} for i in range(100)])
+            
+            # Запоминаем, какие столбцы просили декодировать
+            storage = engine._get_storage("test_projection")
+            requested = []
+            get_codec = storage.get_codec
+            def spy(columns=None):
+                requested.append(None if columns is None else set(columns))
+                return get_codec(columns)
+            storage.get_codec = spy
+            
+            # Скан: условие на столбцы вне проекции все равно фильтрует строки
+            scanned = engine.select("test_projection", ["name"], {"grp": 2, "note": "note1"})
+            scan_plan = engine.last_plan.access
+            scan_columns = requested[-1]
+            expected = [{"name": f"name{i}"} for i in range(100) if i % 5 == 2 and i % 3 == 1]
+            
+            # Путь через индекс
+            engine.create_index("test_projection", "id")
+            requested.clear()
+            by_index = engine.select("test_projection", ["note"], {"id": 42, "grp": 2})
+            index_plan = engine.last_plan.access
+            index_columns = requested[-1]
+            missed = engine.select("test_projection", ["note"], {"id": 42, "grp": 3})
+            everything = engine.select("test_projection", where={"id": 7})
+            storage.get_codec = get_codec
+            
+            success = (scanned == expected and scan_plan == "scan" and scan_columns == {"name", "grp", "note"}
+                       and by_index == [{"note": "note0"}] and index_plan == "index"
+                       and index_columns == {"note", "id", "grp"} and missed == []
+                       and everything == [{"id": 7, "grp": 2, "name": "name7", "note": "note1"}])
+            self.log_test("Проекция на скане и по индексу", success,
+                          f"скан: {scan_columns}, индекс: {index_columns}, {by_index}")
+            return success
+        
+        except Exception as e:
+            self.log_test("Проекция при чтении", False, str(e))
+            return False
+    
+    def test_raw_filter(self):
+        """Тестирование сравнения условий равенства по байтам строки"""
+        print("\n=== Тестирование фильтра по байтам ===")
+        
+        try:
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_raw_filter")
+            engine.create_table("test_raw_filter", [
+                {"name": "id", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 5}
+            ])
+            engine.insert_many("test_raw_filter", [
+                {"id": 1, "name": "ab"}, {"id": 2, "name": "abc"}, {"id": 3, "name": "abcde"},
+                {"id": 5, "name": "a\x00b"}, {"id": 256, "name": "ab"}])
+            storage = engine._get_storage("test_raw_filter")
+            name_offset = storage.get_column_offset("name")
+            
+            def ids(where):
+                return [row["id"] for row in engine.select("test_raw_filter", ["id"], where)]
+            
+            # Общий префикс байтов не совпадение: значение сравнивается с дополнением нулями
+            padded = "ab\x00\x00\x00".encode("utf-32-le")
+            prefix_success = (ids({"name": "ab"}) == [1, 256] and ids({"name": "abc"}) == [2]
+                              and ids({"name": "a"}) == [] and ids({"name": "a\x00b"}) == [5]
+                              and storage.encode_filter({"name": "ab"}) == [(name_offset, padded)])
+            # Строка длиннее столбца и с хвостовым нулем храниться не может
+            long_success = (storage.encode_filter({"name": "abcdef"}) is None and ids({"name": "abcdef"}) == []
+                            and storage.encode_filter({"name": "ab\x00"}) is None)
+            # INT: целое число в виде float совпадает, дробное и строка - нет; 1 и 256 различаются байтами
+            int_success = (ids({"id": 5.0}) == [5] and storage.encode_filter({"id": 5.5}) is None
+                           and ids({"id": 5.5}) == [] and storage.encode_filter({"id": "5"}) is None
+                           and storage.encode_filter({"id": -1}) is None
+                           and ids({"id": 1}) == [1] and ids({"id": 256, "name": "ab"}) == [256])
+            # Столбец не из схемы в фильтр не попадает, а условие на него не выполняется
+            id_offset = storage.get_column_offset("id")
+            unknown_success = (storage.encode_filter({"missing": 1, "id": 2}) == [(id_offset, (2).to_bytes(8, "big"))]
+                               and ids({"missing": 1}) == [])
+            
+            success = prefix_success and long_success and int_success and unknown_success
+            self.log_test("Фильтр по байтам", success,
+                          f"префикс: {prefix_success}, длина: {long_success}, INT: {int_success}, "
+                          f"неизвестный столбец: {unknown_success}")
+            return success
+        
+        except Exception as e:
+            self.log_test("Фильтр по байтам", False, str(e))
+            return False
+    
+    def test_numpy_scan_engine(self):
+        """Тестирование векторизованного скана через NumPy"""
+        print("\n=== Тестирование NumPy-скана ===")
+        
+        try:
+            from lib.bad_subd.vector_engine import NumpyScanEngine, np
+            if np is None:
+                self.log_test("NumPy-скан", True, "NumPy не установлен, тест пропущен")
+                return True
+            
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_vector")
+            engine.create_table("test_vector", [
+                {"name": "id", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 10},
+                {"name": "group_id", "type": "INT"}
+            ])
+            engine.insert_many("test_vector", [{"id": i, "name": f"имя {i % 3}", "group_id": i % 4} for i in range(40)])
+            engine.delete("test_vector", {"id": 5})
+            
+            vector = NumpyScanEngine(engine)
+            where = {"name": "имя 1", "group_id": 2}
+            success = (vector.count("test_vector") == 39
+                       and vector.to_dicts(vector.select("test_vector", ["id"], where)) == engine.select("test_vector", ["id"], where)
+                       and vector.group_count("test_vector", "group_id") == {0: 10, 1: 9, 2: 10, 3: 10})
+            self.log_test("NumPy-скан совпадает с обычным", success)
+            return success
+        
+        except Exception as e:
+            self.log_test("NumPy-скан", False, str(e))
+            return False
+    
+    def test_utf8_storage_format(self):
+        """Тестирование формата хранения UTF-8 со страницами"""
+        print("\n=== Тестирование формата utf8 ===")
+        
+        try:
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_utf8")
+            engine.create_table("test_utf8", [
+                {"name": "id", "type": "INT"},
+                {"name": "login", "type": "VARCHAR", "size": 45},
+                {"name": "text", "type": "VARCHAR", "size": 255}
+            ], storage_format="utf8")
+            engine.create_index("test_utf8", "id")
+            
+            # Строк больше, чем помещается в одну страницу
+            rows = [{"id": i, "login": f"пользователь_{i}", "text": "текст " * (i % 40)} for i in range(300)]
+            result = engine.insert_many("test_utf8", rows)
+            engine.insert("test_utf8", {"id": 300, "login": "last", "text": ""})
+            
+            info = engine.get_table_info("test_utf8")
+            success = (result['inserted'] == 300 and info['storage_format'] == 'utf8'
+                       and engine.select("test_utf8", where={"id": 150}) == [rows[150]]
+                       and engine.select("test_utf8", ["id"], where={"login": "last"}) == [{"id": 300}])
+            self.log_test("Вставка и выборка utf8", success, f"размер файла: {info['file_size']} байт")
+            
+            deleted = engine.delete("test_utf8", {"text": ""})
+            remaining = engine.select("test_utf8")
+            success = success and deleted == 9 and len(remaining) == 292
+            self.log_test("Удаление utf8", success, f"удалено: {deleted}")
+            
+            # Формат задается и через SQL: опцией таблицы и в create_table SQL-движка
+            self.delete_table_if_exists("test_utf8_sql")
+            self.delete_table_if_exists("test_utf8_sql_api")
+            self.db.execute("CREATE TABLE test_utf8_sql (id INT PRIMARY KEY, name VARCHAR(20)) STORAGE = utf8")
+            self.db.engine.create_table("test_utf8_sql_api", [{"name": "id", "type": "INT"}], storage_format="utf8")
+            self.db.execute("INSERT INTO test_utf8_sql (id, name) VALUES (1, 'строка')")
+            try:
+                self.db.execute("CREATE TABLE test_utf8_sql_bad (id INT) STORAGE = utf16")
+                unknown_rejected = False
+            except ValueError:
+                unknown_rejected = not engine.schema_manager.schema_exists("test_utf8_sql_bad")
+            sql_success = (engine.get_table_info("test_utf8_sql")["storage_format"] == "utf8"
+                           and engine.get_table_info("test_utf8_sql_api")["storage_format"] == "utf8"
+                           and self.db.execute("SELECT name FROM test_utf8_sql WHERE id = 1") == [{"name": "строка"}]
+                           and unknown_rejected)
+            self.log_test("Формат utf8 через SQL", sql_success)
+            return success and sql_success
+        
+        except Exception as e:
+            self.log_test("Формат utf8", False, str(e))
+            return False
+    
+    def test_free_slot_reuse(self):
+        """Тестирование повторного использования удаленных слотов"""
+        print("\n=== Тестирование списка свободных слотов ===")
+        
+        try:
+            engine = self.db.engine.engine
+            success = True
+            for storage_format in ("utf32", "utf8"):
+                table_name = f"test_free_{storage_format}"
+                self.delete_table_if_exists(table_name)
+                engine.create_table(table_name, [
+                    {"name": "id", "type": "INT"},
+                    {"name": "name", "type": "VARCHAR", "size": 20}
+                ], storage_format=storage_format)
+                engine.create_index(table_name, "id")
+                engine.insert_many(table_name, [{"id": i, "name": f"строка_{i}"} for i in range(200)])
+                size_before = engine.get_table_info(table_name)['file_size']
+                
+                # Несколько раундов удаления и вставки не должны увеличивать файл
+                next_id = 200
+                for round_no in range(5):
+                    for i in range(round_no, 200 + round_no * 50, 4):
+                        engine.delete(table_name, {"id": i})
+                    new_rows = [{"id": next_id + i, "name": f"новая_{i}"} for i in range(50)]
+                    engine.insert_many(table_name, new_rows[:25])
+                    for row in new_rows[25:]:
+                        engine.insert(table_name, row)
+                    next_id += 50
+                
+                rows = engine.select(table_name)
+                ids = [row['id'] for row in rows]
+                size_after = engine.get_table_info(table_name)['file_size']
+                format_success = (size_after == size_before and len(ids) == len(set(ids))
+                                  and engine.select(table_name, where={"id": next_id - 1})
+                                  == [{"id": next_id - 1, "name": "новая_49"}])
+                self.log_test(f"Повторное использование слотов {storage_format}", format_success,
+                              f"строк: {len(rows)}, размер: {size_before} -> {size_after} байт")
+                success = success and format_success
+            return success
+        
+        except Exception as e:
+            self.log_test("Список свободных слотов", False, str(e))
+            return False
+    
+    def test_vacuum(self):
+        """Тестирование сжатия таблицы командой VACUUM"""
+        print("\n=== Тестирование VACUUM ===")
+        
+        try:
+            engine = self.db.engine.engine
+            success = True
+            for storage_format in ("utf32", "utf8"):
+                table_name = f"test_vacuum_{storage_format}"
+                self.delete_table_if_exists(table_name)
+                engine.create_table(table_name, [
+                    {"name": "id", "type": "INT"},
+                    {"name": "group_id", "type": "INT"},
+                    {"name": "name", "type": "VARCHAR", "size": 30}
+                ], storage_format=storage_format)
+                engine.create_index(table_name, "id")
+                engine.insert_many(table_name, [{"id": i, "group_id": i % 3, "name": f"запись_{i}"}
+                                                for i in range(600)])
+                engine.delete(table_name, {"group_id": 1})
+                
+                if storage_format == "utf32":
+                    report = self.db.execute(f"VACUUM {table_name}")
+                else:
+                    report = engine.vacuum(table_name)
+                info = engine.get_table_info(table_name)
+                format_success = (report['live_rows'] == 400 and report['bytes_reclaimed'] > 0
+                                  and info['total_rows'] == 400
+                                  and info['file_size'] == report['bytes_after']
+                                  and len(engine.select(table_name)) == 400
+                                  and engine.select(table_name, ["name"], {"id": 599}) == [{"name": "запись_599"}]
+                                  and engine.select(table_name, where={"id": 598}) == [])
+                self.log_test(f"VACUUM {storage_format}", format_success,
+                              f"освобождено: {report['bytes_reclaimed']} байт "
+                              f"за {report['elapsed_seconds']:.4f} с")
+                success = success and format_success
+            return success
+        
+        except Exception as e:
+            self.log_test("VACUUM", False, str(e))
+            return False
+    
+    def test_index_log(self):
+        """Тестирование журнала изменений индекса"""
+        print("\n=== Тестирование журнала индекса ===")
+        
+        try:
+            from lib.bad_subd.index import SimpleHashIndex, LOG_RECORD
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_index_log")
+            engine.create_table("test_index_log", [
+                {"name": "id", "type": "INT"},
+                {"name": "value", "type": "INT"}
+            ])
+            engine.create_index("test_index_log", "id")
+            index = engine.indexes["test_index_log"]["id"]
+            index.checkpoint()
+            base_size = os.path.getsize(index.filename)
+            
+            # Каждая вставка и удаление дописывают одну запись в журнал, основной файл не меняется
+            for i in range(100):
+                engine.insert("test_index_log", {"id": i, "value": i * 10})
+            engine.delete("test_index_log", {"id": 7})
+            success = (os.path.getsize(index.filename) == base_size
+                       and os.path.getsize(index.log_filename) == 101 * LOG_RECORD.size)
+            self.log_test("Запись изменений в журнал", success,
+                          f"журнал: {os.path.getsize(index.log_filename)} байт")
+            
+            # Новый объект индекса восстанавливает состояние из файла и журнала
+            reloaded = SimpleHashIndex("test_index_log", "id")
+            replay_success = (reloaded.find(50) == index.find(50) and reloaded.find(7) == []
+                              and len(reloaded.find(99)) == 1)
+            index.checkpoint()
+            reloaded = SimpleHashIndex("test_index_log", "id")
+            replay_success = (replay_success and os.path.getsize(index.log_filename) == 0
+                              and reloaded.find(99) == index.find(99) and reloaded.find(7) == [])
+            self.log_test("Восстановление индекса из журнала", replay_success)
+            return success and replay_success
+        
+        except Exception as e:
+            self.log_test("Журнал индекса", False, str(e))
+            return False
+    
+    def test_btree_index(self):
+        """Тестирование B+дерева и диапазонных условий"""
+        print("\n=== Тестирование B+дерева ===")
+        
+        try:
+            from lib.bad_subd import Range
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_btree")
+            engine.create_table("test_btree", [
+                {"name": "id", "type": "INT"},
+                {"name": "value", "type": "INT"}
+            ])
+            # Вставка вразнобой: индекс должен вернуть строки в порядке ключей
+            ids = [(i * 7919) % 2000 for i in range(2000)]
+            engine.insert_many("test_btree", [{"id": i, "value": i % 10} for i in ids[:1500]])
+            engine.create_index("test_btree", "id", kind="btree")
+            for i in ids[1500:1600]:
+                engine.insert("test_btree", {"id": i, "value": i % 10})
+            engine.insert_many("test_btree", [{"id": i, "value": i % 10} for i in ids[1600:]])
+            
+            between = engine.select("test_btree", ["id"], {"id": Range(100, 120)})
+            below = self.db.execute("SELECT id FROM test_btree WHERE id < 5")
+            window = self.db.execute("SELECT id, value FROM test_btree WHERE id > 1990 AND id <= 1995 AND value = 3")
+            sql_between = self.db.execute("SELECT id FROM test_btree WHERE id BETWEEN 10 AND 12")
+            success = (between == [{"id": i} for i in range(100, 121)]
+                       and below == [{"id": i} for i in range(5)]
+                       and window == [{"id": 1993, "value": 3}]
+                       and sql_between == [{"id": 10}, {"id": 11}, {"id": 12}]
+                       and engine.select("test_btree", where={"id": 777}) == [{"id": 777, "value": 7}])
+            self.log_test("Диапазонные запросы по B+дереву", success, f"BETWEEN 100 AND 120: {len(between)} строк")
+            
+            engine.delete("test_btree", {"id": Range(low=1000)})
+            after_delete = engine.select("test_btree", ["id"], {"id": Range(low=990)})
+            delete_success = after_delete == [{"id": i} for i in range(990, 1000)]
+            self.log_test("Удаление по диапазону", delete_success, f"осталось: {len(after_delete)}")
+            
+            # Границу другого типа дерево не сравнивает: условие проверяется сканом
+            mistyped = self.db.execute("SELECT * FROM test_btree WHERE id > 'abc'")
+            mistyped_deleted = self.db.execute("DELETE FROM test_btree WHERE id < 'x'")
+            mistyped_success = (mistyped == [] and mistyped_deleted == 0
+                                and engine.explain("test_btree", {"id": Range(high="x")}).access == "scan")
+            self.log_test("Граница диапазона другого типа", mistyped_success)
+            
+            # Равенство и диапазон одного столбца объединяются независимо от порядка
+            parse = self.db.engine.parser._parse_where
+            combined = [self.db.execute("SELECT id FROM test_btree WHERE id = 5 AND id > 10"),
+                        self.db.execute("SELECT id FROM test_btree WHERE id > 10 AND id = 5"),
+                        self.db.execute("SELECT id FROM test_btree WHERE id = 15 AND id > 10"),
+                        self.db.execute("SELECT id FROM test_btree WHERE id > 10 AND id = 15"),
+                        self.db.execute("SELECT id FROM test_btree WHERE id = 5 AND id = 6")]
+            combine_success = (combined == [[], [], [{"id": 15}], [{"id": 15}], []]
+                               and parse("id = 15 AND id > 10") == parse("id > 10 AND id = 15") == {"id": 15}
+                               and parse("id = 5 AND id > 10") == parse("id > 10 AND id = 5")
+                               and parse("id = 5 AND id = 5") == {"id": 5})
+            self.log_test("Равенство и диапазон одного столбца", combine_success, f"строк: {[len(rows) for rows in combined]}")
+            return success and delete_success and mistyped_success and combine_success
+        
+        except Exception as e:
+            self.log_test("B+дерево", False, str(e))
+            return False
+    
+    def test_varchar_index(self):
+        """Тестирование хэш-индекса на строковой колонке"""
+        print("\n=== Тестирование индекса VARCHAR ===")
+        
+        try:
+            from lib.bad_subd.index import SimpleHashIndex
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_str_index")
+            engine.create_table("test_str_index", [
+                {"name": "id", "type": "INT"},
+                {"name": "login", "type": "VARCHAR", "size": 10}
+            ])
+            engine.insert_many("test_str_index", [{"id": i, "login": f"user_{i}"} for i in range(300)])
+            engine.create_index("test_str_index", "login")
+            engine.insert("test_str_index", {"id": 300, "login": "очень_длинный_логин"})
+            index = engine.indexes["test_str_index"]["login"]
+            login_column = engine.schema_manager.load_schema("test_str_index").columns[1]
+            reloaded = SimpleHashIndex("test_str_index", "login", column=login_column)
+            
+            success = (len(index.find("user_42")) == 1
+                       and engine.select("test_str_index", ["id"], {"login": "user_42"}) == [{"id": 42}]
+                       and engine.select("test_str_index", ["id"], {"login": "очень_длин"}) == [{"id": 300}]
+                       and engine.select("test_str_index", where={"login": "нет_такого"}) == []
+                       and reloaded.find("user_7") == index.find("user_7"))
+            self.log_test("Поиск по строковому индексу", success)
+            
+            # Коллизия хэша: чужая позиция под ключом отсеивается проверкой значения
+            index.insert("user_1", index.find("user_2")[0])
+            collision_success = engine.select("test_str_index", ["id"], {"login": "user_1"}) == [{"id": 1}]
+            engine.delete("test_str_index", {"login": "user_1"})
+            collision_success = (collision_success and index.find("user_1") == [index.find("user_2")[0]]
+                                 and engine.select("test_str_index", ["id"], {"login": "user_1"}) == [])
+            self.log_test("Обработка коллизий хэша", collision_success)
+            return success and collision_success
+        
+        except Exception as e:
+            self.log_test("Индекс VARCHAR", False, str(e))
+            return False
+    
+    def test_composite_index(self):
+        """Тестирование составного индекса"""
+        print("\n=== Тестирование составного индекса ===")
+        
+        try:
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_composite")
+            engine.create_table("test_composite", [
+                {"name": "id", "type": "INT"},
+                {"name": "lesson_id", "type": "INT"},
+                {"name": "date", "type": "VARCHAR", "size": 15},
+                {"name": "text", "type": "VARCHAR", "size": 50}
+            ])
+            rows = [{"id": i, "lesson_id": i % 20, "date": f"2024-01-{i % 7 + 1:02d}", "text": f"комментарий {i}"}
+                    for i in range(700)]
+            engine.insert_many("test_composite", rows[:600])
+            engine.create_index("test_composite", ["lesson_id", "date"])
+            engine.insert_many("test_composite", rows[600:])
+            index = engine.indexes["test_composite"]["lesson_id+date"]
+            
+            expected_pair = [row["id"] for row in rows if row["lesson_id"] == 3 and row["date"] == "2024-01-04"]
+            expected_lesson = [row["id"] for row in rows if row["lesson_id"] == 3]
+            by_pair = engine.select("test_composite", ["id"], {"lesson_id": 3, "date": "2024-01-04"})
+            by_lesson = engine.select("test_composite", ["id"], {"lesson_id": 3})
+            success = (len(index.find((3, "2024-01-04"))) == len(expected_pair)
+                       and sorted(row["id"] for row in by_pair) == expected_pair
+                       and sorted(row["id"] for row in by_lesson) == expected_lesson
+                       and engine.select("test_composite", ["id"], {"date": "2024-01-04", "lesson_id": 3, "id": 3})
+                       == [{"id": 3}])
+            self.log_test("Поиск по ведущим колонкам", success, f"(lesson_id, date): {len(by_pair)} строк")
+            
+            engine.delete("test_composite", {"lesson_id": 3, "date": "2024-01-04"})
+            delete_success = (index.find((3, "2024-01-04")) == []
+                              and len(index.find((3,))) == len(expected_lesson) - len(expected_pair))
+            self.log_test("Удаление из составного индекса", delete_success)
+            return success and delete_success
+        
+        except Exception as e:
+            self.log_test("Составной индекс", False, str(e))
+            return False
+    
+    def test_mapped_index(self):
+        """Тестирование отображаемого в память файла хэш-индекса"""
+        print("\n=== Тестирование отображаемого индекса ===")
+        
+        try:
+            from lib.bad_subd.index import SimpleHashIndex, INDEX_HEADER
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_mapped_index")
+            engine.create_table("test_mapped_index", [
+                {"name": "id", "type": "INT"},
+                {"name": "value", "type": "INT"}
+            ])
+            engine.insert_many("test_mapped_index", [{"id": i, "value": i % 50} for i in range(1000)])
+            engine.create_index("test_mapped_index", "value")
+            index = engine.indexes["test_mapped_index"]["value"]
+            index.checkpoint()
+            
+            # Файл - заголовок и два массива по 8 байт на запись; открытие не строит словарь в памяти
+            reloaded = SimpleHashIndex("test_mapped_index", "value")
+            success = (reloaded.base_entries == 1000 and reloaded.base_keys == 50
+                       and os.path.getsize(reloaded.filename) == INDEX_HEADER.size + 1000 * 16
+                       and not reloaded._inserted and len(reloaded.find(7)) == 20
+                       and reloaded.find(50) == [])
+            self.log_test("Двоичный поиск по файлу индекса", success,
+                          f"записей: {reloaded.base_entries}, ключей: {reloaded.base_keys}")
+            
+            # Изменения из журнала накладываются на основной файл, слияние их сохраняет
+            engine.delete("test_mapped_index", {"id": 7})
+            engine.insert("test_mapped_index", {"id": 1000, "value": 7})
+            engine.insert("test_mapped_index", {"id": 1001, "value": 50})
+            delta_success = len(index.find(7)) == 20 and len(index.find(50)) == 1
+            index.checkpoint()
+            reloaded = SimpleHashIndex("test_mapped_index", "value")
+            delta_success = (delta_success and reloaded.base_entries == 1001 and reloaded.base_keys == 51
+                             and sorted(reloaded.find(7)) == sorted(index.find(7))
+                             and len(engine.select("test_mapped_index", ["id"], {"value": 7})) == 20)
+            self.log_test("Слияние журнала с файлом индекса", delta_success)
+            return success and delta_success
+        
+        except Exception as e:
+            self.log_test("Отображаемый индекс", False, str(e))
+            return False
+    
+    def test_index_bulk_build(self):
+        """Тестирование построения индекса по существующим данным"""
+        print("\n=== Тестирование построения индекса ===")
+        
+        try:
+            from lib.bad_subd.config import bad_subd_config
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_index_build")
+            engine.create_table("test_index_build", [
+                {"name": "id", "type": "INT"},
+                {"name": "value", "type": "INT"}
+            ])
+            engine.insert_many("test_index_build", [{"id": i, "value": i % 30} for i in range(1000)])
+            
+            # Маленькие серии заставляют построение пройти через внешнюю сортировку
+            run_entries = bad_subd_config.INDEX_BUILD_RUN_ENTRIES
+            bad_subd_config.INDEX_BUILD_RUN_ENTRIES = 64
+            try:
+                engine.create_index("test_index_build", "value")
+                # Повторное создание не должно дублировать позиции из уже существующего файла
+                engine.create_index("test_index_build", "value")
+            finally:
+                bad_subd_config.INDEX_BUILD_RUN_ENTRIES = run_entries
+            
+            index = engine.indexes["test_index_build"]["value"]
+            success = (index.base_entries == 1000 and index.base_keys == 30
+                       and os.path.getsize(index.log_filename) == 0
+                       and len(index.find(7)) == 34
+                       and sorted(row["id"] for row in engine.select("test_index_build", ["id"], {"value": 29}))
+                       == list(range(29, 1000, 30)))
+            self.log_test("Построение индекса одним проходом", success,
+                          f"записей: {index.base_entries}, ключей: {index.base_keys}")
+            return success
+        
+        except Exception as e:
+            self.log_test("Построение индекса", False, str(e))
+            return False
+    
+    def test_index_catalog(self):
+        """Тестирование каталога индексов после перезапуска движка"""
+        print("\n=== Тестирование каталога индексов ===")
+        
+        try:
+            from lib.bad_subd import BadSUBDEngine
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_index_catalog")
+            engine.create_table("test_index_catalog", [
+                {"name": "id", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 20}
+            ])
+            engine.insert_many("test_index_catalog", [{"id": i, "name": f"name{i % 10}"} for i in range(200)])
+            engine.create_index("test_index_catalog", "id", kind="btree")
+            engine.create_index("test_index_catalog", ["name", "id"])
+            
+            schema = engine.schema_manager.load_schema("test_index_catalog")
+            success = schema.indexes == [{"columns": ["id"], "kind": "btree"},
+                                         {"columns": ["name", "id"], "kind": "hash"}]
+            self.log_test("Индексы записаны в схему", success, str(schema.indexes))
+            
+            # Новый движок открывает индексы при первом обращении к таблице и не сканирует таблицу
+            result = self.run_restarted(
+                "restarted = BadSUBDEngine()\n"
+                "restarted.table_manager.scan_rows = no_scan\n"
+                "lazy = 'test_index_catalog' not in restarted.indexes\n"
+                "rows = restarted.select('test_index_catalog', ['id'], {'name': 'name3', 'id': 13})\n"
+                "indexes = restarted.indexes['test_index_catalog']\n"
+                "result = [lazy, rows, sorted(indexes), indexes['id'].kind]\n"
+            )
+            restart_success = result == [True, [{"id": 13}], ["id", "name+id"], "btree"]
+            self.log_test("Индексы после перезапуска движка", restart_success, str(result))
+            return success and restart_success
+        
+        except Exception as e:
+            self.log_test("Каталог индексов", False, str(e))
+            return False
+    
+    def test_unique_constraints(self):
+        """Тестирование PRIMARY KEY и UNIQUE"""
+        print("\n=== Тестирование ограничений уникальности ===")
+        
+        try:
+            from lib.bad_subd import BadSUBDEngine
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_unique")
+            self.db.execute("CREATE TABLE test_unique (id INT PRIMARY KEY, login VARCHAR(10), name VARCHAR(20), "
+                            "UNIQUE (login))")
+            schema = engine.schema_manager.load_schema("test_unique")
+            indexes = engine.indexes["test_unique"]
+            schema_success = (schema.primary_key == "id" and indexes["id"].unique and indexes["id"].primary_key
+                              and indexes["login"].unique and not indexes["login"].primary_key)
+            self.log_test("Ограничения из CREATE TABLE", schema_success, str(schema.indexes))
+            
+            first = self.db.execute("INSERT INTO test_unique VALUES (1, 'alice', 'Alice')")
+            duplicate_id = self.db.execute("INSERT INTO test_unique VALUES (1, 'bob', 'Bob')")
+            # Строка обрезается до VARCHAR(10), уникальность проверяется по записанному значению
+            engine.insert("test_unique", {"id": 2, "login": "alice_long"})
+            duplicate_login = engine.insert("test_unique", {"id": 7, "login": "alice_long_login"})
+            missing_key = engine.insert("test_unique", {"login": "carol"})
+            batch = engine.insert_many("test_unique", [
+                {"id": 3, "login": "dave"},
+                {"id": 3, "login": "erin"},
+                {"id": 4, "login": "bob"},
+                {"id": 5, "login": "bob"},
+                {"id": 6, "login": "alice"}
+            ])
+            insert_success = (first and not duplicate_id and not duplicate_login and not missing_key
+                              and batch["inserted"] == 2 and [n for n, _ in batch["rejected"]] == [1, 3, 4]
+                              and len(engine.select("test_unique")) == 4)
+            self.log_test("Отклонение дубликатов", insert_success, f"пакет: {batch}")
+            
+            # Уникальный поиск заканчивается на первой строке, ограничения сохраняются после перезапуска
+            restarted = BadSUBDEngine()
+            lookup = restarted.select("test_unique", ["id"], {"name": "", "login": "bob"})
+            restart_success = (lookup == [{"id": 4}] and restarted._is_unique_lookup("test_unique", {"id": 3})
+                               and not restarted.insert("test_unique", {"id": 4, "login": "frank"}))
+            restarted.close()
+            self.log_test("Уникальный поиск и перезапуск", restart_success)
+            
+            # Другой индекс на уникальной колонке не снимает ограничение
+            engine.create_index("test_unique", "id", kind="btree")
+            try:
+                engine.create_index("test_unique", "login", kind="bloom")
+                bloom_rejected = False
+            except ValueError:
+                bloom_rejected = True
+            replace_success = (engine.indexes["test_unique"]["id"].kind == "btree"
+                               and engine.indexes["test_unique"]["id"].unique
+                               and not engine.insert("test_unique", {"id": 1, "login": "zed"})
+                               and bloom_rejected and engine.indexes["test_unique"]["login"].kind == "hash"
+                               and {"columns": ["id"], "kind": "btree", "unique": True}
+                               in engine.schema_manager.load_schema("test_unique").indexes)
+            self.log_test("Замена уникального индекса", replace_success)
+            
+            # Строка без колонки записывается со значением '' и занимает его
+            without_login = engine.insert("test_unique", {"id": 10})
+            second_without = engine.insert("test_unique", {"id": 11})
+            empty_login = engine.insert("test_unique", {"id": 12, "login": ""})
+            default_success = (without_login and not second_without and not empty_login
+                               and engine.select("test_unique", ["id"], {"login": ""}) == [{"id": 10}])
+            self.log_test("Уникальность значения по умолчанию", default_success)
+            
+            # Строка, которая не записалась, не занимает уникальное значение
+            invalid_first = engine.insert_many("test_unique", [{"id": 20, "login": 5}, {"id": 20, "login": "gina"}])
+            invalid_success = (invalid_first["inserted"] == 1 and [n for n, _ in invalid_first["rejected"]] == [0]
+                               and engine.select("test_unique", ["login"], {"id": 20}) == [{"login": "gina"}])
+            self.log_test("Дубликат после некорректной строки", invalid_success, str(invalid_first))
+            return (schema_success and insert_success and restart_success and replace_success and default_success
+                    and invalid_success)
+        
+        except Exception as e:
+            self.log_test("Ограничения уникальности", False, str(e))
+            return False
+    
+    def test_fulltext_index(self):
+        """Тестирование полнотекстового индекса и условия MATCH"""
+        print("\n=== Тестирование полнотекстового индекса ===")
+        
+        try:
+            from lib.bad_subd import Match
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_fulltext")
+            engine.create_table("test_fulltext", [
+                {"name": "id", "type": "INT"},
+                {"name": "text", "type": "VARCHAR", "size": 100}
+            ])
+            subjects = ["математике", "физике", "истории"]
+            topics = ["алгебра и геометрия", "механика", "древний Рим"]
+            rows = [{"id": i, "text": f"Занятие по {subjects[i % 3]}. Тема: {topics[i % 3]}. Номер {i}"}
+                    for i in range(300)]
+            engine.insert_many("test_fulltext", rows[:200])
+            engine.create_index("test_fulltext", "text", kind="fulltext")
+            engine.insert_many("test_fulltext", rows[200:])
+            
+            def expected(*words):
+                return [row["id"] for row in rows if Match(" ".join(words)).matches(row["text"])]
+            
+            index = engine.indexes["test_fulltext"]["text"]
+            single = self.db.execute("SELECT id FROM test_fulltext WHERE text MATCH 'Математике'")
+            multi = engine.select("test_fulltext", ["id"], {"text": Match("геометрия & номер 30")})
+            success = (sorted(row["id"] for row in single) == expected("математике")
+                       and [row["id"] for row in multi] == [30]
+                       and len(index.find("алгебра геометрия")) == 100
+                       and index.find("алгебра механика") == [])
+            self.log_test("Поиск одного и нескольких слов", success, f"'математике': {len(single)} строк")
+            
+            # Индекс поддерживается при удалении и вставке
+            engine.delete("test_fulltext", {"id": 30})
+            engine.insert("test_fulltext", {"id": 300, "text": "Новое занятие по астрономии"})
+            maintain_success = (engine.select("test_fulltext", ["id"], {"text": Match("геометрия номер 30")}) == []
+                                and engine.select("test_fulltext", ["id"], {"text": Match("астрономии")})
+                                == [{"id": 300}]
+                                and len(index.find("математике")) == 99)
+            self.log_test("Обновление полнотекстового индекса", maintain_success)
+            return success and maintain_success
+        
+        except Exception as e:
+            self.log_test("Полнотекстовый индекс", False, str(e))
+            return False
+    
+    def test_bloom_filter(self):
+        """Тестирование фильтра Блума для неиндексированной колонки"""
+        print("\n=== Тестирование фильтра Блума ===")
+        
+        try:
+            from lib.bad_subd import BadSUBDEngine
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_bloom")
+            engine.create_table("test_bloom", [
+                {"name": "id", "type": "INT"},
+                {"name": "lesson_id", "type": "INT"},
+                {"name": "login", "type": "VARCHAR", "size": 10}
+            ])
+            engine.insert_many("test_bloom", [{"id": i, "lesson_id": i * 2, "login": f"user{i}"} for i in range(500)])
+            engine.create_index("test_bloom", "lesson_id", kind="bloom")
+            engine.create_index("test_bloom", "login", kind="bloom")
+            engine.insert("test_bloom", {"id": 500, "lesson_id": 1001, "login": "late"})
+            bloom = engine.indexes["test_bloom"]["lesson_id"]
+            
+            # Все записанные значения фильтр пропускает, отсутствующие почти всегда отсекает
+            present = all(bloom.might_contain(i * 2) for i in range(500)) and bloom.might_contain(1001)
+            false_positives = sum(bloom.might_contain(i * 2 + 1) for i in range(500))
+            success = (present and false_positives < 25
+                       and engine.select("test_bloom", ["id"], {"lesson_id": 1001}) == [{"id": 500}]
+                       and engine.select("test_bloom", ["id"], {"login": "user7"}) == [{"id": 7}])
+            self.log_test("Фильтр пропускает существующие значения", success,
+                          f"ложных срабатываний: {false_positives} из 500")
+            
+            # Отсутствующий ключ отсекается без сканирования, в том числе после перезапуска
+            missing = next(i * 2 + 1 for i in range(500) if not bloom.might_contain(i * 2 + 1))
+            skip_success = self.run_restarted(
+                "restarted = BadSUBDEngine()\n"
+                "restarted.table_manager.scan_rows = no_scan\n"
+                f"result = [restarted.select('test_bloom', ['id'], {{'lesson_id': {missing}}}),\n"
+                f"          restarted.delete('test_bloom', {{'lesson_id': {missing}}})]\n"
+            ) == [[], 0]
+            
+            # VACUUM перестраивает фильтр без удаленных значений
+            engine.delete("test_bloom", {"lesson_id": 1001})
+            engine.vacuum("test_bloom")
+            skip_success = skip_success and not engine.indexes["test_bloom"]["lesson_id"].might_contain(1001)
+            self.log_test("Отсечение отсутствующих ключей", skip_success)
+            
+            # Фильтр не отсекает значения, которые есть в таблице: значение по
+            # умолчанию строки без колонки и целое число, заданное как float
+            engine.insert("test_bloom", {"id": 600})
+            no_false_negatives = (engine.select("test_bloom", ["id"], {"lesson_id": 0, "login": ""}) == [{"id": 600}]
+                                  and engine.select("test_bloom", ["id"], {"lesson_id": 10.0}) == [{"id": 5}]
+                                  and engine.explain("test_bloom", {"lesson_id": 10.0}).access != "empty")
+            self.log_test("Нет ложных отказов фильтра", no_false_negatives)
+            
+            # Фильтр не вытесняет индекс колонки; индекс, заменивший фильтр, удаляет его файл
+            engine.create_index("test_bloom", "id")
+            try:
+                engine.create_index("test_bloom", "id", kind="bloom")
+                rejected = False
+            except ValueError:
+                rejected = True
+            bloom_file = engine.indexes["test_bloom"]["login"].filename
+            engine.create_index("test_bloom", "login")
+            kinds = {entry["columns"][0]: entry["kind"]
+                     for entry in engine.schema_manager.load_schema("test_bloom").indexes}
+            replace_success = (rejected and kinds == {"lesson_id": "bloom", "login": "hash", "id": "hash"}
+                               and engine.explain("test_bloom", {"id": 7}).access == "index"
+                               and not os.path.exists(bloom_file)
+                               and engine.select("test_bloom", ["id"], {"login": "user7"}) == [{"id": 7}])
+            self.log_test("Фильтр и индекс одной колонки", replace_success, str(kinds))
+            
+            # Фильтр, созданный на пустой таблице, растет вместе с ней
+            self.delete_table_if_exists("test_bloom_growth")
+            engine.create_table("test_bloom_growth", [{"name": "id", "type": "INT"}, {"name": "code", "type": "INT"}])
+            engine.create_index("test_bloom_growth", "code", kind="bloom")
+            for start in range(0, 30000, 3000):
+                engine.insert_many("test_bloom_growth", [{"id": i, "code": i * 2} for i in range(start, start + 3000)])
+            for i in range(30000, 30100):
+                engine.insert("test_bloom_growth", {"id": i, "code": i * 2})
+            grown = engine.indexes["test_bloom_growth"]["code"]
+            grown_fp = sum(grown.might_contain(i * 2 + 1) for i in range(30100)) / 30100
+            growth_success = (all(grown.might_contain(i * 2) for i in range(30100))
+                              and not grown.overfull and grown_fp < 0.03)
+            self.log_test("Ложные срабатывания после роста таблицы", growth_success,
+                          f"доля: {grown_fp:.4f}, емкость: {grown.capacity}, хэшей: {grown.hash_count}")
+            return success and skip_success and no_false_negatives and replace_success and growth_success
+        
+        except Exception as e:
+            self.log_test("Фильтр Блума", False, str(e))
+            return False
+    
+    def test_query_planner(self):
+        """Тестирование выбора плана по оценкам индексов"""
+        print("\n=== Тестирование планировщика ===")
+        
+        try:
+            from lib.bad_subd import Range
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_planner")
+            engine.create_table("test_planner", [
+                {"name": "id", "type": "INT"},
+                {"name": "schedule_id", "type": "INT"},
+                {"name": "value", "type": "INT"}
+            ])
+            rows = [{"id": i, "schedule_id": i % 10, "value": (i * 37) % 2000} for i in range(2000)]
+            engine.insert_many("test_planner", rows)
+            engine.create_index("test_planner", "schedule_id")
+            engine.create_index("test_planner", "id")
+            engine.create_index("test_planner", "value", kind="btree")
+            
+            # Избирательный индекс выбирается независимо от порядка условий
+            by_id = engine.explain("test_planner", {"schedule_id": 3, "id": 43})
+            # Два неизбирательных условия вместе дают мало строк - пересечение
+            where = {"schedule_id": 3, "value": Range(high=199)}
+            selected = engine.select("test_planner", ["id"], where)
+            expected = [row["id"] for row in rows if row["schedule_id"] == 3 and row["value"] <= 199]
+            intersection = engine.last_plan
+            # Диапазон почти по всей таблице дешевле просканировать
+            wide = engine.explain("test_planner", {"value": Range(low=100)})
+            
+            success = (by_id.access == "index" and by_id.indexes == ["id"] and by_id.estimated_rows == 1
+                       and intersection.access == "intersection"
+                       and sorted(intersection.indexes) == ["schedule_id", "value"]
+                       and sorted(row["id"] for row in selected) == expected
+                       and wide.access == "scan" and wide.total_rows == 2000
+                       and len(engine.select("test_planner", ["id"], {"value": Range(low=100)})) == 1900)
+            self.log_test("Выбор индекса, пересечения и скана", success,
+                          f"{by_id.access} {by_id.indexes}, {intersection.access} {intersection.indexes}, {wide.access}")
+            
+            # Индексы как у lessons и comments: колонка и составной индекс с ней во главе
+            # покрывают одно условие, пересекать их нельзя
+            from lib.bad_subd import Match
+            self.delete_table_if_exists("test_planner_comments")
+            engine.create_table("test_planner_comments", [
+                {"name": "id", "type": "INT"},
+                {"name": "lesson_id", "type": "INT"},
+                {"name": "date", "type": "VARCHAR", "size": 15},
+                {"name": "text", "type": "VARCHAR", "size": 255}
+            ])
+            engine.insert_many("test_planner_comments", [
+                {"id": i, "lesson_id": i % 50, "date": f"2024-01-{i % 28 + 1:02d}",
+                 "text": "homework" if i % 7 == 0 else "lecture notes"} for i in range(4000)])
+            engine.create_index("test_planner_comments", "id")
+            engine.create_index("test_planner_comments", "lesson_id")
+            engine.create_index("test_planner_comments", ["lesson_id", "date"])
+            engine.create_index("test_planner_comments", "text", kind="fulltext")
+            
+            by_lesson = engine.select("test_planner_comments", ["id"], {"lesson_id": 7})
+            lesson_plan = engine.last_plan
+            by_date = engine.select("test_planner_comments", ["id"], {"lesson_id": 7, "date": "2024-01-08"})
+            date_plan = engine.last_plan
+            # Условия на разные колонки по-прежнему пересекаются
+            matched = engine.select("test_planner_comments", ["id"], {"lesson_id": 7, "text": Match("homework")})
+            match_plan = engine.last_plan
+            
+            layout_success = (lesson_plan.access == "index" and lesson_plan.estimated_rows == 80
+                              and len(by_lesson) == 80
+                              and date_plan.access == "index" and date_plan.indexes == ["lesson_id+date"]
+                              and sorted(row["id"] for row in by_date) == [i for i in range(4000)
+                                                                         if i % 50 == 7 and i % 28 == 7]
+                              and match_plan.access == "intersection"
+                              and sorted(match_plan.indexes) == ["lesson_id", "text"]
+                              and sorted(row["id"] for row in matched) == [i for i in range(4000)
+                                                                         if i % 50 == 7 and i % 7 == 0])
+            self.log_test("Колонка и составной индекс не пересекаются", layout_success,
+                          f"{lesson_plan.access} {lesson_plan.indexes} ~{lesson_plan.estimated_rows}, "
+                          f"{date_plan.access} {date_plan.indexes}, {match_plan.access} {match_plan.indexes}")
+            return success and layout_success
+        
+        except Exception as e:
+            self.log_test("Планировщик", False, str(e))
+            return False
+    
+    def test_analyze(self):
+        """Тестирование ANALYZE и сохраненной статистики"""
+        print("\n=== Тестирование ANALYZE ===")
+        
+        try:
+            from lib.bad_subd import Range
+            from lib.bad_subd.table_statistics import collect_statistics
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_analyze")
+            engine.create_table("test_analyze", [
+                {"name": "id", "type": "INT"},
+                {"name": "grp", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 20}
+            ])
+            engine.insert_many("test_analyze", [{"id": i, "grp": i % 7, "name": f"name{i % 50}"}
+                                                for i in range(3000)])
+            engine.delete("test_analyze", {"id": Range(high=299)})
+            
+            result = self.db.execute("ANALYZE test_analyze")
+            columns = {column["name"]: column for column in result["columns"]}
+            # Статистика читается новым движком из файла рядом со схемой
+            stats = BadSUBDEngine().get_statistics("test_analyze")
+            id_stats = stats.columns["id"]
+            low_ids = stats.estimate_rows({"id": Range(high=1000)})
+            
+            success = (result["live_rows"] == 2700 and columns["id"]["distinct_count"] == 2700
+                       and columns["grp"]["distinct_count"] == 7 and columns["name"]["distinct_count"] == 50
+                       and id_stats.min_value == 300 and id_stats.max_value == 2999
+                       and len(id_stats.histogram) == 33
+                       and abs(low_ids - 701) < 100
+                       and abs(stats.estimate_rows({"grp": 3}) - 2700 / 7) < 1e-6
+                       and stats.estimate_rows({"id": 5}) == 0)
+            self.log_test("Статистика таблицы", success,
+                          f"строк {result['live_rows']}, id <= 1000: {low_ids:.0f}")
+            
+            # Число различных значений больше наброска оценивается с малой ошибкой
+            many = collect_statistics("many", ["value"], ({"value": i} for i in range(50000)))
+            distinct = many.columns["value"].distinct_count
+            estimate_ok = abs(distinct - 50000) < 50000 * 0.05
+            self.log_test("Оценка числа различных значений", estimate_ok, f"{distinct} из 50000")
+            return success and estimate_ok
+        
+        except Exception as e:
+            self.log_test("ANALYZE", False, str(e))
+            return False
+    
+    def test_select_limit(self):
+        """Тестирование потоковой выборки и LIMIT/OFFSET"""
+        print("\n=== Тестирование LIMIT/OFFSET ===")
+        
+        try:
+            from lib.bad_subd import Range
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_limit")
+            engine.create_table("test_limit", [
+                {"name": "id", "type": "INT"},
+                {"name": "grp", "type": "INT"}
+            ])
+            engine.insert_many("test_limit", [{"id": i, "grp": i % 3} for i in range(5000)])
+            engine.create_index("test_limit", "id", kind="btree")
+            
+            page = self.db.execute("SELECT id FROM test_limit WHERE grp = 1 LIMIT 5 OFFSET 10")
+            tail = self.db.execute("SELECT id FROM test_limit WHERE id >= 4990 OFFSET 8")
+            indexed = self.db.execute("SELECT id FROM test_limit WHERE id BETWEEN 100 AND 200 LIMIT 3;")
+            sql_ok = ([row["id"] for row in page] == [31, 34, 37, 40, 43]
+                      and [row["id"] for row in tail] == [4998, 4999]
+                      and [row["id"] for row in indexed] == [100, 101, 102])
+            self.log_test("LIMIT/OFFSET в SQL", sql_ok, f"{page}, {tail}, {indexed}")
+            
+            # Сканирование прекращается, как только набрано нужное число строк
+            checked = []
+            matches_where = engine._matches_where
+            engine._matches_where = lambda row, where: checked.append(1) or matches_where(row, where)
+            try:
+                first = next(engine.select_iter("test_limit", ["id"], {"grp": 2}))
+                limited = engine.select("test_limit", ["id"], {"grp": 0}, limit=2)
+            finally:
+                del engine._matches_where
+            stop_ok = (first == {"id": 2} and limited == [{"id": 0}, {"id": 3}] and len(checked) < 10)
+            self.log_test("Ранняя остановка выборки", stop_ok, f"проверено строк: {len(checked)}")
+            return sql_ok and stop_ok
+        
+        except Exception as e:
+            self.log_test("LIMIT/OFFSET", False, str(e))
+            return False
+    
+    def test_update(self):
+        """Тестирование UPDATE с перезаписью на месте"""
+        print("\n=== Тестирование UPDATE ===")
+        
+        try:
+            engine = self.db.engine.engine
+            self.delete_table_if_exists("test_update")
+            engine.create_table("test_update", [
+                {"name": "id", "type": "INT", "primary_key": True},
+                {"name": "grp", "type": "INT"},
+                {"name": "name", "type": "VARCHAR", "size": 20}
+            ])
+            engine.insert_many("test_update", [{"id": i, "grp": i % 5, "name": f"name{i}"} for i in range(100)])
+            engine.create_index("test_update", "grp")
+            info_before = engine.get_table_info("test_update")
+            
+            # Индекс id не затрагивается, если id не меняется
+            id_index = engine._get_indexes("test_update")["id"]
+            touched = []
+            id_index.delete = lambda key, row_position=None: touched.append(key)
+            try:
+                one = self.db.execute("UPDATE test_update SET name = 'new name', grp = 7 WHERE id = 5")
+                many = self.db.execute("UPDATE test_update SET grp = 9 WHERE grp = 1;")
+            finally:
+                del id_index.delete
+            info_after = engine.get_table_info("test_update")
+            
+            try:
+                engine.update("test_update", {"id": 6}, {"id": 7})
+                duplicate_rejected = False
+            except ValueError:
+                duplicate_rejected = True
+            
+            success = (one == 1 and many == 20 and not touched and duplicate_rejected
+                       and engine.select("test_update", ["id", "name"], {"grp": 7}) == [{"id": 5, "name": "new name"}]
+                       and all(row["id"] != 5 for row in engine.select("test_update", ["id"], {"grp": 0}))
+                       and sorted(row["id"] for row in engine.select("test_update", ["id"], {"grp": 9}))
+                       == list(range(1, 100, 5))
+                       and engine.select("test_update", ["id"], {"grp": 1}) == []
+                       and engine.select("test_update", ["grp"], {"id": 7}) == [{"grp": 2}]
+                       and info_after["file_size"] == info_before["file_size"]
+                       and info_after["total_rows"] == 100)
+            self.log_test("UPDATE на месте с индексами", success,
+                          f"обновлено {one} и {many}, размер файла {info_before['file_size']} -> {info_after['file_size']}")
+            
+            # Строка utf8, которая больше не помещается в свою страницу, переносится
+            self.delete_table_if_exists("test_update_utf8")
+            engine.create_table("test_update_utf8", [
+                {"name": "id", "type": "INT"},
+                {"name": "text", "type": "VARCHAR", "size": 255}
+            ], storage_format="utf8")
+            engine.insert_many("test_update_utf8", [{"id": i, "text": "x" * 200} for i in range(80)])
+            engine.create_index("test_update_utf8", "id")
+            updated = engine.update("test_update_utf8", {"text": "y" * 255}, {"id": 3})
+            moved_ok = (updated == 1
+                        and engine.select("test_update_utf8", ["text"], {"id": 3}) == [{"text": "y" * 255}]
+                        and len(engine.select("test_update_utf8")) == 80)
+            self.log_test("UPDATE с переносом строки utf8", moved_ok)
+            return success and moved_ok
+        
+        except Exception as e:
+            self.log_test("UPDATE", False, str(e))
+            return False
+    
+    def test_batched_delete(self):
+        """Тестирование DELETE по индексу с пакетной записью"""
+        print("\n=== Тестирование пакетного DELETE ===")
+        
+        try:
+            from lib.bad_subd import Range
+            engine = self.db.engine.engine
+            results = []
+            for storage_format in ("utf32", "utf8"):
+                table = f"test_batch_delete_{storage_format}"
+                self.delete_table_if_exists(table)
+                engine.create_table(table, [
+                    {"name": "id", "type": "INT"},
+                    {"name": "grp", "type": "INT"},
+                    {"name": "name", "type": "VARCHAR", "size": 20}
+                ], storage_format=storage_format)
+                engine.insert_many(table, [{"id": i, "grp": i % 10, "name": f"n{i}"} for i in range(3000)])
+                engine.create_index(table, "grp")
+                engine.create_index(table, "id", kind="btree")
+                file_size = engine.get_table_info(table)["file_size"]
+                
+                # Строки находятся по индексу, без сканирования и без построчных записей
+                calls = []
+                scan_rows = engine.table_manager.scan_rows
+                engine.table_manager.scan_rows = lambda *args: calls.append("scan") or scan_rows(*args)
+                engine.table_manager.delete_row_at_position = lambda *args: calls.append("row")
+                try:
+                    plan = engine.explain(table, {"grp": 3})
+                    deleted = self.db.execute(f"DELETE FROM {table} WHERE grp = 3")
+                    ranged = engine.delete(table, {"id": Range(100, 199)})
+                finally:
+                    del engine.table_manager.scan_rows
+                    del engine.table_manager.delete_row_at_position
+                
+                remaining = engine.select(table, ["id"])
+                expected = [i for i in range(3000) if i % 10 != 3 and not 100 <= i <= 199]
+                # Освобожденные слоты занимаются новыми строками
+                engine.insert_many(table, [{"id": 5000 + i, "grp": 3, "name": "new"} for i in range(300)])
+                ok = (plan.access == "index" and not calls and deleted == 300 and ranged == 90
+                      and sorted(row["id"] for row in remaining) == expected
+                      and engine.get_table_info(table)["total_rows"] == len(expected) + 300
+                      and engine.select(table, ["id"], {"id": 103}) == []
+                      and len(engine.select(table, ["id"], {"grp": 3})) == 300
+                      and engine.get_table_info(table)["file_size"] == file_size)
+                self.log_test(f"Пакетный DELETE ({storage_format})", ok,
+                              f"удалено {deleted} и {ranged}, лишние вызовы: {calls}")
+                results.append(ok)
+            return all(results)
+        
+        except Exception as e:
+            self.log_test("Пакетный DELETE", False, str(e))
+            return False
+    
+    def test_shared_engines(self):
+        """Тестирование двух движков на одних файлах"""
+        print("\n=== Тестирование нескольких движков ===")
+        
+        try:
+            first = BadSUBDEngine()
+            second = BadSUBDEngine()
+            self.delete_table_if_exists("test_two_engines")
+            first.indexes.pop("test_two_engines", None)
+            first.create_table("test_two_engines", [
+                {"name": "id", "type": "INT"},
+                {"name": "grp", "type": "INT"}
+            ])
+            first.insert_many("test_two_engines", [{"id": i, "grp": i % 10} for i in range(1000)])
+            first.create_index("test_two_engines", "id")
+            
+            # Второй движок уже открыл индексы - вставка первого должна быть видна по индексу
+            second.select("test_two_engines", where={"id": 1})
+            first.insert("test_two_engines", {"id": 5000, "grp": 1})
+            found = second.select("test_two_engines", ["id"], {"id": 5000})
+            plan = second.last_plan
+            # Индекс, созданный первым движком, обновляется вставками второго
+            first.create_index("test_two_engines", "grp")
+            second.insert("test_two_engines", {"id": 5001, "grp": 11})
+            by_new_index = first.select("test_two_engines", ["id"], {"grp": 11})
+            
+            success = (found == [{"id": 5000}] and plan.access == "index"
+                       and by_new_index == [{"id": 5001}] and first.last_plan.access == "index")
+            self.log_test("Общие индексы движков процесса", success, f"{found}, {by_new_index}")
+            
+            # VACUUM заменяет файл таблицы: другой движок не должен писать в старый файл
+            first.delete("test_two_engines", {"grp": 3})
+            first.vacuum("test_two_engines")
+            second_insert = second.insert("test_two_engines", {"id": 6000, "grp": 12})
+            second.delete("test_two_engines", {"grp": 4})
+            second.vacuum("test_two_engines")
+            first_insert = first.insert("test_two_engines", {"id": 6001, "grp": 12})
+            fresh = BadSUBDEngine()
+            vacuum_success = (second_insert and first_insert
+                              and first.select("test_two_engines", ["id"], {"grp": 12}) == [{"id": 6000}, {"id": 6001}]
+                              and second.select("test_two_engines", ["id"], {"id": 6001}) == [{"id": 6001}]
+                              and len(fresh.select("test_two_engines")) == 804
+                              and fresh.table_manager.get_total_rows("test_two_engines") == 804)
+            fresh.close()
+            self.log_test("VACUUM движков друг против друга", vacuum_success)
+            first.close()
+            second.close()
+            return success and vacuum_success
+        
+        except Exception as e:
+            self.log_test("Несколько движков", False, str(e))
+            return False
+    
     def run_all_tests(self):
         """Запуск всех тестов"""
         print("=" * 60)
@@ -449,7 +1745,33 @@ class SQLBadSUBDTester:
             self.test_main_tables_via_engine,
             self.test_data_operations_main_tables,
             self.test_error_handling,
-            self.test_performance_basic
+            self.test_performance_basic,
+            self.test_row_codec,
+            self.test_mmap_access_mode,
+            self.test_file_handle_pool,
+            self.test_insert_many,
+            self.test_projection_pushdown,
+            self.test_raw_filter,
+            self.test_numpy_scan_engine,
+            self.test_utf8_storage_format,
+            self.test_free_slot_reuse,
+            self.test_vacuum,
+            self.test_index_log,
+            self.test_btree_index,
+            self.test_varchar_index,
+            self.test_composite_index,
+            self.test_mapped_index,
+            self.test_index_bulk_build,
+            self.test_index_catalog,
+            self.test_unique_constraints,
+            self.test_fulltext_index,
+            self.test_bloom_filter,
+            self.test_query_planner,
+            self.test_analyze,
+            self.test_select_limit,
+            self.test_update,
+            self.test_batched_delete,
+            self.test_shared_engines
         ]
         
         passed = 0